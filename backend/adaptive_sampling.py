@@ -0,0 +1,204 @@
+# adaptive_sampling.py
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# ===================================================================
+# 적응형 몬테카를로: 신뢰구간 기반 종료와 후보 경주(racing)
+#
+# 젬 1개 생애주기(시도)마다 성공 여부 s, 가공 비용 c, 초기화 횟수 k를 얻습니다.
+# 시세와 무관한 합계(1차/2차 적률)만 모아 두면, 어떤 시세에서든
+#   시도당 비용 X = (재료 가격 + 페온 골드) + c + 크리스탈 가격 * k
+#   기대 총비용 R = E[X] / E[s]   (성공할 때까지 반복하는 갱신 보상 비율)
+# 의 점추정과 델타 방법 신뢰구간을 산술만으로 구할 수 있습니다.
+#
+# race_candidates()는 후보들을 라운드마다 표본을 두 배씩 늘리며 시뮬레이션하고,
+# 비용 하한이 현재 최선 후보의 상한보다 큰 후보는 탈락시킵니다 (successive halving).
+# 살아남은 후보가 모두 목표 상대 정밀도(신뢰구간 반폭 / 추정값)에 도달하면 멈춥니다.
+#
+# 제어 변량(control variate): 생애주기마다 기댓값이 정확히 0인 값 v0, v1, ...을 함께 모으면
+# (FinalOptimizer의 crn 모드), s, c, k의 평균에서 v와의 회귀분을 빼서 분산을 줄입니다.
+#   평균' = 평균 - B * mean(v),   B = Cov(y, v) Cov(v, v)^-1
+# 회귀 계수도 같은 적률 합계로 구하므로 시세와 무관하게 저장/병합할 수 있습니다.
+# ===================================================================
+
+CONFIDENCE_Z = 1.96  # 95% 신뢰구간
+ADAPTIVE_INITIAL_LIFECYCLES = 1000
+ADAPTIVE_GROWTH_FACTOR = 2
+ADAPTIVE_MAX_LIFECYCLES = 256000
+# 한 번도 성공하지 못한 후보는 성공률 상한(3/n)이 이 값 아래로 내려가면 도달 불가능으로 보고 탈락시킵니다.
+ADAPTIVE_MIN_SUCCESS_RATE = 1e-3
+MOMENT_KEYS = ("n", "s", "c", "k", "cc", "kk", "ck", "sc", "sk")
+OUTCOME_NAMES = ("s", "c", "k")
+
+# sample(candidate_index, lifecycles) -> (성공 여부, 가공 비용, 초기화 횟수) 배열
+SampleFunction = Callable[[int, int], Tuple[np.ndarray, np.ndarray, np.ndarray]]
+
+
+def empty_moments() -> Dict[str, float]:
+    return {key: 0.0 for key in MOMENT_KEYS}
+
+
+def moments_from_outcomes(success: np.ndarray, craft_cost: np.ndarray, initialize_count: np.ndarray, controls: Optional[np.ndarray] = None) -> Dict[str, float]:
+    """
+    생애주기별 결과 배열의 합계(1차/2차 적률). 성공 여부는 0/1이므로 s*s = s 입니다.
+    controls((N, J) 제어 변량)가 있으면 v{j}, v{j}v{l}, sv{j}, cv{j}, kv{j} 합계도 더합니다.
+    """
+    s = np.asarray(success, dtype=np.float64)
+    c = np.asarray(craft_cost, dtype=np.float64)
+    k = np.asarray(initialize_count, dtype=np.float64)
+    moments = {
+        "n": float(s.size), "s": float(s.sum()), "c": float(c.sum()), "k": float(k.sum()),
+        "cc": float((c * c).sum()), "kk": float((k * k).sum()), "ck": float((c * k).sum()),
+        "sc": float((s * c).sum()), "sk": float((s * k).sum()),
+    }
+    if controls is not None:
+        v = np.asarray(controls, dtype=np.float64).reshape(s.size, -1)
+        for j in range(v.shape[1]):
+            moments[f"v{j}"] = float(v[:, j].sum())
+            for name, values in zip(OUTCOME_NAMES, (s, c, k)):
+                moments[f"{name}v{j}"] = float((values * v[:, j]).sum())
+            for l in range(j, v.shape[1]):
+                moments[f"v{j}v{l}"] = float((v[:, j] * v[:, l]).sum())
+    return moments
+
+
+def merge_moments(a: Dict[str, float], b: Dict[str, float]) -> Dict[str, float]:
+    return {key: a.get(key, 0.0) + b.get(key, 0.0) for key in dict.fromkeys([*MOMENT_KEYS, *a, *b])}
+
+
+def _num_controls(moments: Dict[str, float]) -> int:
+    return sum(1 for key in moments if key[0] == "v" and key[1:].isdigit())
+
+
+def _outcome_estimates(moments: Dict[str, float], use_controls: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    생애주기 하나의 (s, c, k) 평균 벡터와 공분산 행렬. 제어 변량이 있으면 회귀분을 뺀 값입니다.
+    표본이 적어 제어 후 성공률이 0 이하가 되면 제어 없이 계산합니다.
+    """
+    n = moments["n"]
+    names = list(OUTCOME_NAMES) + ([f"v{j}" for j in range(_num_controls(moments))] if use_controls else [])
+    sums = np.array([moments[name] for name in names]) / n
+    second = np.empty((len(names), len(names)))
+    for i, x in enumerate(names):
+        for j, y in enumerate(names[i:], start=i):
+            second[i, j] = second[j, i] = moments["s" if x == y == "s" else x + y] / n
+    covariance = second - np.outer(sums, sums)
+    means, outcome_covariance = sums[:3], covariance[:3, :3]
+    if len(names) == 3:
+        return means, outcome_covariance
+    coefficients = covariance[:3, 3:] @ np.linalg.pinv(covariance[3:, 3:])
+    controlled_means = means - coefficients @ sums[3:]
+    controlled_covariance = outcome_covariance - coefficients @ covariance[3:, :3]
+    if controlled_means[0] <= 0 < means[0]:
+        return means, outcome_covariance
+    return controlled_means, controlled_covariance
+
+
+def stats_from_moments(moments: Dict[str, float], use_controls: bool = True) -> Dict:
+    """
+    FinalOptimizer의 생애주기 통계 형식 (성공률, 평균 가공 비용, 평균 초기화 횟수 + 적률).
+    "standard_errors"에는 세 평균 각각의 표준오차를 담습니다 (제어 변량을 썼다면 제어 후 값).
+    """
+    n = moments["n"]
+    means, covariance = _outcome_estimates(moments, use_controls)
+    standard_errors = np.sqrt(np.maximum(np.diag(covariance), 0.0) / n)
+    return {
+        "success_rate": float(min(1.0, max(0.0, means[0]))),
+        "avg_craft_cost": float(means[1]),
+        "avg_initialize_count": float(means[2]),
+        "standard_errors": {"success_rate": float(standard_errors[0]), "avg_craft_cost": float(standard_errors[1]), "avg_initialize_count": float(standard_errors[2])},
+        "moments": dict(moments),
+    }
+
+
+def wilson_interval(successes: float, n: float, z: float = CONFIDENCE_Z) -> Tuple[float, float]:
+    """성공률의 Wilson 점수 신뢰구간."""
+    if n <= 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def estimate_cost(moments: Dict[str, float], fixed_cost: float, crystal_price: float, z: float = CONFIDENCE_Z, use_controls: bool = True) -> Dict[str, float]:
+    """
+    기대 총비용 R = E[X] / E[s]의 점추정과 델타 방법 신뢰구간.
+    fixed_cost = 재료 가격 + 페온 골드 (시도마다 한 번), crystal_price = 초기화 1회 비용.
+    아직 성공이 한 번도 없으면 성공률 상한을 3/n(rule of three)으로 잡아 비용 하한만 제공합니다.
+    "variance_reduction"은 제어 변량으로 줄어든 D 분산의 배수입니다 (같은 정밀도에 필요한 표본이 그만큼 줄어듦).
+    """
+    n = moments["n"]
+    if n <= 0:
+        return {"mean": float("inf"), "half_width": float("inf"), "standard_error": float("inf"), "lower": 0.0, "upper": float("inf"), "relative_half_width": float("inf"), "lifecycles": 0, "variance_reduction": 1.0}
+    a, b = float(fixed_cost), float(crystal_price)
+    if moments["s"] <= 0:
+        lower = (a + moments["c"] / n + b * moments["k"] / n) / min(1.0, 3.0 / n)
+        return {"mean": float("inf"), "half_width": float("inf"), "standard_error": float("inf"), "lower": lower, "upper": float("inf"), "relative_half_width": float("inf"), "lifecycles": int(n), "variance_reduction": 1.0}
+    raw_means, raw_covariance = _outcome_estimates(moments, use_controls=False)
+    means, covariance = _outcome_estimates(moments) if use_controls else (raw_means, raw_covariance)
+    ratio = (a + means[1] + b * means[2]) / means[0]
+    # D = X - R*s 의 분산. X = a + c + b*k 이므로 (s, c, k)에 대한 기울기는 (-R, 1, b) 입니다.
+    gradient = np.array([-ratio, 1.0, b])
+    variance_d = max(0.0, float(gradient @ covariance @ gradient))
+    raw_ratio = (a + raw_means[1] + b * raw_means[2]) / raw_means[0]
+    raw_gradient = np.array([-raw_ratio, 1.0, b])
+    raw_variance_d = max(0.0, float(raw_gradient @ raw_covariance @ raw_gradient))
+    standard_error = math.sqrt(variance_d / n) / means[0]
+    half_width = z * standard_error
+    return {
+        "mean": ratio, "half_width": half_width, "standard_error": standard_error, "lower": ratio - half_width, "upper": ratio + half_width,
+        "relative_half_width": half_width / ratio if ratio > 0 else float("inf"), "lifecycles": int(n),
+        "variance_reduction": raw_variance_d / variance_d if variance_d > 0 else 1.0,
+    }
+
+
+def race_candidates(
+    pricing: List[Tuple[float, float]], sample: SampleFunction, target_precision: float,
+    initial_moments: Optional[List[Dict[str, float]]] = None,
+    initial_lifecycles: int = ADAPTIVE_INITIAL_LIFECYCLES, max_lifecycles: int = ADAPTIVE_MAX_LIFECYCLES,
+    growth_factor: int = ADAPTIVE_GROWTH_FACTOR, min_success_rate: float = ADAPTIVE_MIN_SUCCESS_RATE, z: float = CONFIDENCE_Z,
+) -> Tuple[List[Dict[str, float]], List[bool]]:
+    """
+    후보 i의 (fixed_cost, crystal_price) = pricing[i]. 라운드마다 살아 있는 후보에게만 표본을 더 뽑습니다.
+
+    Args:
+        initial_moments: 이전에 모아 둔 후보별 적률 (이어서 표본을 늘립니다). None이면 처음부터.
+        target_precision (float): 멈출 상대 정밀도 (예: 0.02 = 95% 신뢰구간 반폭이 추정값의 2% 이내).
+
+    Returns:
+        (후보별 최종 적률, 후보별 생존 여부). 탈락한 후보의 적률도 반환해 캐시에 쌓을 수 있게 합니다.
+    """
+    if not pricing:
+        return [], []
+    moments = [dict(m) if m else empty_moments() for m in (initial_moments or [None] * len(pricing))]
+    alive = [True] * len(pricing)
+    estimates: Optional[List[Dict[str, float]]] = None
+    round_target = initial_lifecycles
+    while True:
+        for i, is_alive in enumerate(alive):
+            if not is_alive or (estimates is not None and estimates[i]["relative_half_width"] <= target_precision):
+                continue  # 탈락했거나 이미 충분히 정밀한 후보는 더 뽑지 않습니다.
+            missing = int(round_target - moments[i]["n"])
+            if missing > 0:
+                moments[i] = merge_moments(moments[i], moments_from_outcomes(*sample(i, missing)))
+        estimates = [estimate_cost(moments[i], *pricing[i], z=z) for i in range(len(pricing))]
+        for i in range(len(pricing)):
+            if alive[i] and moments[i]["s"] == 0 and 3.0 / moments[i]["n"] < min_success_rate:
+                alive[i] = False
+        if not any(alive):
+            return moments, alive
+        best_upper = min(estimates[i]["upper"] for i in range(len(pricing)) if alive[i])
+        for i in range(len(pricing)):
+            if alive[i] and estimates[i]["lower"] > best_upper:
+                alive[i] = False
+        pending = [
+            i for i in range(len(pricing))
+            if alive[i] and estimates[i]["relative_half_width"] > target_precision and moments[i]["n"] < max_lifecycles
+        ]
+        if not pending:
+            return moments, alive
+        round_target = min(max_lifecycles, max(round_target, min(moments[i]["n"] for i in pending)) * growth_factor)
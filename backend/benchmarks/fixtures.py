@@ -0,0 +1,89 @@
+# benchmarks/fixtures.py
+import json
+import os
+import random
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# 벤치마크는 backend/ 의 평면 모듈들을 그대로 임포트합니다.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from price_snapshot import make_price_snapshot
+from validator import CORE_INFO, GEM_INFO
+
+# ===================================================================
+# 벤치마크 입력 픽스처
+#
+# 모든 픽스처는 seed만으로 결정되며 Redis나 로스트아크 API 없이 만들어집니다.
+#  - 시세 스냅샷: gem_metadata.json의 18종 젬에 등급별 가격대를 부여 (fake_market_server.py와 같은 가격대)
+#  - 코어 구성 / 보유 젬: /optimize 요청과 같은 형태 (cores, held_gems)
+#  - 모델: 저장소에 포함된 models/ 의 전문가 모델
+# ===================================================================
+
+METADATA_PATH = os.path.join(BACKEND_DIR, "gem_metadata.json")
+MODELS_DIR = os.path.join(BACKEND_DIR, "models")
+GRADE_BASE_PRICES = {"고급": 300, "희귀": 3000, "영웅": 30000}
+CRYSTAL_PRICE = 9000  # 블루 크리스탈 100개당 골드
+ORDER_GEM_TYPES = ["안정", "견고", "불변"]
+CHAOS_GEM_TYPES = ["침식", "왜곡", "붕괴"]
+
+
+def make_price_fixture(seed: int = 0) -> Dict:
+    """메타데이터의 젬 전체 이름 -> 가격 스냅샷. fetched_at을 고정해 version도 seed마다 같습니다."""
+    rng = random.Random(seed)
+    with open(METADATA_PATH, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    prices = {}
+    for gem in sorted(metadata, key=lambda g: g["Id"]):
+        base_price = GRADE_BASE_PRICES.get(gem["Grade"], 1000)
+        prices[gem["Name"]] = base_price + rng.randint(0, base_price)
+    return make_price_snapshot(prices, fetched_at=0.0)
+
+
+def make_held_gem(rng: random.Random, core_type: str, max_efficiency: int = 5) -> Dict:
+    gem_type = rng.choice(ORDER_GEM_TYPES if core_type == "질서" else CHAOS_GEM_TYPES)
+    return {"name": f"{core_type}의 젬 : {gem_type}", "core_point": rng.randint(1, 5), "efficiency": rng.randint(1, max_efficiency)}
+
+
+def make_validator_cases(seed: int = 0, count: int = 32) -> List[Tuple[Dict[str, List[str]], List[Dict]]]:
+    """
+    check_feasibility 입력 (cores_input, held_gems) 목록. 한 코어 타입에 코어 1~3개, 보유 젬 0~12개.
+    보유 젬이 많을수록 탐색이 어려워지므로 개수를 고르게 섞습니다.
+    """
+    rng = random.Random(seed)
+    cases = []
+    for i in range(count):
+        core_type = "질서" if i % 2 == 0 else "혼돈"
+        cores = [rng.choice(list(CORE_INFO)) for _ in range(rng.randint(1, 3))]
+        held_gems = [make_held_gem(rng, core_type) for _ in range(rng.randint(0, 4 * len(cores)))]
+        cases.append(({core_type: cores}, held_gems))
+    return cases
+
+
+def make_scenario_cases() -> List[Tuple[int, int]]:
+    """generate_scenarios 입력 (총 의지력, 슬롯 수). 코어 하나의 모든 현실적인 남은 상태입니다."""
+    max_willpower = max(CORE_INFO.values())
+    min_cost = min(GEM_INFO.values()) - 5
+    return [(willpower, slots) for slots in range(1, 5) for willpower in range(slots * min_cost, max_willpower + 1)]
+
+
+def make_optimizer(simulation_mode: str = "batch", seed: int = 0, model_backend: str = "numpy"):
+    """Redis와 프로세스 풀 없이 번들 모델을 읽은 FinalOptimizer. rng를 seed로 고정합니다."""
+    import numpy as np
+    from final_optimizer import FinalOptimizer
+
+    optimizer = FinalOptimizer(models_dir=MODELS_DIR, simulation_mode=simulation_mode, model_backend=model_backend, workers=0, use_redis=False)
+    optimizer.rng = np.random.default_rng(seed)
+    return optimizer
+
+
+def make_expected_cost_cases(optimizer, prices: Dict[str, Optional[int]], simulations: int = 100, core_type: str = "질서") -> List[tuple]:
+    """get_true_expected_cost 인자 목록. 최적화기가 실제로 평가하는 (의지력 소모량별) 후보를 그대로 씁니다."""
+    cases = []
+    for willpower_cost in range(3, 10):
+        for _spec, _material_name, args in optimizer._build_candidates(willpower_cost, prices, CRYSTAL_PRICE, core_type, simulations):
+            if (args[0]['core_point'], args[0]['efficiency']) in optimizer.models:
+                cases.append(args)
+    return cases
@@ -0,0 +1,289 @@
+# benchmarks/run_benchmarks.py
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from fixtures import (
+    make_price_fixture, make_validator_cases, make_scenario_cases,
+    make_optimizer, make_expected_cost_cases,
+)
+from gem_simulator import GemSimulator
+from scenario_generator import generate_scenarios
+from simulation_stats import SimulationStatsStore
+from validator import check_feasibility
+
+# ===================================================================
+# 핵심 경로 마이크로 벤치마크
+#
+# 각 벤치마크는 setup(seed)가 돌려준 op() 하나를 반복 실행합니다.
+#  - 시간 측정: 워밍업 후 samples번, 매번 op()를 inner번 호출해 1회당 지연시간을 구합니다.
+#  - 메모리 측정: 워밍업 직후 tracemalloc 아래에서 op()를 한 번 따로 실행해 최대 할당량을 구합니다.
+# 결과는 기준선(baseline.json)과 비교하며, 중앙값 기준 처리량이 threshold 이상 떨어지거나
+# 최대 메모리가 memory_threshold 이상 늘면 회귀로 보고 종료 코드 1을 반환합니다.
+# 기준선은 측정한 기계에 종속되므로, 기계 식별 정보(MACHINE_IDENTITY_KEYS: 파이썬/NumPy 버전, 프로세서,
+# CPU 수)가 다르면 결과만 출력하고 판정 없이 0으로 종료합니다. 커널 패치처럼 자주 바뀌는 platform 문자열은
+# 기록만 하고 비교하지 않습니다. 그래도 판정하려면 --force-compare를, 아니면 그 기계에서
+# --save-baseline으로 다시 만든 뒤 비교하세요.
+#
+# 사용 예: python benchmarks/run_benchmarks.py                  (기준선과 비교)
+#          python benchmarks/run_benchmarks.py --save-baseline  (기준선 갱신)
+#          python benchmarks/run_benchmarks.py --only validator --quick
+# ===================================================================
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SEED = 1234
+MACHINE_IDENTITY_KEYS = ("python", "numpy", "processor", "cpu_count")
+DEFAULT_THRESHOLD = 0.20
+DEFAULT_MEMORY_THRESHOLD = 0.25
+MEMORY_NOISE_BYTES = 64 * 1024  # 이보다 작은 메모리 증가는 회귀로 보지 않습니다.
+
+BENCHMARKS: Dict[str, Dict] = {}
+
+
+def benchmark(name: str, samples: int, inner: int = 1, warmup: int = 1):
+    """setup(seed) -> op 함수를 벤치마크로 등록합니다."""
+    def register(setup: Callable[[int], Callable[[], None]]):
+        BENCHMARKS[name] = {"setup": setup, "samples": samples, "inner": inner, "warmup": warmup}
+        return setup
+    return register
+
+
+def _cycle(cases: List) -> Callable[[], object]:
+    """호출할 때마다 다음 픽스처를 돌려줍니다 (순서가 고정되어 재현 가능)."""
+    state = {"index": 0}
+
+    def next_case():
+        case = cases[state["index"] % len(cases)]
+        state["index"] += 1
+        return case
+    return next_case
+
+
+# --- 벤치마크 정의 ---
+
+@benchmark("simulator.generate_craft_options", samples=200, inner=200)
+def _setup_generate_craft_options(seed: int):
+    simulator = GemSimulator("heroic", np.random.default_rng(seed))
+
+    def op():
+        options = simulator.generate_craft_options()
+        simulator.apply_craft_option(options[0])
+        if simulator.state['remaining_crafts'] <= 0:
+            simulator.reset_gem()
+    return op
+
+
+# 입력을 순환하는 벤치마크는 inner를 픽스처 개수와 같게 두어 샘플마다 같은 입력 묶음을 잽니다.
+@benchmark("validator.check_feasibility", samples=50, inner=32)
+def _setup_check_feasibility(seed: int):
+    next_case = _cycle(make_validator_cases(seed))
+
+    def op():
+        cores_input, held_gems = next_case()
+        check_feasibility(cores_input, held_gems)
+    return op
+
+
+@benchmark("scenarios.generate_scenarios", samples=100, inner=42)
+def _setup_generate_scenarios(seed: int):
+    next_case = _cycle(make_scenario_cases())
+
+    def op():
+        generate_scenarios(*next_case())
+    return op
+
+
+def _setup_expected_cost(seed: int, mode: str):
+    optimizer = make_optimizer(simulation_mode=mode, seed=seed)
+    prices = make_price_fixture(seed)["prices"]
+    cases = make_expected_cost_cases(optimizer, prices)
+    if mode == "exact":
+        # 정책표는 서버에서 한 번 만들어 요청 사이에 유지되므로 미리 만들어 두고 DP만 잽니다.
+        for target_spec, material_grade_en, *_ in cases:
+            target_key = (target_spec['core_point'], target_spec['efficiency'])
+            optimizer._get_policy_table(target_key, optimizer.models[target_key], material_grade_en)
+    next_case = _cycle(cases)
+
+    def op():
+        # 통계 캐시를 비워 매번 실제 계산 경로를 잽니다.
+        optimizer.stats_store = SimulationStatsStore(None)
+        optimizer.get_true_expected_cost(*next_case())
+    return op
+
+
+@benchmark("optimizer.get_true_expected_cost[batch]", samples=20)
+def _setup_expected_cost_batch(seed: int):
+    return _setup_expected_cost(seed, "batch")
+
+
+@benchmark("optimizer.get_true_expected_cost[crn]", samples=20)
+def _setup_expected_cost_crn(seed: int):
+    return _setup_expected_cost(seed, "crn")
+
+
+@benchmark("optimizer.get_true_expected_cost[exact]", samples=20)
+def _setup_expected_cost_exact(seed: int):
+    return _setup_expected_cost(seed, "exact")
+
+
+# --- 측정 ---
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_benchmark(name: str, seed: int, quick: bool = False) -> Dict:
+    spec = BENCHMARKS[name]
+    samples = max(3, spec["samples"] // 5) if quick else spec["samples"]
+    inner = spec["inner"]
+    op = spec["setup"](seed)
+    for _ in range(spec["warmup"] * inner):
+        op()
+
+    # tracemalloc은 실행을 느리게 하므로 시간 측정과 분리합니다.
+    # 워밍업 직후의 같은 픽스처에서 재도록 시간 측정보다 먼저 실행합니다 (--quick 여부와 무관).
+    tracemalloc.start()
+    try:
+        op()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(samples):
+            started = time.perf_counter()
+            for _ in range(inner):
+                op()
+            latencies.append((time.perf_counter() - started) / inner)
+    finally:
+        if gc_was_enabled: gc.enable()
+
+    total_seconds = sum(latencies)
+    return {
+        "ops": samples * inner,
+        "ops_per_sec": samples / total_seconds if total_seconds > 0 else float("inf"),
+        "latency_ms": {
+            "mean": total_seconds / samples * 1000,
+            "p50": _percentile(latencies, 50) * 1000,
+            "p90": _percentile(latencies, 90) * 1000,
+            "p99": _percentile(latencies, 99) * 1000,
+        },
+        "peak_memory_bytes": peak_bytes,
+    }
+
+
+def machine_info() -> Dict[str, object]:
+    return {
+        "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(), "cpu_count": os.cpu_count(),
+    }
+
+
+def machine_mismatches(baseline_machine: Dict, machine: Dict) -> List[str]:
+    """기준선과 다른 기계 식별 항목을 반환합니다. 기준선에 없는 항목(이전 형식)은 비교하지 않습니다."""
+    return [
+        f"{key}: {baseline_machine[key]} -> {machine.get(key)}"
+        for key in MACHINE_IDENTITY_KEYS
+        if key in baseline_machine and baseline_machine[key] != machine.get(key)
+    ]
+
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict, threshold: float, memory_threshold: float) -> List[str]:
+    """회귀 메시지 목록을 반환합니다 (비어 있으면 통과)."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        # 평균보다 잡음에 덜 민감한 중앙값 지연시간으로 처리량을 비교합니다.
+        speed_ratio = base["latency_ms"]["p50"] / result["latency_ms"]["p50"]
+        if speed_ratio < 1 - threshold:
+            regressions.append(f"{name}: median throughput {speed_ratio:.2f}x of baseline (p50 {result['latency_ms']['p50']:.3f} ms vs {base['latency_ms']['p50']:.3f} ms)")
+        memory_growth = result["peak_memory_bytes"] - base["peak_memory_bytes"]
+        if memory_growth > MEMORY_NOISE_BYTES and result["peak_memory_bytes"] > base["peak_memory_bytes"] * (1 + memory_threshold):
+            regressions.append(f"{name}: peak memory {result['peak_memory_bytes'] / 1024:.0f} KiB vs {base['peak_memory_bytes'] / 1024:.0f} KiB")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict], baseline: Optional[Dict]):
+    print(f"\n{'benchmark':<42} {'ops/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak KiB':>9} {'vs base':>8}")
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        base = (baseline or {}).get("results", {}).get(name)
+        ratio = f"{base['latency_ms']['p50'] / latency['p50']:.2f}x" if base else "-"
+        print(f"{name:<42} {result['ops_per_sec']:>10.1f} {latency['p50']:>9.3f} {latency['p90']:>9.3f} {latency['p99']:>9.3f} {result['peak_memory_bytes'] / 1024:>9.0f} {ratio:>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run seeded micro-benchmarks for the simulator, validator, scenario generator and optimizer.")
+    parser.add_argument('--only', type=str, nargs='*', default=None, help="Run only benchmarks whose name contains one of these substrings")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--quick', action='store_true', help="Use fewer samples (noisier, for smoke runs)")
+    parser.add_argument('--baseline', type=str, default=BASELINE_PATH, help="Baseline JSON to compare against / save to")
+    parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline instead of comparing")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Allowed fractional throughput drop before failing")
+    parser.add_argument('--memory_threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD, help="Allowed fractional peak-memory growth before failing")
+    parser.add_argument('--force-compare', action='store_true', help="Compare against the baseline even if it was recorded on a different machine")
+    parser.add_argument('--output', type=str, default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.only or any(pattern in name for pattern in args.only)]
+    if not names:
+        raise SystemExit(f"No benchmarks match {args.only}. Available: {', '.join(BENCHMARKS)}")
+
+    results = {}
+    for name in names:
+        print(f"Running {name}...", flush=True)
+        results[name] = run_benchmark(name, args.seed, args.quick)
+    report = {"seed": args.seed, "quick": args.quick, "machine": machine_info(), "results": results}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        previous = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                previous = json.load(f).get("results", {})
+        report["results"] = {**previous, **results}  # --only로 일부만 돌렸으면 나머지 기준선은 유지
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print_results(results, None)
+        print(f"\nSaved baseline to {args.baseline}.")
+        sys.exit(0)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        sys.exit(0)
+    mismatches = machine_mismatches(baseline.get("machine", {}), report["machine"])
+    if mismatches:
+        print(f"\nBaseline was recorded on a different machine/environment ({'; '.join(mismatches)}).")
+        if not args.force_compare:
+            # 다른 하드웨어/환경에서 기록한 기준선과의 차이는 코드 회귀가 아니므로 판정하지 않습니다.
+            print("Skipping the regression verdict; re-record it here with --save-baseline or pass --force-compare.")
+            sys.exit(0)
+        print("Comparing anyway (--force-compare).")
+    regressions = compare_to_baseline(results, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  - {message}")
+        sys.exit(1)
+    print("\nNo regressions against baseline.")
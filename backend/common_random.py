@@ -0,0 +1,48 @@
+# common_random.py
+import numpy as np
+from typing import Tuple
+
+from gem_simulator import CRAFT_POSSIBILITIES
+
+# ===================================================================
+# 공통 난수(Common Random Numbers) 스트림
+#
+# 생애주기 번호 i의 t번째 스텝은 (seed, i // block_size, t)로 시드한 생성기가 만든 블록의
+# (i % block_size)번째 행(옵션 27개의 Gumbel 노이즈 + 옵션 선택용 균등 난수 1개)을 씁니다.
+#  - 목표 스펙이나 재료 등급이 달라도 같은 번호의 생애주기는 같은 난수를 받으므로
+#    후보 사이의 비용 차이에서 난수 잡음이 상당 부분 상쇄되고, 같은 요청은 항상 같은 결과를 냅니다.
+#  - 앞에서부터 n개를 뽑은 뒤 이어서 n개를 더 뽑아도 처음부터 2n개를 뽑은 것과 같습니다 (적응형 표본 추출과 호환).
+# ===================================================================
+
+CRN_DEFAULT_SEED = 0
+CRN_BLOCK_SIZE = 1024
+NUM_CRAFT_OPTIONS = len(CRAFT_POSSIBILITIES)
+
+_TINY = np.finfo(np.float64).tiny
+_ONE_MINUS_EPS = 1.0 - np.finfo(np.float64).epsneg
+
+
+class CommonRandomStreams:
+    def __init__(self, seed: int = CRN_DEFAULT_SEED, block_size: int = CRN_BLOCK_SIZE):
+        self.seed = seed
+        self.block_size = block_size
+
+    def _block(self, block_index: int, step: int) -> np.ndarray:
+        """(block_size, 27 + 1) 균등 난수 블록. 마지막 열은 옵션 선택용입니다."""
+        rng = np.random.default_rng([self.seed, block_index, step])
+        return rng.random((self.block_size, NUM_CRAFT_OPTIONS + 1))
+
+    def step_draws(self, step: int, lifecycle_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        lifecycle_ids(생애주기 번호 배열)의 step번째 스텝 난수.
+        Returns: ((N, 27) 표준 Gumbel 노이즈, (N,) [0, 1) 균등 난수)
+        """
+        lifecycle_ids = np.asarray(lifecycle_ids, dtype=np.int64)
+        uniforms = np.empty((lifecycle_ids.size, NUM_CRAFT_OPTIONS + 1))
+        block_ids = lifecycle_ids // self.block_size
+        for block_index in np.unique(block_ids):
+            rows = np.flatnonzero(block_ids == block_index)
+            uniforms[rows] = self._block(int(block_index), step)[lifecycle_ids[rows] % self.block_size]
+        # u = 0 이나 1에서 노이즈가 무한대가 되지 않도록 열린 구간으로 자릅니다.
+        gumbel_noise = -np.log(-np.log(np.clip(uniforms[:, :NUM_CRAFT_OPTIONS], _TINY, _ONE_MINUS_EPS)))
+        return gumbel_noise, uniforms[:, NUM_CRAFT_OPTIONS]
@@ -0,0 +1,34 @@
+# distill_policy.py
+import argparse
+import os
+
+from numpy_mlp import NumpyMLP
+from policy_table import distill_predictor, save_policy_tables, find_specialist_model_files
+
+# ===================================================================
+# 전문가 DQN 모델(.h5)을 정책 행동표(.npy)로 증류하는 명령
+#
+# 사용 예: python distill_policy.py --models_dir ./models/ --output_dir ./models/policies/
+# 생성된 표는 FinalOptimizer(model_backend="table")에서 사용됩니다.
+# ===================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Distill specialist DQN models into dense policy lookup tables.")
+    parser.add_argument('--models_dir', type=str, default='./models/', help="Directory containing gem_model_c*_e*.h5 files")
+    parser.add_argument('--output_dir', type=str, default='./models/policies/', help="Directory to write policy tables and manifest")
+    args = parser.parse_args()
+
+    model_files = find_specialist_model_files(args.models_dir)
+    if not model_files:
+        raise SystemExit(f"No specialist models found in '{args.models_dir}'.")
+
+    tables, sources = {}, {}
+    for (core_point, efficiency), model_path in model_files.items():
+        model = NumpyMLP.from_h5(model_path)
+        tables[(core_point, efficiency)] = distill_predictor(model.predict_actions)
+        sources[(core_point, efficiency)] = os.path.basename(model_path)
+        reroll_share = tables[(core_point, efficiency)].mean()
+        print(f"Distilled target (core: {core_point}, efficiency: {efficiency}) from {sources[(core_point, efficiency)]} | reroll share: {reroll_share:.3f}")
+
+    save_policy_tables(tables, args.output_dir, sources)
+    print(f"\nSaved {len(tables)} policy tables to '{args.output_dir}'")
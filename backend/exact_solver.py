@@ -0,0 +1,167 @@
+# exact_solver.py
+import numpy as np
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from gem_simulator import GEM_GRADES, CRAFT_POSSIBILITIES, CRAFT_OPTION_MASKS, STAT_KEYS, OPTION_PROBABILITIES
+
+# ===================================================================
+# 정확한(Exact) 마르코프 체인 기대값 계산기
+#
+# GemSimulator가 다루는 상태 공간(효율/코어/효과1/효과2 1~5, 남은 가공 횟수,
+# 남은 리롤 횟수, 비용 배율 2종)은 충분히 작기 때문에, 몬테카를로 대신
+# 전이 확률을 직접 만들어 동적 계획법(DP)으로 성공 확률과 기대 비용을 구합니다.
+# 규칙은 FinalOptimizer._simulate_one_gem_lifecycle과 동일합니다.
+# ===================================================================
+
+NUM_PICKS = 4
+NUM_OPTIONS = len(CRAFT_POSSIBILITIES)
+CRAFT_COST = 900
+
+# 같은 확률(가중치)을 가진 옵션들은 서로 교환 가능하므로 가중치 종류별로 묶어서 계산합니다.
+WEIGHT_CLASSES = tuple(sorted(set(OPTION_PROBABILITIES.tolist())))
+OPTION_WEIGHT_CLASS = np.array([WEIGHT_CLASSES.index(p) for p in OPTION_PROBABILITIES.tolist()])
+
+
+def max_rerolls(gem_grade: str) -> int:
+    """도달 가능한 리롤 횟수의 상한 (기본 리롤 + 가공마다 최대 2회 획득)."""
+    grade_info = GEM_GRADES[gem_grade]
+    return grade_info['reroll_count'] + 2 * grade_info['craft_count']
+
+
+@lru_cache(maxsize=None)
+def _expected_picks_per_class(class_counts: Tuple[int, ...], picks_left: int) -> Tuple[float, ...]:
+    """가중치 종류별 남은 옵션 수가 class_counts일 때, 비복원 추출로 각 종류가 뽑히는 기대 횟수."""
+    total_weight = sum(count * weight for count, weight in zip(class_counts, WEIGHT_CLASSES))
+    expected = [0.0] * len(class_counts)
+    if picks_left == 0 or total_weight <= 0:
+        return tuple(expected)
+    for j, count in enumerate(class_counts):
+        if count == 0: continue
+        prob = count * WEIGHT_CLASSES[j] / total_weight
+        remaining_counts = class_counts[:j] + (count - 1,) + class_counts[j + 1:]
+        sub_expected = _expected_picks_per_class(remaining_counts, picks_left - 1)
+        for i in range(len(expected)):
+            expected[i] += prob * sub_expected[i]
+        expected[j] += prob
+    return tuple(expected)
+
+
+def option_pick_probabilities(mask: np.ndarray) -> np.ndarray:
+    """
+    사용 가능한 옵션 마스크(27,)가 주어졌을 때, 4개를 비복원 추출한 뒤
+    그중 하나를 균등하게 고르는 과정에서 각 옵션이 최종 선택될 확률(27,)을 반환합니다.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    class_counts = tuple(np.bincount(OPTION_WEIGHT_CLASS[mask], minlength=len(WEIGHT_CLASSES)).tolist())
+    num_picks = min(NUM_PICKS, int(mask.sum()))
+    if num_picks == 0:
+        return np.zeros(NUM_OPTIONS)
+    expected = np.array(_expected_picks_per_class(class_counts, num_picks))
+    inclusion = np.zeros(NUM_OPTIONS)
+    counts = np.array(class_counts)
+    inclusion[mask] = expected[OPTION_WEIGHT_CLASS[mask]] / counts[OPTION_WEIGHT_CLASS[mask]]
+    return inclusion / num_picks
+
+
+@lru_cache(maxsize=None)
+def _pick_probability_table() -> np.ndarray:
+    """
+    (효율, 코어, 효과1, 효과2, 비용배율>1 여부, 남은 가공>1 여부, 옵션) 형태의 선택 확률표.
+    gem_simulator의 컴파일된 마스크 표를 그대로 사용하며, 같은 마스크는 한 번만 계산합니다.
+    """
+    table = np.zeros(CRAFT_OPTION_MASKS.shape)
+    cache: Dict[bytes, np.ndarray] = {}
+    for index in np.ndindex(*CRAFT_OPTION_MASKS.shape[:-1]):
+        mask = CRAFT_OPTION_MASKS[index]
+        key = mask.tobytes()
+        if key not in cache:
+            cache[key] = option_pick_probabilities(mask)
+        table[index] = cache[key]
+    return table
+
+
+def policy_grid_states(gem_grade: str) -> Tuple[np.ndarray, Tuple[int, ...]]:
+    """
+    정책표를 만들 때 모델에 넣을 전체 격자 상태(N, 6)와 정책표의 형태를 반환합니다.
+    상태 벡터는 최적화기와 같이 [효율, 코어, 1, 1, 남은 가공, 남은 리롤] 입니다.
+    """
+    shape = (5, 5, GEM_GRADES[gem_grade]['craft_count'] + 1, max_rerolls(gem_grade) + 1)
+    eff, core, crafts, rerolls = np.indices(shape)
+    ones = np.ones(eff.size)
+    states = np.stack([eff.ravel() + 1, core.ravel() + 1, ones, ones, crafts.ravel(), rerolls.ravel()], axis=1).astype(np.float32)
+    return states, shape
+
+
+def solve_lifecycle(gem_grade: str, target_core_point: int, target_efficiency: int, policy: Optional[np.ndarray], initialize_allowed: bool) -> Dict[str, float]:
+    """
+    젬 1개의 생애주기에 대한 성공 확률, 기대 가공 비용, 기대 초기화 횟수를 정확히 계산합니다.
+
+    Args:
+        gem_grade (str): 재료 젬 등급 ('advanced', 'rare', 'heroic').
+        target_core_point (int), target_efficiency (int): 목표 스펙.
+        policy (np.ndarray | None): policy_grid_states()의 형태를 가진 행동표 (0: 수락, 1: 리롤).
+            None이면 항상 0을 선택합니다.
+        initialize_allowed (bool): 초기화 조건(블루 크리스탈 가격 비교)의 결과.
+
+    Returns:
+        Dict[str, float]: success_rate, avg_craft_cost, avg_initialize_count
+    """
+    grade_info = GEM_GRADES[gem_grade]
+    num_crafts = grade_info['craft_count']
+    num_rerolls = max_rerolls(gem_grade) + 1
+    if policy is None:
+        policy = np.zeros((5, 5, num_crafts + 1, num_rerolls), dtype=np.int64)
+    if policy.shape != (5, 5, num_crafts + 1, num_rerolls):
+        raise ValueError(f"Policy table shape {policy.shape} does not match grade '{gem_grade}'.")
+    pick_table = _pick_probability_table()
+
+    # 상태 축: (효율, 코어, 효과1, 효과2, 남은 리롤, 비용배율 인덱스)
+    shape = (5, 5, 5, 5, num_rerolls, 2)
+    eff, core, effect1, effect2, rerolls, cost_up = np.indices(shape)
+    stats = {'efficiency': eff, 'core': core, 'effect1': effect1, 'effect2': effect2}
+    reached = (core + 1 >= target_core_point) & (eff + 1 >= target_efficiency)
+    needs_initialize = initialize_allowed & ~reached & ((core == 0) | (eff == 0))
+
+    success = reached.astype(np.float64)
+    craft_cost = np.zeros(shape)
+    initialize_count = np.zeros(shape)
+    for crafts in range(1, num_crafts + 1):
+        prev_success, prev_craft_cost, prev_initialize_count = success, craft_cost, initialize_count
+        actions = policy[eff, core, crafts, rerolls]
+        rerolls_after_action = np.where((actions == 1) & (rerolls > 0), rerolls - 1, rerolls)
+        pick_probs = pick_table[eff, core, effect1, effect2, cost_up, int(crafts > 1)]
+
+        success = np.zeros(shape); craft_cost = np.zeros(shape); initialize_count = np.zeros(shape)
+        for i, opt in enumerate(CRAFT_POSSIBILITIES):
+            option_type, value = opt['type'], opt['value']
+            next_index = dict(stats)
+            next_rerolls, next_cost_up = rerolls_after_action, cost_up
+            if option_type in STAT_KEYS:
+                next_index[option_type] = np.clip(stats[option_type] + value, 0, 4)
+            elif option_type in ('reroll_1', 'reroll_2'):
+                next_rerolls = np.minimum(rerolls_after_action + value, num_rerolls - 1)
+            elif option_type == 'cost_increase':
+                next_cost_up = np.ones_like(cost_up)
+            elif option_type == 'cost_decrease':
+                next_cost_up = np.zeros_like(cost_up)
+            index = (next_index['efficiency'], next_index['core'], next_index['effect1'], next_index['effect2'], next_rerolls, next_cost_up)
+            p = pick_probs[..., i]
+            success += p * prev_success[index]
+            craft_cost += p * (CRAFT_COST * (1 + next_cost_up) + prev_craft_cost[index])
+            initialize_count += p * prev_initialize_count[index]
+
+        # 초기화: 가공 횟수 1회를 소모하고 새 젬으로 교체 (남은 가공/리롤은 유지)
+        reset_index = (0, 0, 0, 0, rerolls, 0)
+        success = np.where(needs_initialize, prev_success[reset_index], success)
+        craft_cost = np.where(needs_initialize, prev_craft_cost[reset_index], craft_cost)
+        initialize_count = np.where(needs_initialize, 1 + prev_initialize_count[reset_index], initialize_count)
+
+        success[reached] = 1.0; craft_cost[reached] = 0.0; initialize_count[reached] = 0.0
+
+    start = (0, 0, 0, 0, grade_info['reroll_count'], 0)
+    return {
+        "success_rate": float(success[start]),
+        "avg_craft_cost": float(craft_cost[start]),
+        "avg_initialize_count": float(initialize_count[start]),
+    }
@@ -0,0 +1,132 @@
+# fake_market_server.py
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# ===================================================================
+# 로컬 가짜 거래소 서버 (개발/테스트용)
+#
+# 로스트아크 Open API의 POST /markets/items 응답 형식을 흉내 냅니다.
+# gem_metadata.json의 18종 젬과 같은 카테고리의 다른 아이템들을 페이지 단위로 돌려주며,
+# CategoryCode, PageNo, ItemName(부분 일치), ItemGrade 필터를 지원합니다.
+# 지연(latency)과 실패율(fail_rate)을 주어 재시도 로직도 확인할 수 있습니다.
+#
+# 사용 예: python fake_market_server.py --port 8001
+#          LOSTARK_API_BASE_URL=http://127.0.0.1:8001 uvicorn main:app
+# ===================================================================
+
+METADATA_FILE = "gem_metadata.json"
+GEM_CATEGORY_CODE = 230000
+FILLER_ITEM_COUNT = 40
+
+
+def _build_items(seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    with open(METADATA_FILE, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    items = []
+    for gem in metadata:
+        grade, name = gem["Grade"], gem["Name"].split(" 등급 ", 1)[1]
+        base_price = {"고급": 300, "희귀": 3000, "영웅": 30000}.get(grade, 1000)
+        items.append({"Id": gem["Id"], "Name": name, "Grade": grade, "CurrentMinPrice": base_price + rng.randint(0, base_price)})
+    for i in range(FILLER_ITEM_COUNT):
+        items.append({"Id": 67500000 + i, "Name": f"아크 그리드 재료 {i}", "Grade": rng.choice(["일반", "고급", "희귀"]), "CurrentMinPrice": rng.randint(1, 500)})
+    grade_order = {"일반": 0, "고급": 1, "희귀": 2, "영웅": 3}
+    items.sort(key=lambda item: grade_order.get(item["Grade"], 0), reverse=True)
+    for item in items:
+        item.update({"Icon": "", "BundleCount": 1, "TradeRemainCount": None, "YDayAvgPrice": float(item["CurrentMinPrice"]), "RecentPrice": item["CurrentMinPrice"]})
+    return items
+
+
+class FakeMarketServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, page_size: int = 10, latency: float = 0.0, fail_rate: float = 0.0, seed: int = 0):
+        super().__init__(address, _FakeMarketHandler)
+        self.items = _build_items(seed)
+        self.page_size = page_size
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    def shift_prices(self, delta: int):
+        """모든 아이템의 현재 최저가를 delta만큼 바꿉니다 (시세 변동 흉내)."""
+        with self.lock:
+            for item in self.items:
+                item["CurrentMinPrice"] = max(1, item["CurrentMinPrice"] + delta)
+
+    def search(self, body: Dict) -> Optional[Dict]:
+        with self.lock:
+            self.request_count += 1
+            if self.rng.random() < self.fail_rate:
+                return None
+            items = [item for item in self.items if body.get("CategoryCode") in (None, GEM_CATEGORY_CODE)]
+            if body.get("ItemName"):
+                items = [item for item in items if body["ItemName"] in item["Name"]]
+            if body.get("ItemGrade"):
+                items = [item for item in items if item["Grade"] == body["ItemGrade"]]
+            page_no = max(1, int(body.get("PageNo") or 1))
+            page = items[(page_no - 1) * self.page_size: page_no * self.page_size]
+            return {"PageNo": page_no, "PageSize": self.page_size, "TotalCount": len(items), "Items": [dict(item) for item in page]}
+
+
+class _FakeMarketHandler(BaseHTTPRequestHandler):
+    server: FakeMarketServer
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/markets/items":
+            self._send_json(404, {"Message": "Not Found"})
+            return
+        if not self.headers.get("authorization", "").lower().startswith("bearer "):
+            self._send_json(401, {"Message": "Unauthorized"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        result = self.server.search(body)
+        if result is None:
+            self._send_json(503, {"Message": "Service Unavailable"})
+        else:
+            self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_market_server(host: str = "127.0.0.1", port: int = 0, **kwargs) -> FakeMarketServer:
+    """가짜 서버를 백그라운드 스레드에서 시작합니다. port=0이면 빈 포트를 사용합니다 (server.server_address[1])."""
+    server = FakeMarketServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, name="fake-market-server", daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Lost Ark market API.")
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--page_size', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument('--fail_rate', type=float, default=0.0, help="Probability of answering 503")
+    args = parser.parse_args()
+
+    server = FakeMarketServer((args.host, args.port), page_size=args.page_size, latency=args.latency, fail_rate=args.fail_rate)
+    print(f"Fake market server listening on http://{args.host}:{args.port}/markets/items")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
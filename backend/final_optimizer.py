@@ -1,20 +1,57 @@
 # final_optimizer.py (모든 변수 범위 문제 최종 해결 버전)
-import tensorflow as tf
+import math
 import numpy as np
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Tuple, Callable
 import os
-import re
 from tqdm import tqdm
 import logging
 import redis
-import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-from gem_simulator import GemSimulator, GEM_GRADES
+from gem_simulator import GemSimulator, GEM_GRADES, CRAFT_POSSIBILITIES, create_gem_batch, sample_craft_options_batch, apply_craft_options_batch
 # GEM_INFO는 여기서 임포트하지 않고 클래스 내부로 이동
-from scenario_generator import generate_scenarios
+from scenario_generator import find_min_cost_combination
+from exact_solver import solve_lifecycle, policy_grid_states
+from policy_table import load_policy_tables, find_specialist_model_files
+from numpy_mlp import NumpyMLP
+from goal_policy import GOAL_MODEL_FILE, GOAL_TARGETS_FILE, GoalConditionedModels, load_goal_targets
+from simulation_stats import SimulationStatsStore, make_stats_key, fingerprint_files
+from result_cache import TwoTierCache, price_snapshot_hash
+from adaptive_sampling import race_candidates, estimate_cost, wilson_interval, moments_from_outcomes, stats_from_moments
+from common_random import CommonRandomStreams
+from metrics import LIFECYCLES_SIMULATED, MODEL_INFERENCE_CALLS, MODEL_BATCH_SIZE, stage_timer
 
 logger = logging.getLogger(__name__)
 
+# find_best_strategy 진행 이벤트를 받는 콜백 (event dict 하나를 인자로 받음)
+ProgressCallback = Callable[[Dict], None]
+
+# 후보 평가용 워커 프로세스마다 한 번만 만들어 두는 최적화기 (모델 로드 1회)
+_worker_optimizer: Optional["FinalOptimizer"] = None
+
+def _init_candidate_worker(models_dir: str, simulation_mode: str, model_backend: str):
+    global _worker_optimizer
+    _worker_optimizer = FinalOptimizer(models_dir=models_dir, simulation_mode=simulation_mode, model_backend=model_backend, workers=0, use_redis=False)
+
+def _compute_stats_in_worker(stats_args: tuple) -> Optional[Dict[str, float]]:
+    return _worker_optimizer._compute_lifecycle_stats(*stats_args)
+
+# ===================================================================
+# 제어 변량(control variate)용 옵션 속성표 (CRAFT_POSSIBILITIES 순서, 마지막 칸은 빈 자리(-1)용)
+#
+# crn 모드에서는 가공 스텝마다 "고른 옵션의 값 - 보여진 옵션들의 평균 값"을 생애주기별로 누적합니다.
+# 옵션은 보여진 것 중 균등하게 고르므로 이 합의 기댓값은 정확히 0이고, 가공 비용/성공 여부와 강하게 상관되어
+# adaptive_sampling에서 회귀로 빼 주면 같은 표본 수에서 분산이 줄어듭니다.
+#  - 0열: 가공 비용 증가분 900 * (적용 후 비용 배율)
+#  - 1열: 목표 진척도 min(코어, 목표 코어) + min(효율, 목표 효율)
+# ===================================================================
+
+_OPTION_CORE_DELTA = np.array([opt['value'] if opt['type'] == 'core' else 0 for opt in CRAFT_POSSIBILITIES] + [0])
+_OPTION_EFFICIENCY_DELTA = np.array([opt['value'] if opt['type'] == 'efficiency' else 0 for opt in CRAFT_POSSIBILITIES] + [0])
+_OPTION_SET_MODIFIER = np.array([{'cost_increase': 2.0, 'cost_decrease': 1.0}.get(opt['type'], np.nan) for opt in CRAFT_POSSIBILITIES] + [np.nan])
+NUM_CONTROL_VARIATES = 2
+
 class FinalOptimizer:
     # 모든 관련 상수를 클래스 변수로 이동 및 선언 
     GEM_GRADES_ORDER = ["고급", "희귀", "영웅"]
@@ -25,30 +62,93 @@ class FinalOptimizer:
         "안정": 8, "견고": 9, "불변": 10,
         "침식": 8, "왜곡": 9, "붕괴": 10,
     }
-    
-    def __init__(self, models_dir='./models/'):
-        self.models = self._load_specialist_models(models_dir)
+    # scalar: 젬 1개씩 시뮬레이션 / batch: 수천 개의 젬을 NumPy 배열로 동시에 진행
+    # exact: 시뮬레이션 없이 마르코프 체인 DP로 정확한 기대값 계산
+    # crn: batch와 같은 시뮬레이션을 생애주기 번호별 공통 난수 스트림(common_random)과 제어 변량으로 수행
+    SIMULATION_MODES = ("scalar", "batch", "exact", "crn")
+    # numpy: .h5 가중치를 읽어 NumPy로 순전파 (TensorFlow 불필요)
+    # keras: .h5 모델을 TensorFlow로 로드해 추론
+    # table: distill_policy.py로 만든 행동표를 배열 인덱싱으로 조회
+    # goal: train_goal.py로 만든 목표 조건부 모델(gem_model_goal.h5) 하나로 모든 목표를 NumPy 순전파
+    MODEL_BACKENDS = ("numpy", "keras", "table", "goal")
+    RESULT_CACHE_TTL_SECONDS = 21600
+    RESULT_CACHE_MAX_SIZE = 2048
+    # 적응형 표본 추출(target_precision)의 통계 키에 쓰는 모드 이름 (시뮬레이션 횟수 대신 누적 적률을 저장)
+    ADAPTIVE_STATS_MODE = "adaptive"
+    ADAPTIVE_CRN_STATS_MODE = "adaptive_crn"
+
+    def __init__(self, models_dir='./models/', simulation_mode: str = "batch", model_backend: str = "numpy", workers: int = 0, use_redis: bool = True):
+        if simulation_mode not in self.SIMULATION_MODES:
+            raise ValueError(f"Invalid simulation mode: {simulation_mode}")
+        if model_backend not in self.MODEL_BACKENDS:
+            raise ValueError(f"Invalid model backend: {model_backend}")
+        self.simulation_mode = simulation_mode
+        self.model_backend = model_backend
+        self.models = self._load_specialist_models(models_dir, model_backend)
+        self.models_version = self._get_models_version(models_dir, model_backend)
+        self.policy_tables: Dict[tuple, np.ndarray] = {}
         self.rng = np.random.default_rng()
-        try:
-            self.redis_client = redis.Redis(host='redis', port=6379, db=0, decode_responses=True)
-            self.redis_client.ping()
-            logger.info("Successfully connected to Redis.")
-        except redis.exceptions.ConnectionError as e:
-            logger.error(f"Could not connect to Redis: {e}. Caching will be disabled.")
-            self.redis_client = None
-
-    def _load_specialist_models(self, models_dir: str) -> Dict[tuple, tf.keras.Model]:
+        self.crn_streams = CommonRandomStreams()
+        # workers > 0 이면 (스펙, 재료 등급) 후보들을 프로세스 풀에서 병렬로 평가합니다.
+        # 풀은 인스턴스에 하나만 두어 동시에 들어온 /optimize 요청들이 함께 사용합니다.
+        self.executor = None
+        if workers > 0:
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_candidate_worker, initargs=(models_dir, simulation_mode, model_backend),
+            )
+            logger.info(f"Started candidate evaluation pool with {workers} worker processes.")
+        self.redis_client = None
+        if use_redis:
+            try:
+                self.redis_client = redis.Redis(host='redis', port=6379, db=0, decode_responses=True, socket_timeout=2, socket_connect_timeout=2)
+                self.redis_client.ping()
+                logger.info("Successfully connected to Redis.")
+            except redis.exceptions.ConnectionError as e:
+                logger.error(f"Could not connect to Redis: {e}. Caching will be disabled.")
+                self.redis_client = None
+        self.stats_store = SimulationStatsStore(self.redis_client)
+        self.result_cache = TwoTierCache(self.redis_client, max_size=self.RESULT_CACHE_MAX_SIZE, ttl=self.RESULT_CACHE_TTL_SECONDS, name="willpower_results")
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        """의지력별 결과 캐시와 생애주기 통계 캐시의 적중/실패 카운터."""
+        return {"willpower_results": self.result_cache.stats(), "lifecycle_stats": self.stats_store.cache.stats()}
+
+    @property
+    def adaptive_stats_mode(self) -> str:
+        """crn 모드에서는 공통 난수로 모은 적률을 일반 적응형 적률과 섞지 않습니다."""
+        return self.ADAPTIVE_CRN_STATS_MODE if self.simulation_mode == "crn" else self.ADAPTIVE_STATS_MODE
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def _load_specialist_models(self, models_dir: str, model_backend: str = "numpy") -> Dict[tuple, Any]:
         models = {}
-        logger.info(f"Loading specialist AI models from '{models_dir}'...")
-        pattern = re.compile(r"gem_model_c(\d+)_e(\d+)\.h5")
-        for filename in os.listdir(models_dir):
-            match = pattern.match(filename)
-            if match:
-                core_point = int(match.group(1))
-                efficiency = int(match.group(2))
-                model_path = os.path.join(models_dir, filename)
-                logger.info(f"  - Loading model for target ({core_point}, {efficiency}) from {filename}...")
-                model = tf.keras.models.load_model(model_path, compile=False)
+        if model_backend == "table":
+            policies_dir = os.path.join(models_dir, "policies")
+            logger.info(f"Loading distilled policy tables from '{policies_dir}'...")
+            models = load_policy_tables(policies_dir)
+            for core_point, efficiency in sorted(models):
+                logger.info(f"  - Loaded policy table for target ({core_point}, {efficiency})")
+        elif model_backend == "goal":
+            model_path = os.path.join(models_dir, GOAL_MODEL_FILE)
+            if not os.path.exists(model_path):
+                raise RuntimeError(f"Goal-conditioned model not found at '{model_path}'. Please run train_goal.py first.")
+            logger.info(f"Loading goal-conditioned AI model from '{model_path}'...")
+            models = GoalConditionedModels(NumpyMLP.from_h5(model_path), load_goal_targets(models_dir))
+            logger.info(f"  - Serving {len(models)} targets from one network")
+        else:
+            logger.info(f"Loading specialist AI models from '{models_dir}' ({model_backend} backend)...")
+            if model_backend == "keras":
+                import tensorflow as tf
+            for (core_point, efficiency), model_path in find_specialist_model_files(models_dir).items():
+                logger.info(f"  - Loading model for target ({core_point}, {efficiency}) from {os.path.basename(model_path)}...")
+                if model_backend == "keras":
+                    model = tf.keras.models.load_model(model_path, compile=False)
+                else:
+                    model = NumpyMLP.from_h5(model_path)
                 models[(core_point, efficiency)] = model
         if not models:
             logger.error(f"No specialist models found in '{models_dir}'. Please run train_specialist.py first.")
@@ -56,20 +156,55 @@ class FinalOptimizer:
         logger.info(f"Successfully loaded {len(models)} specialist models.")
         return models
 
-    def _get_action(self, model: tf.keras.Model, state_array: np.ndarray) -> int:
+    def _get_models_version(self, models_dir: str, model_backend: str) -> str:
+        if model_backend == "table":
+            policies_dir = os.path.join(models_dir, "policies")
+            paths = [os.path.join(policies_dir, name) for name in os.listdir(policies_dir)]
+        elif model_backend == "goal":
+            paths = [os.path.join(models_dir, GOAL_MODEL_FILE), os.path.join(models_dir, GOAL_TARGETS_FILE)]
+        else:
+            paths = list(find_specialist_model_files(models_dir).values())
+        return fingerprint_files(paths)
+
+    def _count_inference(self, batch_size: int):
+        MODEL_INFERENCE_CALLS.inc(backend=self.model_backend)
+        MODEL_BATCH_SIZE.observe(batch_size, backend=self.model_backend)
+
+    def _get_action(self, model: Any, state_array: np.ndarray) -> int:
+        self._count_inference(1)
+        if hasattr(model, "predict_actions"):
+            return int(model.predict_actions(state_array[np.newaxis, :])[0])
+        import tensorflow as tf
         state_tensor = tf.convert_to_tensor(state_array, dtype=tf.float32)
         q_values = model(tf.expand_dims(state_tensor, axis=0), training=False)
         return tf.argmax(q_values[0]).numpy()
 
-    def _simulate_one_gem_lifecycle(self, model: tf.keras.Model, target_spec: Dict, material_gem_grade_en: str, material_price: int, peon_gold_value: int, crystal_price: int) -> (bool, Dict[str, int]):
-        costs = { "craft_cost": 0, "initialize_cost": 0 }
+    def _get_actions_batch(self, model: Any, state_batch: np.ndarray) -> np.ndarray:
+        """(N, 6) 상태 배열 전체에 대해 한 번의 추론으로 행동을 고릅니다."""
+        self._count_inference(len(state_batch))
+        if hasattr(model, "predict_actions"):
+            return model.predict_actions(state_batch)
+        import tensorflow as tf
+        q_values = model(tf.convert_to_tensor(state_batch, dtype=tf.float32), training=False)
+        return np.argmax(q_values.numpy(), axis=1)
+
+    def _get_policy_table(self, target_key: tuple, model: Any, gem_grade_en: str) -> np.ndarray:
+        """모델을 전체 상태 격자에 대해 한 번 평가한 행동표를 만들어 캐시합니다. (exact 모드용)"""
+        table_key = (target_key, gem_grade_en)
+        if table_key not in self.policy_tables:
+            grid_states, shape = policy_grid_states(gem_grade_en)
+            self.policy_tables[table_key] = self._get_actions_batch(model, grid_states).reshape(shape)
+        return self.policy_tables[table_key]
+
+    def _simulate_one_gem_lifecycle(self, model: Any, target_spec: Dict, material_gem_grade_en: str, initialize_allowed: bool) -> (bool, Dict[str, int]):
+        costs = { "craft_cost": 0, "initialize_count": 0 }
         simulator = GemSimulator(gem_grade=material_gem_grade_en, rng=self.rng)
         target_cp, target_eff = target_spec.get('core_point'), target_spec.get('efficiency')
         while simulator.state['remaining_crafts'] > 0:
             if simulator.state['core'] >= target_cp and simulator.state['efficiency'] >= target_eff: return True, costs
-            should_initialize = (simulator.state['core'] == 1 or simulator.state['efficiency'] == 1) and (crystal_price < material_price + peon_gold_value)
+            should_initialize = (simulator.state['core'] == 1 or simulator.state['efficiency'] == 1) and initialize_allowed
             if should_initialize:
-                costs["initialize_cost"] += crystal_price
+                costs["initialize_count"] += 1
                 simulator.state['remaining_crafts'] -= 1
                 temp_remaining_crafts = simulator.state['remaining_crafts']
                 temp_remaining_rerolls = simulator.state['remaining_rerolls']
@@ -90,35 +225,183 @@ class FinalOptimizer:
         is_success = simulator.state['core'] >= target_cp and simulator.state['efficiency'] >= target_eff
         return is_success, costs
 
-    def get_true_expected_cost(self, target_spec: Dict, material_gem_grade_en: str, material_price: int, peon_gold_value: int, crystal_price: int, simulations: int) -> Dict[str, int]:
+    def _simulate_gem_lifecycles_batch(self, model: Any, target_spec: Dict, material_gem_grade_en: str, initialize_allowed: bool, num_lifecycles: int, streams: Optional[CommonRandomStreams] = None, first_lifecycle: int = 0) -> Tuple[np.ndarray, ...]:
+        """
+        _simulate_one_gem_lifecycle과 같은 규칙으로 num_lifecycles개의 젬을 한 스텝씩 동시에 진행합니다.
+        스텝마다 아직 진행 중인 젬 전체에 대해 모델 추론은 한 번만 하며,
+        젬마다의 (성공 여부, 가공 비용, 초기화 횟수) 배열을 반환합니다. (분산 추정을 위해 합계 대신 배열)
+        streams가 있으면 self.rng 대신 생애주기 번호 first_lifecycle부터의 공통 난수를 쓰고,
+        제어 변량 (N, NUM_CONTROL_VARIATES) 배열을 네 번째 값으로 함께 반환합니다.
+        """
+        states = create_gem_batch(material_gem_grade_en, num_lifecycles)
+        target_cp, target_eff = target_spec.get('core_point'), target_spec.get('efficiency')
+        active = np.ones(num_lifecycles, dtype=bool)
+        success = np.zeros(num_lifecycles, dtype=bool)
+        craft_cost = np.zeros(num_lifecycles, dtype=np.float64)
+        initialize_count = np.zeros(num_lifecycles, dtype=np.int64)
+        controls = np.zeros((num_lifecycles, NUM_CONTROL_VARIATES)) if streams is not None else None
+        step = 0
+        while active.any():
+            reached = active & (states['core'] >= target_cp) & (states['efficiency'] >= target_eff)
+            success |= reached
+            active &= ~reached
+            if initialize_allowed:
+                init_rows = np.flatnonzero(active & ((states['core'] == 1) | (states['efficiency'] == 1)))
+                if init_rows.size:
+                    initialize_count[init_rows] += 1
+                    states['remaining_crafts'][init_rows] -= 1
+                    for key in ('efficiency', 'core', 'effect1', 'effect2'): states[key][init_rows] = 1
+                    states['cost_modifier'][init_rows] = 1.0
+                craft_mask = active.copy(); craft_mask[init_rows] = False
+            else:
+                craft_mask = active
+            craft_rows = np.flatnonzero(craft_mask)
+            if craft_rows.size:
+                state_batch = np.stack([states['efficiency'][craft_rows], states['core'][craft_rows], np.ones(craft_rows.size), np.ones(craft_rows.size), states['remaining_crafts'][craft_rows], states['remaining_rerolls'][craft_rows]], axis=1)
+                actions = self._get_actions_batch(model, state_batch)
+                reroll_rows = craft_rows[(actions == 1) & (states['remaining_rerolls'][craft_rows] > 0)]
+                states['remaining_rerolls'][reroll_rows] -= 1
+                craft_states = {key: value[craft_rows] for key, value in states.items()}
+                if streams is None:
+                    options = sample_craft_options_batch(craft_states, self.rng)
+                    pick_uniforms = self.rng.random(craft_rows.size)
+                else:
+                    gumbel_noise, pick_uniforms = streams.step_draws(step, first_lifecycle + craft_rows)
+                    options = sample_craft_options_batch(craft_states, None, gumbel_noise=gumbel_noise)
+                num_valid = (options >= 0).sum(axis=1)
+                has_options = num_valid > 0
+                picks = np.minimum((pick_uniforms * num_valid).astype(np.int64), options.shape[1] - 1)
+                chosen = options[np.arange(craft_rows.size), picks]
+                if controls is not None:
+                    controls[craft_rows[has_options]] += self._pick_controls(craft_states, options, picks, num_valid, target_cp, target_eff)[has_options]
+                apply_craft_options_batch(states, chosen[has_options], craft_rows[has_options])
+                crafted_rows = craft_rows[has_options]
+                craft_cost[crafted_rows] += 900 * states['cost_modifier'][crafted_rows]
+                states['remaining_crafts'][craft_rows[~has_options]] -= 1
+            finished = active & (states['remaining_crafts'] <= 0)
+            success |= finished & (states['core'] >= target_cp) & (states['efficiency'] >= target_eff)
+            active &= ~finished
+            step += 1
+        if controls is not None:
+            return success, craft_cost, initialize_count, controls
+        return success, craft_cost, initialize_count
+
+    @staticmethod
+    def _pick_controls(craft_states: Dict[str, np.ndarray], options: np.ndarray, picks: np.ndarray, num_valid: np.ndarray, target_cp: int, target_eff: int) -> np.ndarray:
+        """보여진 옵션 중 고른 옵션의 (가공 비용 증가분, 목표 진척도)에서 보여진 옵션들의 평균을 뺀 값. (기댓값 0)"""
+        valid = options >= 0
+        modifier = np.where(np.isnan(_OPTION_SET_MODIFIER[options]), craft_states['cost_modifier'][:, np.newaxis], _OPTION_SET_MODIFIER[options])
+        core = np.minimum(np.clip(craft_states['core'][:, np.newaxis] + _OPTION_CORE_DELTA[options], 1, 5), target_cp)
+        efficiency = np.minimum(np.clip(craft_states['efficiency'][:, np.newaxis] + _OPTION_EFFICIENCY_DELTA[options], 1, 5), target_eff)
+        rows = np.arange(options.shape[0])
+        deviations = np.empty((options.shape[0], NUM_CONTROL_VARIATES))
+        for column, values in enumerate((900 * modifier, core + efficiency)):
+            deviations[:, column] = values[rows, picks] - np.where(valid, values, 0).sum(axis=1) / np.maximum(num_valid, 1)
+        return deviations
+
+    def _compute_lifecycle_stats(self, target_spec: Dict, material_gem_grade_en: str, initialize_allowed: bool, simulations: int, mode: str) -> Optional[Dict[str, float]]:
+        """
+        시세와 무관한 젬 1개 생애주기 통계(성공률, 평균 가공 비용, 평균 초기화 횟수)를 계산합니다.
+        시뮬레이션 모드에서는 적률 합계("moments")도 함께 반환합니다. 해당 목표의 모델이 없으면 None을 반환합니다.
+        """
         target_key = (target_spec['core_point'], target_spec['efficiency'])
         model = self.models.get(target_key)
-        if model is None: return { "gem_cost": float('inf'), "craft_cost": float('inf'), "peon_cost": float('inf'), "initialize_cost": float('inf') }
+        if model is None: return None
+        if mode == "exact":
+            with stage_timer("lifecycle_simulation"):
+                policy = self._get_policy_table(target_key, model, material_gem_grade_en)
+                stats = solve_lifecycle(material_gem_grade_en, target_key[0], target_key[1], policy, initialize_allowed)
+            LIFECYCLES_SIMULATED.inc(mode=mode)
+            return stats
         lifecycle_sims = max(simulations * 20, 2000)
-        outcomes = [self._simulate_one_gem_lifecycle(model, target_spec, material_gem_grade_en, material_price, peon_gold_value, crystal_price) for _ in range(lifecycle_sims)]
-        success_count = sum(1 for is_success, _ in outcomes if is_success)
-        success_rate_per_gem = success_count / lifecycle_sims
-        if success_rate_per_gem < 1e-9: return { "gem_cost": float('inf'), "craft_cost": float('inf'), "peon_cost": float('inf'), "initialize_cost": float('inf') }
-        avg_craft_cost = np.mean([c["craft_cost"] for _, c in outcomes])
-        avg_initialize_cost = np.mean([c["initialize_cost"] for _, c in outcomes])
-        expected_attempts = 1 / success_rate_per_gem
+        with stage_timer("lifecycle_simulation"):
+            if mode == "batch":
+                outcomes = self._simulate_gem_lifecycles_batch(model, target_spec, material_gem_grade_en, initialize_allowed, lifecycle_sims)
+            elif mode == "crn":
+                outcomes = self._simulate_gem_lifecycles_batch(model, target_spec, material_gem_grade_en, initialize_allowed, lifecycle_sims, streams=self.crn_streams)
+            else:
+                results = [self._simulate_one_gem_lifecycle(model, target_spec, material_gem_grade_en, initialize_allowed) for _ in range(lifecycle_sims)]
+                outcomes = ([is_success for is_success, _ in results], [c["craft_cost"] for _, c in results], [c["initialize_count"] for _, c in results])
+        LIFECYCLES_SIMULATED.inc(lifecycle_sims, mode=mode)
+        # 평균과 함께 2차 적률을 저장해 두면 어떤 시세에서든 기대 비용의 신뢰구간을 구할 수 있습니다.
+        return stats_from_moments(moments_from_outcomes(*outcomes))
+
+    def _stats_key(self, target_spec: Dict, material_gem_grade_en: str, initialize_allowed: bool, simulations: int, mode: str) -> str:
+        target_key = (target_spec['core_point'], target_spec['efficiency'])
+        # exact 모드는 시뮬레이션 횟수와 무관하므로 키에서 제외합니다.
+        return make_stats_key(self.models_version, mode, 0 if mode == "exact" else simulations, target_key, material_gem_grade_en, initialize_allowed)
+
+    def get_lifecycle_stats(self, target_spec: Dict, material_gem_grade_en: str, initialize_allowed: bool, simulations: int, mode: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """통계 저장소를 먼저 조회하고, 없을 때만 계산해서 저장합니다."""
+        mode = mode or self.simulation_mode
+        if mode not in self.SIMULATION_MODES:
+            raise ValueError(f"Invalid simulation mode: {mode}")
+        stats_key = self._stats_key(target_spec, material_gem_grade_en, initialize_allowed, simulations, mode)
+        stats = self.stats_store.get(stats_key)
+        if stats is None:
+            stats = self._compute_lifecycle_stats(target_spec, material_gem_grade_en, initialize_allowed, simulations, mode)
+            if stats is not None: self.stats_store.set(stats_key, stats)
+        return stats
+
+    @staticmethod
+    def _price_expected_costs(stats: Optional[Dict[str, float]], material_price: int, peon_gold_value: int, crystal_price: int) -> Dict[str, int]:
+        """가격과 무관한 통계를 현재 시세로 골드 환산합니다. (시뮬레이션 없이 산술만 수행)"""
+        if stats is None or stats["success_rate"] < 1e-9: return { "gem_cost": float('inf'), "craft_cost": float('inf'), "peon_cost": float('inf'), "initialize_cost": float('inf') }
+        expected_attempts = 1 / stats["success_rate"]
         avg_costs = {
             "gem_cost": int(expected_attempts * material_price),
-            "craft_cost": int(expected_attempts * avg_craft_cost),
+            "craft_cost": int(expected_attempts * stats["avg_craft_cost"]),
             "peon_cost": int(expected_attempts * peon_gold_value),
-            "initialize_cost": int(expected_attempts * avg_initialize_cost)
+            "initialize_cost": int(expected_attempts * stats["avg_initialize_count"] * crystal_price)
         }
         return avg_costs
 
-    def _calculate_min_cost_for_willpower(self, willpower_cost: int, gem_prices: Dict, crystal_price: int, core_type: str, simulations: int) -> Optional[Dict]:
-        cache_key = f"willpower_cost:{willpower_cost}:core_type:{core_type}:sims:{simulations}:crystal_price:{crystal_price}"
-        if self.redis_client:
-            cached_result = self.redis_client.get(cache_key)
-            if cached_result:
-                logger.info(f"Cache HIT for key: {cache_key}")
-                return json.loads(cached_result)
-        logger.info(f"Cache MISS for key: {cache_key}. Calculating...")
-        best_option = {"total_cost": float('inf')}
+    def get_true_expected_cost(self, target_spec: Dict, material_gem_grade_en: str, material_price: int, peon_gold_value: int, crystal_price: int, simulations: int, mode: Optional[str] = None) -> Dict[str, int]:
+        initialize_allowed = crystal_price < material_price + peon_gold_value
+        stats = self.get_lifecycle_stats(target_spec, material_gem_grade_en, initialize_allowed, simulations, mode)
+        return self._price_expected_costs(stats, material_price, peon_gold_value, crystal_price)
+
+    def _evaluate_candidates(self, candidate_args_list: List[tuple], progress_callback: Optional[ProgressCallback] = None) -> Tuple[List[Dict[str, int]], List[Optional[Dict]]]:
+        """
+        get_true_expected_cost 인자 목록을 평가해 같은 순서로 (비용 내역, 추정 정밀도) 목록을 반환합니다.
+        추정 정밀도는 적률이 있는 시뮬레이션 통계에만 있고 exact 모드에서는 None입니다.
+        통계 저장소에 없는 (목표, 재료 등급, 초기화 여부) 조합만 시뮬레이션하며, 풀이 있으면 병렬로 계산합니다.
+        progress_callback이 있으면 후보 하나를 시뮬레이션할 때마다 "candidate" 이벤트를 보냅니다.
+        """
+        stats_requests = {}
+        for spec, material_grade_en, material_price, peon_gold_value, crystal_price, simulations, mode in candidate_args_list:
+            initialize_allowed = crystal_price < material_price + peon_gold_value
+            stats_key = self._stats_key(spec, material_grade_en, initialize_allowed, simulations, mode)
+            stats_requests[stats_key] = (spec, material_grade_en, initialize_allowed, simulations, mode)
+        stats_by_key = self.stats_store.get_many(stats_requests)
+        missing_keys = [key for key in stats_requests if key not in stats_by_key]
+        if self.executor is None or len(missing_keys) <= 1:
+            stats_iter = (self._compute_lifecycle_stats(*stats_requests[key]) for key in missing_keys)
+        else:
+            stats_iter = self.executor.map(_compute_stats_in_worker, [stats_requests[key] for key in missing_keys])
+        computed = []
+        for key, stats in zip(missing_keys, stats_iter):
+            computed.append(stats)
+            if progress_callback is not None:
+                spec, material_grade_en = stats_requests[key][:2]
+                progress_callback({"stage": "candidate", "spec": f"c{spec['core_point']}_e{spec['efficiency']}", "material_grade": material_grade_en, "done": len(computed), "total": len(missing_keys)})
+        for key, stats in zip(missing_keys, computed):
+            stats_by_key[key] = stats
+        self.stats_store.set_many({key: stats for key, stats in zip(missing_keys, computed) if stats is not None})
+        breakdowns, confidences = [], []
+        for spec, material_grade_en, material_price, peon_gold_value, crystal_price, simulations, mode in candidate_args_list:
+            initialize_allowed = crystal_price < material_price + peon_gold_value
+            stats = stats_by_key[self._stats_key(spec, material_grade_en, initialize_allowed, simulations, mode)]
+            breakdowns.append(self._price_expected_costs(stats, material_price, peon_gold_value, crystal_price))
+            confidences.append(self._confidence(stats["moments"], material_price + peon_gold_value, crystal_price) if stats and stats.get("moments") else None)
+        return breakdowns, confidences
+
+    def _willpower_cache_key(self, willpower_cost: int, core_type: str, simulations: int, snapshot_hash: str, target_precision: Optional[float] = None) -> str:
+        sampling = f"sims:{simulations}:mode:{self.simulation_mode}" if target_precision is None else f"precision:{target_precision}:mode:{self.adaptive_stats_mode}"
+        return f"willpower_result:v2:{self.models_version}:prices:{snapshot_hash}:core_type:{core_type}:willpower_cost:{willpower_cost}:{sampling}"
+
+    def _build_candidates(self, willpower_cost: int, gem_prices: Dict, crystal_price: int, core_type: str, simulations: int) -> List[tuple]:
+        """의지력 소모량에 맞는 (스펙, 재료 젬 이름, get_true_expected_cost 인자) 후보 목록을 만듭니다."""
         candidate_specs = []
         # self.GEM_INFO 로 참조 방식 변경
         for gem_type, base_cost in self.GEM_INFO.items():
@@ -126,6 +409,7 @@ class FinalOptimizer:
             if (core_type == "질서" and not is_order_gem) or (core_type == "혼돈" and is_order_gem): continue
             efficiency = base_cost - willpower_cost
             if 1 <= efficiency <= 5: candidate_specs.append({'type': gem_type, 'core_point': 5, 'efficiency': efficiency})
+        candidates = []
         for spec in candidate_specs:
             spec_type = spec['type']
             for material_grade_kr in self.GEM_GRADES_ORDER:
@@ -139,44 +423,186 @@ class FinalOptimizer:
                 # self.CRYSTALS_PER_PEON 으로 참조 방식 변경
                 required_crystals = required_peons * self.CRYSTALS_PER_PEON
                 peon_gold_value = (required_crystals / 100) * crystal_price
-                expected_costs_breakdown = self.get_true_expected_cost(spec, material_grade_en, material_price, peon_gold_value, crystal_price, simulations)
-                total_expected_cost = sum(expected_costs_breakdown.values())
-                if total_expected_cost < best_option["total_cost"]:
-                    best_option = {
-                        "target_spec_str": f"({spec['type']}, {spec['core_point']}, {spec['efficiency']})",
-                        "material_gem": material_full_name,
-                        "willpower_cost": willpower_cost,
-                        "total_cost": total_expected_cost,
-                        "breakdown": {
-                            "gem_cost": expected_costs_breakdown["gem_cost"],
-                            "craft_cost": expected_costs_breakdown["craft_cost"],
-                            "peon_cost": expected_costs_breakdown["peon_cost"],
-                            "initialize_cost": expected_costs_breakdown["initialize_cost"]
-                        }
+                candidates.append((spec, material_full_name, (spec, material_grade_en, material_price, peon_gold_value, crystal_price, simulations, self.simulation_mode)))
+        return candidates
+
+    def _select_best_option(self, willpower_cost: int, candidates: List[tuple], breakdowns: List[Dict[str, int]], confidences: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """
+        후보 생성 순서대로 비교해 총 기대 비용이 가장 낮은 옵션을 고릅니다. (동률이면 먼저 나온 후보)
+        confidences가 있으면 고른 후보의 추정 정밀도를 "confidence"로 붙입니다.
+        """
+        best_option = {"total_cost": float('inf')}
+        for index, ((spec, material_full_name, _), expected_costs_breakdown) in enumerate(zip(candidates, breakdowns)):
+            total_expected_cost = sum(expected_costs_breakdown.values())
+            if total_expected_cost < best_option["total_cost"]:
+                best_option = {
+                    "target_spec_str": f"({spec['type']}, {spec['core_point']}, {spec['efficiency']})",
+                    "material_gem": material_full_name,
+                    "willpower_cost": willpower_cost,
+                    "total_cost": total_expected_cost,
+                    "breakdown": {
+                        "gem_cost": expected_costs_breakdown["gem_cost"],
+                        "craft_cost": expected_costs_breakdown["craft_cost"],
+                        "peon_cost": expected_costs_breakdown["peon_cost"],
+                        "initialize_cost": expected_costs_breakdown["initialize_cost"]
                     }
-        result = best_option if best_option["total_cost"] != float('inf') else None
-        if self.redis_client and result:
-            self.redis_client.set(cache_key, json.dumps(result), ex=21600)
-            logger.info(f"Result for key {cache_key} stored in cache.")
-        return result
+                }
+                if confidences is not None and confidences[index] is not None: best_option["confidence"] = confidences[index]
+        return best_option if best_option["total_cost"] != float('inf') else None
+
+    def _calculate_min_costs_for_willpowers(self, willpower_costs: List[int], gem_prices: Dict, crystal_price: int, core_type: str, simulations: int, progress_callback: Optional[ProgressCallback] = None, target_precision: Optional[float] = None) -> Dict[int, Optional[Dict]]:
+        """
+        한 코어에 필요한 모든 의지력 소모량의 최소 비용 옵션을 한 번에 구합니다.
+        캐시는 한 번에 조회(MGET)하고, 없는 값들의 후보는 모아서 평가한 뒤 한 번에 저장합니다.
+        캐시 키에는 시세 스냅샷 해시가 들어가므로 젬 시세가 바뀌면 이전 결과를 쓰지 않습니다.
+        target_precision이 있으면 (exact 모드 제외) 고정 횟수 대신 적응형 표본 추출과 후보 경주로 평가합니다.
+        """
+        if self.simulation_mode == "exact": target_precision = None
+        snapshot_hash = price_snapshot_hash(gem_prices, crystal_price)
+        cache_keys = {willpower_cost: self._willpower_cache_key(willpower_cost, core_type, simulations, snapshot_hash, target_precision) for willpower_cost in willpower_costs}
+        cached_results = self.result_cache.get_many(cache_keys.values())
+        results = {willpower_cost: cached_results[key] for willpower_cost, key in cache_keys.items() if key in cached_results}
+        missing = [willpower_cost for willpower_cost in cache_keys if willpower_cost not in results]
+        if results: logger.info(f"Cache HIT for willpower costs {sorted(results)} (core_type: {core_type}, prices: {snapshot_hash})")
+        if progress_callback is not None:
+            for willpower_cost in sorted(results): progress_callback({"stage": "willpower", "willpower_cost": willpower_cost, "cached": True})
+        if not missing: return results
+        logger.info(f"Cache MISS for willpower costs {missing} (core_type: {core_type}, prices: {snapshot_hash}). Calculating...")
+        candidates_by_willpower = {willpower_cost: self._build_candidates(willpower_cost, gem_prices, crystal_price, core_type, simulations) for willpower_cost in missing}
+        if target_precision is not None:
+            raced = self._race_min_cost_options(candidates_by_willpower, target_precision, progress_callback)
+            results.update(raced)
+            self.result_cache.set_many({cache_keys[willpower_cost]: option for willpower_cost, option in raced.items() if option})
+            return results
+        # 여러 의지력 값의 후보를 한 번에 평가해야 프로세스 풀을 고르게 활용할 수 있습니다.
+        breakdowns, confidences = self._evaluate_candidates([candidate_args for willpower_cost in missing for _, _, candidate_args in candidates_by_willpower[willpower_cost]], progress_callback)
+        to_store, offset = {}, 0
+        for willpower_cost in missing:
+            candidates = candidates_by_willpower[willpower_cost]
+            results[willpower_cost] = self._select_best_option(willpower_cost, candidates, breakdowns[offset:offset + len(candidates)], confidences[offset:offset + len(candidates)])
+            offset += len(candidates)
+            if results[willpower_cost]: to_store[cache_keys[willpower_cost]] = results[willpower_cost]
+            if progress_callback is not None: progress_callback({"stage": "willpower", "willpower_cost": willpower_cost, "cached": False})
+        self.result_cache.set_many(to_store)
+        return results
+
+    def _race_min_cost_options(self, candidates_by_willpower: Dict[int, List[tuple]], target_precision: float, progress_callback: Optional[ProgressCallback] = None) -> Dict[int, Optional[Dict]]:
+        """
+        의지력 소모량마다 후보들을 경주시켜 최소 비용 옵션을 고릅니다 (adaptive_sampling.race_candidates).
+        후보별 적률은 (스펙, 재료 등급, 초기화 여부) 키로 통계 저장소에 쌓아 두고, 다음 요청에서는 이어서 표본을 늘립니다.
+        crn 모드에서는 후보마다 이미 모은 생애주기 수 다음 번호부터 공통 난수 스트림을 이어서 씁니다.
+        """
+        stats_mode = self.adaptive_stats_mode
+        stats_requests, keys_by_willpower = {}, {}
+        for willpower_cost, candidates in candidates_by_willpower.items():
+            candidates_by_willpower[willpower_cost] = candidates = [c for c in candidates if (c[2][0]['core_point'], c[2][0]['efficiency']) in self.models]
+            keys_by_willpower[willpower_cost] = []
+            for spec, material_grade_en, material_price, peon_gold_value, crystal_price, _, _ in (c[2] for c in candidates):
+                initialize_allowed = crystal_price < material_price + peon_gold_value
+                stats_key = self._stats_key(spec, material_grade_en, initialize_allowed, 0, stats_mode)
+                stats_requests[stats_key] = (spec, material_grade_en, initialize_allowed)
+                keys_by_willpower[willpower_cost].append(stats_key)
+        moments_by_key = {key: stats["moments"] for key, stats in self.stats_store.get_many(stats_requests).items() if stats.get("moments")}
+        next_lifecycle = {key: int(moments_by_key[key]["n"]) if key in moments_by_key else 0 for key in stats_requests}
+        streams = self.crn_streams if self.simulation_mode == "crn" else None
+
+        def sample(stats_key: str, lifecycles: int):
+            spec, material_grade_en, initialize_allowed = stats_requests[stats_key]
+            model = self.models[(spec['core_point'], spec['efficiency'])]
+            with stage_timer("lifecycle_simulation"):
+                outcomes = self._simulate_gem_lifecycles_batch(model, spec, material_grade_en, initialize_allowed, lifecycles, streams=streams, first_lifecycle=next_lifecycle[stats_key])
+            next_lifecycle[stats_key] += lifecycles
+            LIFECYCLES_SIMULATED.inc(lifecycles, mode=stats_mode)
+            return outcomes
+
+        results, done, total = {}, 0, sum(len(candidates) for candidates in candidates_by_willpower.values())
+        for willpower_cost, candidates in candidates_by_willpower.items():
+            keys = keys_by_willpower[willpower_cost]
+            pricing = [(args[2] + args[3], args[4]) for _, _, args in candidates]
+            moments, _ = race_candidates(pricing, lambda i, lifecycles: sample(keys[i], lifecycles), target_precision, [moments_by_key.get(key) for key in keys])
+            breakdowns, confidences = [], []
+            for stats_key, candidate_moments, (fixed_cost, crystal_price), (_, _, args) in zip(keys, moments, pricing, candidates):
+                moments_by_key[stats_key] = candidate_moments
+                breakdowns.append(self._price_expected_costs(stats_from_moments(candidate_moments), args[2], args[3], crystal_price))
+                confidences.append(self._confidence(candidate_moments, fixed_cost, crystal_price))
+                done += 1
+                if progress_callback is not None:
+                    progress_callback({"stage": "candidate", "spec": f"c{args[0]['core_point']}_e{args[0]['efficiency']}", "material_grade": args[1], "done": done, "total": total})
+            results[willpower_cost] = self._select_best_option(willpower_cost, candidates, breakdowns, confidences)
+            if progress_callback is not None: progress_callback({"stage": "willpower", "willpower_cost": willpower_cost, "cached": False})
+        self.stats_store.set_many({key: stats_from_moments(m) for key, m in moments_by_key.items() if m["n"] > 0})
+        return results
+
+    @staticmethod
+    def _confidence(moments: Dict[str, float], fixed_cost: float, crystal_price: float) -> Dict:
+        """후보의 총 기대 비용 추정 정밀도 (95% 신뢰구간, 표준오차, 제어 변량에 의한 분산 감소 배수)."""
+        estimate = estimate_cost(moments, fixed_cost, crystal_price)
+        return {
+            "lifecycles": estimate["lifecycles"],
+            "total_cost_interval": [int(estimate["lower"]), int(estimate["upper"])] if math.isfinite(estimate["upper"]) else None,
+            "standard_error": int(estimate["standard_error"]) if math.isfinite(estimate["standard_error"]) else None,
+            "relative_half_width": round(estimate["relative_half_width"], 4) if math.isfinite(estimate["relative_half_width"]) else None,
+            "variance_reduction": round(estimate["variance_reduction"], 2),
+            "success_rate": moments["s"] / moments["n"],
+            "success_rate_interval": list(wilson_interval(moments["s"], moments["n"])),
+        }
+
+    def _calculate_min_cost_for_willpower(self, willpower_cost: int, gem_prices: Dict, crystal_price: int, core_type: str, simulations: int, target_precision: Optional[float] = None) -> Optional[Dict]:
+        return self._calculate_min_costs_for_willpowers([willpower_cost], gem_prices, crystal_price, core_type, simulations, target_precision=target_precision)[willpower_cost]
+
+    def _willpower_cost_range(self, core_type: str) -> Tuple[int, int]:
+        """코어 타입에 맞는 젬들의 의지력 소모량 범위 (기본 비용 - 효율 5 ~ 기본 비용 - 효율 1)."""
+        base_costs = [base_cost for gem_type, base_cost in self.GEM_INFO.items() if (gem_type in ["안정", "견고", "불변"]) == (core_type == "질서")]
+        return min(base_costs) - 5, max(base_costs) - 1
+
+    def _find_best_combination(self, core_type: str, remaining_willpower: int, remaining_slots: int, gem_prices: Dict, crystal_price: int, simulations: int, progress_callback: Optional[ProgressCallback] = None, target_precision: Optional[float] = None) -> Optional[Tuple[float, List[Dict]]]:
+        """의지력 소모량별 최소 비용표를 만든 뒤, DP로 슬롯 수와 의지력을 정확히 맞추는 최소 비용 조합을 찾습니다."""
+        min_cost, max_cost = self._willpower_cost_range(core_type)
+        other_slots = remaining_slots - 1
+        # 나머지 슬롯으로 남은 의지력을 채울 수 있는 소모량만 계산합니다.
+        willpower_costs = [
+            willpower_cost for willpower_cost in range(min_cost, max_cost + 1)
+            if other_slots >= 0 and other_slots * min_cost <= remaining_willpower - willpower_cost <= other_slots * max_cost
+        ]
+        min_cost_options = self._calculate_min_costs_for_willpowers(willpower_costs, gem_prices, crystal_price, core_type, simulations, progress_callback, target_precision)
+        cost_table = {willpower_cost: option['total_cost'] for willpower_cost, option in min_cost_options.items() if option is not None}
+        best = find_min_cost_combination(remaining_willpower, remaining_slots, cost_table)
+        if best is None: return None
+        total_cost, combination = best
+        return total_cost, [min_cost_options[willpower_cost] for willpower_cost in combination]
+
+    def warm_up(self, gem_prices: Dict, crystal_price: int, simulations: int, core_types: Tuple[str, ...] = ("질서", "혼돈")) -> Dict[str, Dict]:
+        """
+        코어 타입마다 가능한 모든 의지력 소모량의 최소 비용표를 미리 계산해 결과 캐시와 생애주기 통계 캐시를 채웁니다.
+        통계는 시세와 무관하게 저장되므로, 다른 크리스탈 시세로 들어온 요청도 시뮬레이션 없이 산술만 하게 됩니다.
+        """
+        summary = {}
+        for core_type in core_types:
+            min_cost, max_cost = self._willpower_cost_range(core_type)
+            options = self._calculate_min_costs_for_willpowers(list(range(min_cost, max_cost + 1)), gem_prices, crystal_price, core_type, simulations)
+            summary[core_type] = {"willpower_costs": len(options), "with_option": sum(1 for option in options.values() if option is not None)}
+        return summary
 
-    def find_best_strategy(self, remaining_info: List[Dict], gem_prices: Dict, crystal_price: int, simulations: int) -> Dict:
+    def find_best_strategy(self, remaining_info: List[Dict], gem_prices: Dict, crystal_price: int, simulations: int, progress_callback: Optional[ProgressCallback] = None, target_precision: Optional[float] = None) -> Dict:
+        """
+        target_precision(예: 0.02)이 주어지면 simulations 대신 기대 비용 95% 신뢰구간의 상대 반폭이
+        이 값 이하가 될 때까지 표본을 늘리고, 확실히 비싼 후보는 일찍 탈락시킵니다.
+        progress_callback(event)이 주어지면 진행 이벤트를 보냅니다.
+        event["stage"]: "core"(코어 시작), "candidate"(후보 스펙 시뮬레이션 완료), "willpower"(의지력 소모량별 최소 비용 확정)
+        """
         final_strategy = {"total_cost": 0, "details_per_core": []}
-        for core in tqdm(remaining_info, desc="Optimizing Cores"):
+        # 같은 (코어 타입, 남은 의지력, 남은 슬롯)의 코어는 결과를 재사용합니다.
+        best_by_core_state: Dict[tuple, Optional[Tuple[float, List[Dict]]]] = {}
+        for core_index, core in enumerate(tqdm(remaining_info, desc="Optimizing Cores")):
             core_type = core['core'].split(' ')[1]
-            scenarios = generate_scenarios(core['remaining_willpower'], core['remaining_slots'])
-            best_scenario_for_core = {"cost": float('inf'), "combination": []}
-            for scenario in scenarios:
-                current_scenario_cost = 0; current_scenario_details = []; is_possible = True
-                for willpower_cost in scenario:
-                    min_cost_option = self._calculate_min_cost_for_willpower(willpower_cost, gem_prices, crystal_price, core_type, simulations)
-                    if min_cost_option is None: is_possible = False; break
-                    current_scenario_cost += min_cost_option['total_cost']
-                    current_scenario_details.append(min_cost_option)
-                if is_possible and current_scenario_cost < best_scenario_for_core['cost']:
-                    best_scenario_for_core['cost'] = current_scenario_cost
-                    best_scenario_for_core['combination'] = current_scenario_details
-            if best_scenario_for_core['cost'] != float('inf'):
-                final_strategy['total_cost'] += best_scenario_for_core['cost']
-                final_strategy['details_per_core'].append({ "core": core['core'], "best_combination": best_scenario_for_core['combination'] })
+            core_state = (core_type, core['remaining_willpower'], core['remaining_slots'])
+            if progress_callback is not None:
+                progress_callback({"stage": "core", "core": core['core'], "core_index": core_index, "core_count": len(remaining_info)})
+            if core_state not in best_by_core_state:
+                best_by_core_state[core_state] = self._find_best_combination(core_type, core['remaining_willpower'], core['remaining_slots'], gem_prices, crystal_price, simulations, progress_callback, target_precision)
+            best = best_by_core_state[core_state]
+            if best is not None:
+                total_cost, combination = best
+                final_strategy['total_cost'] += total_cost
+                final_strategy['details_per_core'].append({ "core": core['core'], "best_combination": combination })
         return final_strategy
@@ -1,29 +1,44 @@
 # gem_env.py
 import gymnasium as gym
 from gymnasium import spaces
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from gem_simulator import GemSimulator, GEM_GRADES, create_gem_batch, sample_craft_options_batch, apply_craft_options_batch
+
+
+def _observation_space(gem_grade: str, goal_conditioned: bool = False) -> spaces.Box:
+    grade_info = GEM_GRADES[gem_grade]
+    low = [1, 1, 1, 1, 0, 0]
+    high = [5, 5, 5, 5, grade_info['craft_count'], grade_info['reroll_count'] + 20]
+    if goal_conditioned:
+        # 목표 조건부(goal-conditioned) 관측: 상태 6개 뒤에 [목표 효율, 목표 코어]를 붙입니다.
+        low += [1, 1]
+        high += [5, 5]
+    return spaces.Box(np.array(low, dtype=np.float32), np.array(high, dtype=np.float32), dtype=np.float32)
 
-from gem_simulator import GemSimulator, GEM_GRADES
 
 class GemCraftingEnv(gym.Env):
     metadata = {"render_modes": ["human"]}
 
-    def __init__(self, gem_grade: str, targets: Dict[str, int]):
+    def __init__(self, gem_grade: str, targets: Dict[str, int], goal_conditioned: bool = False):
         super().__init__()
         self.gem_grade = gem_grade
         # *** 목표를 인자로 받아 저장 ***
         self.targets = targets 
+        self.goal_conditioned = goal_conditioned
         self.simulator = None
         self.action_space = spaces.Discrete(2)
-        grade_info = GEM_GRADES[self.gem_grade]
-        low = np.array([1, 1, 1, 1, 0, 0], dtype=np.float32)
-        high = np.array([5, 5, 5, 5, grade_info['craft_count'], grade_info['reroll_count'] + 20], dtype=np.float32)
-        self.observation_space = spaces.Box(low, high, dtype=np.float32)
+        self.observation_space = _observation_space(self.gem_grade, goal_conditioned)
 
     def _get_obs(self) -> np.ndarray:
         state = self.simulator.state
-        return np.array([state['efficiency'], state['core'], state['effect1'], state['effect2'], state['remaining_crafts'], state['remaining_rerolls']], dtype=np.float32)
+        obs = [state['efficiency'], state['core'], state['effect1'], state['effect2'], state['remaining_crafts'], state['remaining_rerolls']]
+        if self.goal_conditioned:
+            obs += [self.targets.get('efficiency', 1), self.targets.get('core', 1)]
+        return np.array(obs, dtype=np.float32)
 
     def _is_target_reached(self) -> bool:
         """환경이 자신의 목표 달성 여부를 직접 판단"""
@@ -32,7 +47,10 @@ class GemCraftingEnv(gym.Env):
                 state['core'] >= self.targets.get('core', 1))
 
     def reset(self, seed=None, options=None) -> Tuple[np.ndarray, Dict]:
+        """options={"targets": {...}}이면 이번 에피소드부터 목표를 바꿉니다."""
         super().reset(seed=seed)
+        if options is not None and "targets" in options:
+            self.targets = options["targets"]
         self.simulator = GemSimulator(gem_grade=self.gem_grade, rng=self.np_random)
         return self._get_obs(), {}
 
@@ -55,3 +73,101 @@ class GemCraftingEnv(gym.Env):
             reward -= 100.0; terminated = True
         truncated = False
         return self._get_obs(), reward, terminated, truncated, {}
+
+
+# ===================================================================
+# 벡터화 환경 (Gymnasium VectorEnv)
+#
+# GemCraftingEnv N개를 NumPy 배열 하나로 묶어 한 번에 진행합니다.
+# 옵션 추출은 gem_simulator의 배치 API(Gumbel-top-k)로 N개를 한 번에 하고,
+# 보상과 종료 조건은 GemCraftingEnv.step과 같습니다.
+# 끝난 젬은 같은 step에서 바로 새 젬으로 바뀌며 (AutoresetMode.SAME_STEP),
+# 끝나기 직전의 관측은 infos["final_obs"] (마스크 infos["_final_obs"])로 돌려줍니다.
+#
+# targets에 목표 dict의 리스트를 주면, 젬을 새로 만들 때마다 환경별로 목표 하나를 균등하게 뽑습니다.
+# goal_conditioned=True이면 관측 뒤에 환경별 [목표 효율, 목표 코어]를 붙입니다.
+# ===================================================================
+
+class GemCraftingVectorEnv(VectorEnv):
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs: int, gem_grade: str, targets, goal_conditioned: bool = False):
+        super().__init__()
+        if gem_grade not in GEM_GRADES:
+            raise ValueError(f"Invalid gem grade: {gem_grade}")
+        self.num_envs = num_envs
+        self.gem_grade = gem_grade
+        self.targets = targets
+        self.goal_conditioned = goal_conditioned
+        target_list: List[Dict[str, int]] = targets if isinstance(targets, list) else [targets]
+        self._target_choices = np.array([[t.get('efficiency', 1), t.get('core', 1)] for t in target_list], dtype=np.int64)
+        self.single_action_space = spaces.Discrete(2)
+        self.single_observation_space = _observation_space(gem_grade, goal_conditioned)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.states = create_gem_batch(gem_grade, num_envs)
+        # 환경별 [목표 효율, 목표 코어]
+        self.goals = np.empty((num_envs, 2), dtype=np.int64)
+        self._assign_goals(np.arange(num_envs))
+
+    def _get_obs(self) -> np.ndarray:
+        states = self.states
+        columns = [states['efficiency'], states['core'], states['effect1'], states['effect2'], states['remaining_crafts'], states['remaining_rerolls']]
+        if self.goal_conditioned:
+            columns += [self.goals[:, 0], self.goals[:, 1]]
+        return np.stack(columns, axis=1).astype(np.float32)
+
+    def _assign_goals(self, rows: np.ndarray):
+        if len(self._target_choices) == 1:
+            self.goals[rows] = self._target_choices[0]
+        else:
+            self.goals[rows] = self._target_choices[self.np_random.integers(len(self._target_choices), size=rows.size)]
+
+    def _reset_rows(self, rows: np.ndarray):
+        fresh = create_gem_batch(self.gem_grade, rows.size)
+        for key, values in fresh.items():
+            self.states[key][rows] = values
+        self._assign_goals(rows)
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[Dict] = None) -> Tuple[np.ndarray, Dict]:
+        """options={"reset_mask": (N,) bool}이면 해당 환경만 새 젬으로 바꿉니다."""
+        super().reset(seed=seed)
+        if options is not None and "reset_mask" in options:
+            self._reset_rows(np.flatnonzero(options["reset_mask"]))
+        else:
+            self.states = create_gem_batch(self.gem_grade, self.num_envs)
+            self._assign_goals(np.arange(self.num_envs))
+        return self._get_obs(), {}
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Dict]:
+        states = self.states
+        actions = np.asarray(actions)
+        rows = np.arange(self.num_envs)
+        rewards = np.full(self.num_envs, -1.0)
+        wants_reroll = actions == 1
+        rerolled = wants_reroll & (states['remaining_rerolls'] > 0)
+        rewards[rerolled] -= 2.0
+        states['remaining_rerolls'][rerolled] -= 1
+        rewards[wants_reroll & ~rerolled] -= 10.0
+
+        options = sample_craft_options_batch(states, self.np_random)
+        num_valid = (options >= 0).sum(axis=1)
+        has_options = num_valid > 0
+        # GemCraftingEnv처럼 보여진 옵션 중 하나를 균등하게 고릅니다.
+        picks = np.minimum((self.np_random.random(self.num_envs) * num_valid).astype(np.int64), options.shape[1] - 1)
+        apply_craft_options_batch(states, options[rows, picks][has_options], rows[has_options])
+
+        reached = (states['efficiency'] >= self.goals[:, 0]) & (states['core'] >= self.goals[:, 1])
+        exhausted = ~reached & (states['remaining_crafts'] <= 0)
+        rewards[reached] += 100.0
+        rewards[exhausted] -= 100.0
+        terminations = reached | exhausted
+        truncations = np.zeros(self.num_envs, dtype=bool)
+
+        observations = self._get_obs()
+        infos = {}
+        if terminations.any():
+            infos = {"final_obs": observations.copy(), "_final_obs": terminations.copy()}
+            self._reset_rows(np.flatnonzero(terminations))
+            observations = self._get_obs()
+        return observations, rewards, terminations, truncations, infos
@@ -1,6 +1,6 @@
 # gem_simulator.py
 import numpy as np
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 
 GEM_GRADES = {
@@ -45,6 +45,109 @@ CRAFT_POSSIBILITIES = [
     {'type': 'reroll_2', 'value': 2, 'probability': 0.75, 'condition': lambda gem: gem['remaining_crafts'] > 1}
 ]
 
+STAT_KEYS = ['efficiency', 'core', 'effect1', 'effect2']
+OPTION_PROBABILITIES = np.array([opt['probability'] for opt in CRAFT_POSSIBILITIES], dtype=np.float64)
+
+
+# ===================================================================
+# 컴파일된 옵션 규칙표
+#
+# 모든 condition은 (효율, 코어, 효과1, 효과2, 비용배율>1 여부, 남은 가공>1 여부)에만 의존하므로,
+# 대표 상태로 한 번씩 평가해 (5, 5, 5, 5, 2, 2, 27) 마스크 표를 미리 만들어 둡니다.
+# 샘플링은 로그 확률에 Gumbel 노이즈를 더해 상위 k개를 고르는 Gumbel-top-k 방식으로,
+# 확률에 비례해 하나씩 비복원 추출하는 기존 방식과 같은 분포를 한 번의 벡터 연산으로 얻습니다.
+# ===================================================================
+
+def _compile_option_masks() -> np.ndarray:
+    masks = np.zeros((5, 5, 5, 5, 2, 2, len(CRAFT_POSSIBILITIES)), dtype=bool)
+    for index in np.ndindex(*masks.shape[:-1]):
+        eff, core, effect1, effect2, cost_up, multi_craft = index
+        representative_state = {
+            'efficiency': eff + 1, 'core': core + 1, 'effect1': effect1 + 1, 'effect2': effect2 + 1,
+            'cost_modifier': 2.0 if cost_up else 1.0, 'remaining_crafts': 2 if multi_craft else 1,
+        }
+        masks[index] = [bool(opt['condition'](representative_state)) for opt in CRAFT_POSSIBILITIES]
+    return masks
+
+
+CRAFT_OPTION_MASKS = _compile_option_masks()
+with np.errstate(divide='ignore'):
+    CRAFT_OPTION_LOG_WEIGHTS = np.where(CRAFT_OPTION_MASKS, np.log(OPTION_PROBABILITIES), -np.inf)
+
+
+def _rule_index(efficiency, core, effect1, effect2, cost_modifier, remaining_crafts) -> tuple:
+    """상태 값(스칼라 또는 배열)을 규칙표의 인덱스로 변환합니다."""
+    return (
+        np.asarray(efficiency) - 1, np.asarray(core) - 1, np.asarray(effect1) - 1, np.asarray(effect2) - 1,
+        (np.asarray(cost_modifier) > 1.0).astype(np.int64), (np.asarray(remaining_crafts) > 1).astype(np.int64),
+    )
+
+
+def _gumbel_top_k(log_weights: np.ndarray, rng: Optional[np.random.Generator], k: int, gumbel_noise: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    행마다 가중치에 비례한 비복원 추출 k개를 한 번에 뽑습니다. 후보가 모자라면 -1로 채웁니다.
+    gumbel_noise를 주면 rng 대신 미리 뽑아 둔 노이즈를 씁니다 (공통 난수 스트림용).
+    """
+    if gumbel_noise is None: gumbel_noise = rng.gumbel(size=log_weights.shape)
+    keys = log_weights + gumbel_noise
+    top = np.argsort(-keys, axis=-1)[..., :k]
+    return np.where(np.isfinite(np.take_along_axis(keys, top, axis=-1)), top, -1)
+
+
+# ===================================================================
+# 배치(batch) API: N개의 젬 상태를 NumPy 배열로 한 번에 처리
+#
+# states는 create_gem()과 같은 키를 가지며, 각 값은 길이 N의 배열입니다.
+# 옵션은 CRAFT_POSSIBILITIES의 인덱스로 주고받습니다.
+# ===================================================================
+
+def create_gem_batch(gem_grade: str, n: int) -> Dict[str, np.ndarray]:
+    grade_info = GEM_GRADES[gem_grade]
+    return {
+        'efficiency': np.ones(n, dtype=np.int64), 'core': np.ones(n, dtype=np.int64),
+        'effect1': np.ones(n, dtype=np.int64), 'effect2': np.ones(n, dtype=np.int64),
+        'remaining_crafts': np.full(n, grade_info['craft_count'], dtype=np.int64),
+        'remaining_rerolls': np.full(n, grade_info['reroll_count'], dtype=np.int64),
+        'cost_modifier': np.ones(n, dtype=np.float64),
+    }
+
+
+def _batch_rule_index(states: Dict[str, np.ndarray]) -> tuple:
+    return _rule_index(states['efficiency'], states['core'], states['effect1'], states['effect2'], states['cost_modifier'], states['remaining_crafts'])
+
+
+def craft_option_mask_batch(states: Dict[str, np.ndarray]) -> np.ndarray:
+    """CRAFT_POSSIBILITIES의 condition을 N개 상태에 대해 한 번에 평가한 (N, 27) 마스크를 반환합니다."""
+    return CRAFT_OPTION_MASKS[_batch_rule_index(states)]
+
+
+def sample_craft_options_batch(states: Dict[str, np.ndarray], rng: Optional[np.random.Generator], num_options: int = 4, gumbel_noise: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    generate_craft_options()와 같은 분포로 N개 상태의 옵션을 비복원 추출합니다.
+    반환값은 (N, num_options) 인덱스 배열이며, 후보가 부족한 자리는 -1로 채웁니다.
+    gumbel_noise((N, 27) 표준 Gumbel 노이즈)를 주면 rng 대신 그 노이즈로 추출합니다.
+    """
+    return _gumbel_top_k(CRAFT_OPTION_LOG_WEIGHTS[_batch_rule_index(states)], rng, num_options, gumbel_noise)
+
+
+def apply_craft_options_batch(states: Dict[str, np.ndarray], option_indices: np.ndarray, rows: np.ndarray):
+    """rows에 해당하는 젬들에 option_indices 옵션을 적용합니다. (apply_craft_option의 배치 버전)"""
+    for i, opt in enumerate(CRAFT_POSSIBILITIES):
+        target_rows = rows[option_indices == i]
+        if target_rows.size == 0: continue
+        option_type, value = opt['type'], opt['value']
+        if option_type in STAT_KEYS:
+            states[option_type][target_rows] = np.clip(states[option_type][target_rows] + value, 1, 5)
+        elif option_type == 'reroll_1':
+            states['remaining_rerolls'][target_rows] += 1
+        elif option_type == 'reroll_2':
+            states['remaining_rerolls'][target_rows] += 2
+        elif option_type == 'cost_increase':
+            states['cost_modifier'][target_rows] = 2.0
+        elif option_type == 'cost_decrease':
+            states['cost_modifier'][target_rows] = 1.0
+    states['remaining_crafts'][rows] -= 1
+
 
 class GemSimulator:
     def __init__(self, gem_grade: str, rng: np.random.Generator):
@@ -71,24 +174,12 @@ class GemSimulator:
     def generate_craft_options(self) -> List[Dict[str, Any]]:
         """
         가장 견고한 방식으로 고유한 가공 옵션 4개를 확률적으로 생성합니다.
+        컴파일된 규칙표에서 현재 상태의 로그 확률을 꺼내 Gumbel-top-k로 한 번에 추출합니다.
         """
-        available_options = [opt for opt in CRAFT_POSSIBILITIES if opt['condition'](self.state)]
-        selected_options = []
-        
-        num_to_sample = min(4, len(available_options))
-
-        for _ in range(num_to_sample):
-            probabilities = np.array([opt['probability'] for opt in available_options])
-            probabilities /= probabilities.sum() # 확률 정규화
-
-            # 하나의 인덱스를 선택 -> numpy RNG 
-            chosen_index = self.rng.choice(len(available_options), p=probabilities)
-            
-            # 선택된 옵션을 결과에 추가하고, 다음 샘플링을 위해 풀(pool)에서 제거
-            chosen_option = available_options.pop(chosen_index)
-            selected_options.append(chosen_option)
-            
-        return selected_options
+        state = self.state
+        log_weights = CRAFT_OPTION_LOG_WEIGHTS[_rule_index(state['efficiency'], state['core'], state['effect1'], state['effect2'], state['cost_modifier'], state['remaining_crafts'])]
+        selected_indices = _gumbel_top_k(log_weights, self.rng, 4)
+        return [CRAFT_POSSIBILITIES[i] for i in selected_indices if i >= 0]
     # ===================================================================
 
     def apply_craft_option(self, option: Dict[str, Any]):
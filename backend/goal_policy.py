@@ -0,0 +1,77 @@
+# goal_policy.py
+import json
+import os
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# ===================================================================
+# 목표 조건부(goal-conditioned) 정책
+#
+# 목표마다 전문가 모델을 따로 두는 대신, 상태 6개 뒤에 [목표 효율, 목표 코어]를 붙인 8차원 입력을
+# 받는 네트워크 하나로 모든 목표를 처리합니다. (train_goal.py로 학습, gem_model_goal.h5)
+# GoalConditionedModels는 FinalOptimizer.models와 같은 {(core_point, efficiency): 모델} 매핑처럼 동작하며,
+# 각 목표의 모델은 같은 네트워크를 공유하는 얇은 뷰라 메모리에는 네트워크 하나만 올라갑니다.
+# 학습한 목표 목록은 모델 옆의 gem_model_goal.json에 저장되며, 그 목표들만 서빙합니다.
+# ===================================================================
+
+GOAL_MODEL_FILE = "gem_model_goal.h5"
+GOAL_TARGETS_FILE = "gem_model_goal.json"
+GOAL_TARGETS: List[Tuple[int, int]] = [(core_point, efficiency) for core_point in range(1, 6) for efficiency in range(1, 6)]
+
+
+def goal_features(core_point: int, efficiency: int) -> np.ndarray:
+    """상태 뒤에 붙이는 목표 특징. gem_env의 목표 조건부 관측과 같은 순서 [효율, 코어]입니다."""
+    return np.array([efficiency, core_point], dtype=np.float32)
+
+
+def save_goal_targets(models_dir: str, targets: List[Tuple[int, int]]):
+    """학습한 목표 목록을 임시 파일에 쓴 뒤 os.replace로 교체합니다."""
+    path = os.path.join(models_dir, GOAL_TARGETS_FILE)
+    tmp_path = os.path.join(models_dir, f".tmp_{GOAL_TARGETS_FILE}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"targets": [{"core_point": cp, "efficiency": eff} for cp, eff in sorted(targets)]}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_goal_targets(models_dir: str) -> List[Tuple[int, int]]:
+    path = os.path.join(models_dir, GOAL_TARGETS_FILE)
+    if not os.path.exists(path):
+        raise RuntimeError(f"Goal-conditioned target list not found at '{path}'. Please run train_goal.py first.")
+    with open(path, "r", encoding="utf-8") as f:
+        return [(entry["core_point"], entry["efficiency"]) for entry in json.load(f)["targets"]]
+
+
+class GoalConditionedPolicy:
+    """네트워크 하나에 목표를 고정해, 전문가 모델과 같은 predict_actions((N, 6) 상태)를 제공합니다."""
+
+    def __init__(self, network, core_point: int, efficiency: int):
+        self.network = network
+        self.goal = goal_features(core_point, efficiency)
+
+    def predict_actions(self, state_batch: np.ndarray) -> np.ndarray:
+        state_batch = np.asarray(state_batch, dtype=np.float32)
+        inputs = np.empty((len(state_batch), state_batch.shape[1] + self.goal.size), dtype=np.float32)
+        inputs[:, :state_batch.shape[1]] = state_batch
+        inputs[:, state_batch.shape[1]:] = self.goal
+        return self.network.predict_actions(inputs)
+
+
+class GoalConditionedModels(Mapping):
+    """{(core_point, efficiency): GoalConditionedPolicy} 매핑. 모든 목표가 네트워크 하나를 공유합니다."""
+
+    def __init__(self, network, targets: List[Tuple[int, int]]):
+        self.network = network
+        self._policies: Dict[Tuple[int, int], GoalConditionedPolicy] = {
+            target: GoalConditionedPolicy(network, *target) for target in targets
+        }
+
+    def __getitem__(self, target: Tuple[int, int]) -> GoalConditionedPolicy:
+        return self._policies[target]
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return iter(self._policies)
+
+    def __len__(self) -> int:
+        return len(self._policies)
@@ -0,0 +1,321 @@
+# job_queue.py
+import logging
+import multiprocessing
+import threading
+import traceback
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# 최적화 작업 전용 워커 프로세스 풀과 크기가 제한된 작업 대기열
+#
+# - 워커 프로세스마다 전용 파이프를 두고 한 번에 한 작업씩만 맡깁니다.
+# - 놀고 있는 워커가 없고 대기열도 가득 차면 QueueFullError를 던져 API가 429로 응답하게 합니다.
+# - 실행 중인 작업을 취소하면 해당 워커 프로세스를 종료하고 새 워커로 교체합니다.
+#   교체된 워커는 같은 번호를 쓰지만 새 세대(generation) 번호를 받으므로, 프로세스 로컬 상태가
+#   비어 있는 새 프로세스인지 구분할 수 있습니다.
+# - 워커가 보내는 이벤트(queued/started/progress/done/failed)는 리스너 스레드가 받아
+#   on_event(job_id, kind, data) 콜백으로 전달합니다. 콜백은 대기열 잠금 밖에서 호출됩니다.
+# - 모든 워커가 초기화 중에 죽으면 대기 중인 작업은 "failed"로 끝내고, 이후 submit은 JobQueueUnavailableError를 던집니다.
+# ===================================================================
+
+LISTENER_POLL_SECONDS = 0.2
+WORKER_JOIN_TIMEOUT_SECONDS = 5
+
+
+class QueueFullError(Exception):
+    def __init__(self, queue_depth: int):
+        super().__init__(f"Job queue is full ({queue_depth} jobs waiting).")
+        self.queue_depth = queue_depth
+
+
+class JobQueueUnavailableError(RuntimeError):
+    """대기열이 닫혔거나 살아 있는 워커가 없어 작업을 받을 수 없을 때."""
+
+
+def _worker_main(conn, job_function: Callable, initializer: Optional[Callable], initargs: tuple):
+    """워커 프로세스 본체. 초기화가 끝나면 ready를 보내고, 작업을 하나씩 받아 실행합니다."""
+    if initializer is not None:
+        initializer(*initargs)
+    conn.send((None, "ready", None))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        job_id, payload = message
+
+        def report(kind: str, data: Any, job_id: str = job_id):
+            conn.send((job_id, kind, data))
+
+        try:
+            result = job_function(job_id, payload, report)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}\n{traceback.format_exc()}")
+            conn.send((job_id, "failed", str(e)))
+        else:
+            conn.send((job_id, "done", result))
+
+
+class _Worker:
+    def __init__(self, index: int, generation: int, process, conn):
+        self.index = index
+        self.generation = generation
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.job_id: Optional[str] = None
+
+
+class JobQueue:
+    def __init__(
+        self, job_function: Callable[[str, Any, Callable[[str, Any], None]], Any],
+        worker_count: int = 2, max_queue_size: int = 32,
+        initializer: Optional[Callable] = None, initargs: tuple = (),
+        on_event: Optional[Callable[[str, str, Any], None]] = None,
+    ):
+        """
+        Args:
+            job_function: 워커 프로세스에서 실행될 모듈 수준 함수 job_function(job_id, payload, report).
+                report(kind, data)로 진행 상황을 보낼 수 있고, 반환값은 "done" 이벤트로 전달됩니다.
+            worker_count (int): 워커 프로세스 수.
+            max_queue_size (int): 워커를 기다리는 작업의 최대 개수.
+            initializer, initargs: 워커 프로세스 시작 시 한 번 호출되는 초기화 함수와 인자.
+            on_event: API 프로세스에서 이벤트를 받을 콜백.
+        """
+        if worker_count < 1:
+            raise ValueError("worker_count must be at least 1.")
+        self.job_function = job_function
+        self.worker_count = worker_count
+        self.max_queue_size = max_queue_size
+        self.initializer = initializer
+        self.initargs = initargs
+        self.on_event = on_event
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._pending: Deque[Tuple[str, Any]] = deque()
+        self._workers: Dict[int, _Worker] = {}
+        self._worker_stats: Dict[int, Any] = {}
+        self._generation = 0
+        self._closed = False
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+        for index in range(worker_count):
+            self._spawn_worker(index)
+        self._listener = threading.Thread(target=self._listen, name="job-queue-listener", daemon=True)
+        self._listener.start()
+        logger.info(f"Started job queue with {worker_count} worker processes (max queue size: {max_queue_size}).")
+
+    # --- 워커 관리 ---
+
+    def _spawn_worker(self, index: int):
+        parent_conn, child_conn = self._ctx.Pipe(duplex=True)
+        process = self._ctx.Process(
+            target=_worker_main, args=(child_conn, self.job_function, self.initializer, self.initargs),
+            name=f"job-worker-{index}", daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._generation += 1
+        self._workers[index] = _Worker(index, self._generation, process, parent_conn)
+
+    def _stop_worker(self, worker: _Worker):
+        worker.process.terminate()
+        worker.process.join(WORKER_JOIN_TIMEOUT_SECONDS)
+        worker.conn.close()
+
+    # --- 스케줄링 (self._lock을 잡은 상태에서 호출) ---
+
+    def _dispatch_locked(self, events: List[Tuple[str, str, Any]]):
+        idle_workers = [w for w in self._workers.values() if w.ready and w.job_id is None]
+        while self._pending and idle_workers:
+            worker = idle_workers.pop(0)
+            job_id, payload = self._pending.popleft()
+            try:
+                worker.conn.send((job_id, payload))
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to hand job {job_id} to worker {worker.index}: {e}")
+                self._pending.appendleft((job_id, payload))
+                continue
+            worker.job_id = job_id
+            events.append((job_id, "started", {"worker": worker.index, "generation": worker.generation}))
+        for position, (job_id, _) in enumerate(self._pending, start=1):
+            events.append((job_id, "queued", {"position": position}))
+
+    def _emit(self, events: List[Tuple[str, str, Any]]):
+        if self.on_event is None:
+            return
+        for job_id, kind, data in events:
+            try:
+                self.on_event(job_id, kind, data)
+            except Exception as e:
+                logger.error(f"Job event handler failed for {job_id} ({kind}): {e}", exc_info=True)
+
+    # --- 공개 API ---
+
+    def submit(self, job_id: str, payload: Any) -> int:
+        """
+        작업을 등록하고 대기 순번을 반환합니다 (0이면 바로 실행 시작).
+        놀고 있는 워커가 없고 대기열이 가득 차 있으면 QueueFullError를 던집니다.
+        """
+        events: List[Tuple[str, str, Any]] = []
+        with self._lock:
+            if self._closed:
+                raise JobQueueUnavailableError("Job queue is closed.")
+            if not self._workers:
+                raise JobQueueUnavailableError("No job workers are available.")
+            has_idle_worker = any(w.ready and w.job_id is None for w in self._workers.values())
+            if not has_idle_worker and len(self._pending) >= self.max_queue_size:
+                self.counters["rejected"] += 1
+                raise QueueFullError(len(self._pending))
+            self.counters["submitted"] += 1
+            self._pending.append((job_id, payload))
+            self._dispatch_locked(events)
+            position = self._position_locked(job_id)
+        self._emit(events)
+        return position
+
+    def _position_locked(self, job_id: str) -> int:
+        for position, (pending_id, _) in enumerate(self._pending, start=1):
+            if pending_id == job_id:
+                return position
+        return 0
+
+    def position(self, job_id: str) -> int:
+        """대기 중인 작업의 1부터 시작하는 순번. 실행 중이거나 모르는 작업이면 0."""
+        with self._lock:
+            return self._position_locked(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """대기 중이면 대기열에서 빼고, 실행 중이면 워커 프로세스를 교체합니다. 취소했으면 True."""
+        events: List[Tuple[str, str, Any]] = []
+        with self._lock:
+            for item in self._pending:
+                if item[0] == job_id:
+                    self._pending.remove(item)
+                    self.counters["cancelled"] += 1
+                    self._dispatch_locked(events)
+                    break
+            else:
+                worker = next((w for w in self._workers.values() if w.job_id == job_id), None)
+                if worker is None:
+                    return False
+                self._stop_worker(worker)
+                self._spawn_worker(worker.index)
+                self.counters["cancelled"] += 1
+                logger.info(f"Cancelled running job {job_id}; restarted worker {worker.index}.")
+        self._emit(events)
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            workers = list(self._workers.values())
+            metrics = dict(self.counters)
+            metrics.update({
+                "workers": sum(1 for w in workers if w.process.is_alive()),
+                "ready_workers": sum(1 for w in workers if w.ready),
+                "busy_workers": sum(1 for w in workers if w.job_id is not None),
+                "queue_depth": len(self._pending),
+                "max_queue_size": self.max_queue_size,
+            })
+        return metrics
+
+    def worker_generations(self) -> Dict[int, Tuple[int, bool]]:
+        """워커 번호 -> (세대 번호, 초기화 완료 여부). 번호와 세대는 "started" 이벤트의 worker/generation 값과 같습니다."""
+        with self._lock:
+            return {w.index: (w.generation, w.ready) for w in self._workers.values()}
+
+    def worker_stats(self) -> Dict[int, Any]:
+        """워커들이 "stats" 이벤트로 보낸 마지막 통계."""
+        with self._lock:
+            return dict(self._worker_stats)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers.values())
+            self._workers = {}
+            self._pending.clear()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            worker.process.join(WORKER_JOIN_TIMEOUT_SECONDS)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+        self._listener.join(WORKER_JOIN_TIMEOUT_SECONDS)
+
+    # --- 이벤트 수신 ---
+
+    def _listen(self):
+        while not self._closed:
+            with self._lock:
+                workers_by_conn = {w.conn: w for w in self._workers.values()}
+            if not workers_by_conn:
+                threading.Event().wait(LISTENER_POLL_SECONDS)
+                continue
+            try:
+                ready_conns = wait(list(workers_by_conn), timeout=LISTENER_POLL_SECONDS)
+            except OSError:
+                continue  # 취소로 닫힌 파이프가 섞여 있으면 다음 반복에서 목록을 새로 만듭니다.
+            for conn in ready_conns:
+                worker = workers_by_conn[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    self._on_worker_exit(worker)
+                    continue
+                self._on_message(worker, *message)
+
+    def _on_message(self, worker: _Worker, job_id: Optional[str], kind: str, data: Any):
+        events: List[Tuple[str, str, Any]] = []
+        with self._lock:
+            if self._workers.get(worker.index) is not worker:
+                return  # 취소되어 교체된 워커가 남긴 메시지
+            if kind == "ready":
+                worker.ready = True
+            elif kind == "stats":
+                self._worker_stats[worker.index] = data
+            elif worker.job_id != job_id:
+                return
+            elif kind in ("done", "failed"):
+                worker.job_id = None
+                self.counters["completed" if kind == "done" else "failed"] += 1
+                events.append((job_id, kind, data))
+            else:
+                events.append((job_id, kind, data))
+            if kind in ("ready", "done", "failed"):
+                self._dispatch_locked(events)
+        self._emit(events)
+
+    def _on_worker_exit(self, worker: _Worker):
+        events: List[Tuple[str, str, Any]] = []
+        with self._lock:
+            if self._closed or self._workers.get(worker.index) is not worker:
+                return
+            worker.process.join(WORKER_JOIN_TIMEOUT_SECONDS)
+            worker.conn.close()
+            if not worker.ready:
+                # 초기화 단계에서 죽은 워커는 다시 띄워도 같은 이유로 죽을 가능성이 높으므로 교체하지 않습니다.
+                del self._workers[worker.index]
+                logger.error(f"Job worker {worker.index} exited during initialization (exit code {worker.process.exitcode}).")
+                if not self._workers:
+                    # 작업을 맡을 워커가 하나도 남지 않았으므로 대기 중인 작업을 기다리게 두지 않습니다.
+                    for job_id, _ in self._pending:
+                        events.append((job_id, "failed", "작업 워커를 시작하지 못했습니다."))
+                    self.counters["failed"] += len(self._pending)
+                    self._pending.clear()
+                    logger.error("All job workers exited during initialization; failed all pending jobs.")
+            else:
+                logger.error(f"Job worker {worker.index} exited unexpectedly (exit code {worker.process.exitcode}); restarting.")
+                if worker.job_id is not None:
+                    self.counters["failed"] += 1
+                    events.append((worker.job_id, "failed", "작업 프로세스가 비정상 종료되었습니다."))
+                self._spawn_worker(worker.index)
+        self._emit(events)
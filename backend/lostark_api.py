@@ -1,115 +1,245 @@
 import requests
 import os
 import json
-from typing import Dict, Optional, List
+import asyncio
+import random
+from typing import Dict, Optional, List, Set
 import time
 
-API_ITEMS_URL = "https://developer-lostark.game.onstove.com/markets/items"
+import httpx
+
+API_BASE_URL = os.getenv("LOSTARK_API_BASE_URL", "https://developer-lostark.game.onstove.com")
 METADATA_FILE = "gem_metadata.json"
+GEM_CATEGORY_CODE = 230000
+MAX_SCAN_PAGES = 20
+
+# Id 기반 동시 조회 설정
+MAX_CONCURRENT_REQUESTS = 4
+REQUEST_TIMEOUT_SECONDS = 10.0
+MAX_RETRIES = 3
+RETRY_BASE_DELAY_SECONDS = 0.2
+RETRY_MAX_DELAY_SECONDS = 5.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
 
 class LostArkAPI:
     """
     gem_metadata.json을 기반으로 로스트아크 API와 통신하여
     정확한 젬 시세를 가져오는 클래스. (로직 개선 버전)
     """
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, base_url: str = API_BASE_URL, page_delay_seconds: float = 0.5):
         if not api_key:
             raise ValueError("API key cannot be empty.")
+        # base_url을 바꾸면 fake_market_server.py 같은 로컬 서버로 요청을 보낼 수 있습니다.
+        self.items_url = f"{base_url.rstrip('/')}/markets/items"
+        self.page_delay_seconds = page_delay_seconds
         self.headers = {
             "accept": "application/json",
             "authorization": f"bearer {api_key}",
             "content-type": "application/json",
         }
-        # 메타데이터에서 우리가 찾아야 할 젬의 전체 이름 목록을 미리 만들어 둡니다.
-        self.target_gem_names = self._get_target_names_from_metadata()
+        # 메타데이터에서 우리가 찾아야 할 젬의 Id -> 전체 이름 목록을 미리 만들어 둡니다.
+        self.target_gems = self._get_targets_from_metadata()
+        self.target_gem_names = set(self.target_gems.values())
+        self.counters = {"requests": 0, "retries": 0, "found_by_id": 0, "found_by_scan": 0}
 
-    def _get_target_names_from_metadata(self) -> set:
-        """gem_metadata.json에서 타겟 젬의 전체 이름(set)을 로드합니다."""
+    def _get_targets_from_metadata(self) -> Dict[int, str]:
+        """gem_metadata.json에서 타겟 젬의 {Id: 전체 이름}을 로드합니다."""
         try:
             with open(METADATA_FILE, "r", encoding="utf-8") as f:
                 metadata = json.load(f)
-                return {gem['Name'] for gem in metadata}
+                return {gem['Id']: gem['Name'] for gem in metadata}
         except FileNotFoundError:
             print(f"Error: {METADATA_FILE} not found. Run extract_gem_metadata.py first.")
-            return set()
+            return {}
 
     # ===================================================================
-    # *** 핵심 로직: 더 단순하고 직접적인 조회 방식 ***
+    # *** 핵심 로직: 메타데이터 Id로 필요한 젬만 동시에 조회 ***
+    #
+    # 메타데이터에는 18종 젬의 거래소 Id가 이미 있으므로 카테고리 전체를 훑지 않고
+    # 젬 이름(등급 제외, 6종)으로 검색한 뒤 응답에서 Id가 같은 아이템의 시세를 씁니다.
+    # 요청은 keep-alive 연결을 재사용하는 httpx.AsyncClient 하나로 동시에 보내되
+    # 동시 요청 수를 제한하고, 실패(연결 오류, 429/5xx)는 지터를 준 지수 백오프로 재시도합니다.
+    # 이 방식으로 찾지 못한 Id만 기존의 페이지 순회로 찾습니다.
     # ===================================================================
     def get_gem_prices(self) -> Dict[str, Optional[int]]:
         """
-        '아크 그리드 재료' 카테고리의 모든 페이지를 순회하여,
-        메타데이터에 명시된 18종 젬의 현재 시세를 직접 찾아 반환합니다.
+        메타데이터에 명시된 18종 젬의 현재 시세를 {전체 이름: 가격} 형태로 반환합니다.
+        이벤트 루프가 없는 스레드에서 호출해야 합니다 (PriceSnapshotService가 그렇게 호출합니다).
         """
-        if not self.target_gem_names:
+        return asyncio.run(self.get_gem_prices_async())
+
+    async def get_gem_prices_async(self) -> Dict[str, Optional[int]]:
+        if not self.target_gems:
             return {}
 
+        prices: Dict[str, Optional[int]] = {name: None for name in self.target_gem_names}
+        found_by_id = await self._fetch_prices_by_id()
+        for gem_id, price in found_by_id.items():
+            prices[self.target_gems[gem_id]] = price
+        self.counters["found_by_id"] += len(found_by_id)
+
+        missing_names = {name for gem_id, name in self.target_gems.items() if gem_id not in found_by_id}
+        if missing_names:
+            print(f"  - {len(missing_names)} gems not found by Id. Falling back to page scan...")
+            scanned = await asyncio.to_thread(self._scan_category_pages, missing_names)
+            self.counters["found_by_scan"] += sum(1 for price in scanned.values() if price is not None)
+            prices.update(scanned)
+        return prices
+
+    async def _fetch_prices_by_id(self) -> Dict[int, Optional[int]]:
+        """젬 이름별 검색을 동시에 보내고, 응답 아이템 중 Id가 타겟인 것의 시세를 {Id: 가격}으로 모읍니다."""
+        ids_by_item_name: Dict[str, Set[int]] = {}
+        for gem_id, full_name in self.target_gems.items():
+            item_name = full_name.split(" 등급 ", 1)[-1]
+            ids_by_item_name.setdefault(item_name, set()).add(gem_id)
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        limits = httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS, max_keepalive_connections=MAX_CONCURRENT_REQUESTS)
+        async with httpx.AsyncClient(headers=self.headers, limits=limits, timeout=REQUEST_TIMEOUT_SECONDS) as client:
+            async def search(item_name: str) -> List[Dict]:
+                payload = {"CategoryCode": GEM_CATEGORY_CODE, "ItemName": item_name, "PageNo": 1, "Sort": "GRADE", "SortCondition": "DESC"}
+                async with semaphore:
+                    data = await self._post_with_retry(client, payload)
+                return (data or {}).get("Items") or []
+
+            results = await asyncio.gather(*(search(name) for name in ids_by_item_name), return_exceptions=True)
+
+        found: Dict[int, Optional[int]] = {}
+        for item_name, result in zip(ids_by_item_name, results):
+            if isinstance(result, Exception):
+                print(f"Error searching '{item_name}': {result}")
+                continue
+            for item in result:
+                if item.get("Id") in ids_by_item_name[item_name]:
+                    found[item["Id"]] = item.get("CurrentMinPrice")
+        return found
+
+    async def _post_with_retry(self, client: httpx.AsyncClient, payload: Dict) -> Dict:
+        """POST /markets/items. 연결 오류와 429/5xx 응답은 full jitter 지수 백오프로 MAX_RETRIES번까지 재시도합니다."""
+        for attempt in range(MAX_RETRIES + 1):
+            self.counters["requests"] += 1
+            try:
+                response = await client.post(self.items_url, json=payload)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                error: Exception = httpx.HTTPStatusError(f"Retryable status {response.status_code}", request=response.request, response=response)
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError as e:
+                error, retry_after = e, None
+            if attempt == MAX_RETRIES:
+                raise error
+            delay = random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, min(RETRY_MAX_DELAY_SECONDS, float(retry_after)))
+            self.counters["retries"] += 1
+            await asyncio.sleep(delay)
+
+    # ===================================================================
+    # 대체 경로: 카테고리 전체 페이지 순회
+    # ===================================================================
+    def _scan_category_pages(self, target_names: Set[str]) -> Dict[str, Optional[int]]:
+        """
+        '아크 그리드 재료' 카테고리의 페이지를 순서대로 조회하여
+        target_names에 해당하는 젬의 현재 시세를 찾아 반환합니다.
+        """
         # 결과를 저장할 딕셔너리를 타겟 젬 이름으로 미리 초기화
-        prices = {name: None for name in self.target_gem_names}
+        prices = {name: None for name in target_names}
         found_count = 0
         
         page_no = 1
-        print("Fetching all pages from '아크 그리드 재료' category...")
+        print("Fetching pages from '아크 그리드 재료' category...")
 
-        while True:
-            print(f"  - Fetching page {page_no}...")
-            payload = {
-                "CategoryCode": 230000,
-                "PageNo": page_no,
-                "Sort": "GRADE",
-                "SortCondition": "DESC",
-            }
+        with requests.Session() as session:
+            while True:
+                print(f"  - Fetching page {page_no}...")
+                payload = {
+                    "CategoryCode": GEM_CATEGORY_CODE,
+                    "PageNo": page_no,
+                    "Sort": "GRADE",
+                    "SortCondition": "DESC",
+                }
 
-            try:
-                response = requests.post(API_ITEMS_URL, headers=self.headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
+                try:
+                    response = session.post(self.items_url, headers=self.headers, json=payload)
+                    response.raise_for_status()
+                    data = response.json()
 
-                if not data or not data.get("Items"):
-                    print("  - No more items found. Stopping page scan.")
-                    break
+                    if not data or not data.get("Items"):
+                        print("  - No more items found. Stopping page scan.")
+                        break
 
-                # 페이지의 아이템들 중에서 우리가 찾는 젬이 있는지 확인
-                for item in data["Items"]:
-                    # API가 반환하는 이름은 등급이 포함되지 않음
-                    item_name_from_api = item.get("Name")
-                    item_grade_from_api = item.get("Grade")
-                    
-                    # 우리가 사용할 전체 이름 형식으로 재구성
-                    full_name = f"{item_grade_from_api} 등급 {item_name_from_api}"
+                    # 페이지의 아이템들 중에서 우리가 찾는 젬이 있는지 확인
+                    for item in data["Items"]:
+                        # API가 반환하는 이름은 등급이 포함되지 않으므로 전체 이름 형식으로 재구성
+                        full_name = f"{item.get('Grade')} 등급 {item.get('Name')}"
 
-                    # 재구성한 이름이 우리의 타겟 목록에 있다면 가격을 저장
-                    if full_name in self.target_gem_names:
-                        prices[full_name] = item.get("CurrentMinPrice")
-                        found_count += 1
-                
-                # 최적화: 만약 모든 젬을 찾았다면, 더 이상 페이지를 조회할 필요가 없음
-                if found_count == len(self.target_gem_names):
-                    print("  - Found all target gems. Stopping early.")
-                    break
+                        # 재구성한 이름이 타겟 목록에 있다면 가격을 저장
+                        if full_name in prices and prices[full_name] is None:
+                            prices[full_name] = item.get("CurrentMinPrice")
+                            found_count += 1
+                    
+                    # 최적화: 만약 모든 젬을 찾았다면, 더 이상 페이지를 조회할 필요가 없음
+                    if found_count == len(target_names):
+                        print("  - Found all target gems. Stopping early.")
+                        break
+                    
+                    page_no += 1
+                    time.sleep(self.page_delay_seconds)
+                    if page_no > MAX_SCAN_PAGES:
+                        print(f"  - Reached max page limit ({MAX_SCAN_PAGES}).")
+                        break
                 
-                page_no += 1
-                time.sleep(0.5)
-                if page_no > 20:
-                    print("  - Reached max page limit (20).")
+                except requests.exceptions.RequestException as e:
+                    print(f"Error fetching page {page_no}: {e}")
                     break
-            
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching page {page_no}: {e}")
-                break
         
-        print("Finished fetching gem prices.")
+        print("Finished page scan.")
         return prices
+
+    def get_gem_prices_by_page_scan(self) -> Dict[str, Optional[int]]:
+        """Id 조회를 쓰지 않고 카테고리 전체를 순회하는 기존 방식 (비교/디버깅용)."""
+        return self._scan_category_pages(self.target_gem_names) if self.target_gem_names else {}
     # ===================================================================
 
-# --- (하단 if __name__ == "__main__": 부분은 이전과 동일) ---
 if __name__ == "__main__":
-    api_key = os.getenv("LOSTARK_API_KEY", "YOUR_API_KEY_HERE")
-    if "YOUR_API_KEY_HERE" in api_key:
-        print("Please set LOSTARK_API_KEY environment variable.")
-    else:
-        client = LostArkAPI(api_key=api_key)
+    import argparse
+    import pprint
+
+    parser = argparse.ArgumentParser(description="Fetch gem prices from the Lost Ark market API.")
+    parser.add_argument('--fake', action='store_true', help="Run the self-check against a local fake_market_server instead of the real API")
+    parser.add_argument('--fail_rate', type=float, default=0.3, help="Fake server 503 probability (with --fake)")
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_market_server import start_fake_market_server
+
+        server = start_fake_market_server(port=0, page_size=5, latency=0.05, fail_rate=args.fail_rate, seed=1)
+        client = LostArkAPI(api_key="test-key", base_url=f"http://127.0.0.1:{server.server_address[1]}", page_delay_seconds=0)
+        expected = {f"{item['Grade']} 등급 {item['Name']}": item["CurrentMinPrice"] for item in server.items if item["Id"] in client.target_gems}
+
+        started = time.perf_counter()
         gem_prices = client.get_gem_prices()
-        print("\n--- Fetched Gem Prices (Optimized Logic) ---")
-        import pprint
-        pprint.pprint(gem_prices)
+        elapsed = time.perf_counter() - started
+        assert gem_prices == expected, f"시세가 서버 값과 일치해야 합니다: {gem_prices}"
+        print(f"Id fetch: {elapsed:.2f}s | counters: {client.counters}")
+
+        # 메타데이터 Id가 바뀐 젬은 페이지 순회로 찾아야 합니다.
+        server.fail_rate = 0.0
+        stale_id = next(iter(client.target_gems))
+        client.target_gems[stale_id - 1] = client.target_gems.pop(stale_id)
+        client.counters = dict.fromkeys(client.counters, 0)
+        assert client.get_gem_prices() == expected, "찾지 못한 Id는 페이지 순회로 보완해야 합니다."
+        assert client.counters["found_by_scan"] == 1, client.counters
+        print(f"Fallback: {client.counters}")
+        server.shutdown()
+        print("\n테스트 완료.")
+    else:
+        api_key = os.getenv("LOSTARK_API_KEY", "YOUR_API_KEY_HERE")
+        if "YOUR_API_KEY_HERE" in api_key:
+            print("Please set LOSTARK_API_KEY environment variable.")
+        else:
+            client = LostArkAPI(api_key=api_key)
+            gem_prices = client.get_gem_prices()
+            print("\n--- Fetched Gem Prices (Id-indexed) ---")
+            pprint.pprint(gem_prices)
@@ -1,5 +1,6 @@
 # main.py 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Response
+from fastapi.responses import PlainTextResponse, JSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
 import os
@@ -10,17 +11,23 @@ from fastapi.middleware.cors import CORSMiddleware
 import uuid
 import asyncio
 import json
+import time
+import redis
 
 from lostark_api import LostArkAPI
-from validator import check_feasibility
-from final_optimizer import FinalOptimizer
+from job_queue import JobQueue, QueueFullError, JobQueueUnavailableError
+from progress_bus import create_progress_bus
+from single_flight import SingleFlight, request_fingerprint
+from price_snapshot import PriceSnapshotService
+from optimization_job import init_optimization_worker, run_optimization_job
+from warmup import WarmupCoordinator
+from metrics import REGISTRY, TASKS_FINISHED, TASKS_SUBMITTED, QUEUE_DEPTH, QUEUE_WORKERS, record_stage
+from result_cache import LRUCache
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', handlers=[logging.FileHandler("gemggark_api.log"), logging.StreamHandler()])
 logger = logging.getLogger(__name__)
 
-task_manager: Dict[str, Dict] = {}
-
 class HeldGem(BaseModel):
     name: str = Field(...)
     core_point: int = Field(..., ge=1, le=5)
@@ -29,6 +36,8 @@ class OptimizeRequest(BaseModel):
     cores: Dict[str, List[str]] = Field(...)
     held_gems: List[HeldGem] = Field([])
     simulations_per_gem: int = Field(default=100, ge=50, le=1000)
+    # 지정하면 simulations_per_gem 대신 기대 비용 95% 신뢰구간의 상대 반폭이 이 값 이하가 될 때까지 적응형으로 시뮬레이션합니다 (예: 0.02).
+    target_precision: Optional[float] = Field(default=None, gt=0, le=0.5)
     blue_crystal_price: int = Field(...)
 
 app = FastAPI(title="Gemggark API", version="1.5.0") # 버전 업데이트
@@ -36,93 +45,274 @@ origins = ["http://localhost:3000"]
 app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 api_client: LostArkAPI
-final_optimizer: FinalOptimizer
+job_queue: JobQueue
+progress_bus = create_progress_bus(os.getenv("PROGRESS_BUS", "memory"))
+# 같은 요청(+같은 시세)은 계산 하나를 공유합니다. 작업 대기열에는 task_id 대신 flight_id로 등록됩니다.
+single_flight = SingleFlight(result_ttl=int(os.getenv("RESULT_REUSE_TTL_SECONDS", "120")))
+
+price_service: PriceSnapshotService
+# 시작 후 워커 캐시 예열과 /health/ready 상태
+warmup: WarmupCoordinator
+# /optimize?profile=true 로 요청한 작업의 샘플링 프로파일 (ENABLE_TASK_PROFILING=1 일 때만 허용)
+TASK_PROFILING_ENABLED = os.getenv("ENABLE_TASK_PROFILING", "0") == "1"
+task_profiles = LRUCache(max_size=64, ttl=3600)
 
-def run_optimization_task(task_id: str, request: OptimizeRequest):
+def _connect_redis() -> Optional[redis.Redis]:
     try:
-        logger.info(f"Task {task_id}: Starting optimization.")
-        task_manager[task_id] = {"status": "processing", "progress": 0, "message": "최신 젬 시세를 불러오는 중입니다...", "result": None}
-        current_gem_prices = api_client.get_gem_prices()
-        crystal_gold_price = request.blue_crystal_price
-        core_groups = {"질서": request.cores.get("질서", []), "혼돈": request.cores.get("혼돈", [])}
-        held_gem_groups = {"질서": [], "혼돈": []}
-        for gem in request.held_gems:
-            if "질서" in gem.name: held_gem_groups["질서"].append(gem.dict())
-            elif "혼돈" in gem.name: held_gem_groups["혼돈"].append(gem.dict())
-        final_result = {"total_cost": 0, "strategy_details": {}}
-        total_cores = len([c for c_list in core_groups.values() for c in c_list if c])
-        processed_cores = 0
-        for core_type in ["질서", "혼돈"]:
-            if not core_groups[core_type]: continue
-            task_manager[task_id]["message"] = f"{core_type} 그룹 보유 젬 구성을 검증하는 중입니다..."
-            is_feasible, remaining_info = check_feasibility({core_type: core_groups[core_type]}, held_gem_groups[core_type])
-            if not is_feasible: raise ValueError(f"{core_type} 그룹 보유 젬 구성 실현 불가: {remaining_info.get('reason')}")
-            if any(core['remaining_slots'] > 0 for core in remaining_info):
-                task_manager[task_id]["message"] = f"{core_type} 코어 최적화 전략을 AI가 시뮬레이션 중입니다..."
-                best_strategy = final_optimizer.find_best_strategy(remaining_info, current_gem_prices, crystal_gold_price, request.simulations_per_gem)
-                final_result["strategy_details"][core_type] = best_strategy
-                final_result["total_cost"] += best_strategy.get("total_cost", 0)
-            processed_cores += len(core_groups[core_type])
-            task_manager[task_id]["progress"] = int((processed_cores / total_cores) * 100) if total_cores > 0 else 100
-        task_manager[task_id] = {"status": "completed", "progress": 100, "message": "최적화 완료!", "result": final_result}
-        logger.info(f"Task {task_id}: Optimization completed successfully.")
-    except Exception as e:
-        logger.error(f"Task {task_id}: An error occurred during optimization: {e}", exc_info=True)
-        task_manager[task_id] = {"status": "failed", "progress": 100, "message": f"오류 발생: {e}", "result": None}
+        client = redis.Redis(host='redis', port=6379, db=0, decode_responses=True, socket_timeout=2, socket_connect_timeout=2)
+        client.ping()
+        return client
+    except redis.exceptions.ConnectionError as e:
+        logger.error(f"Could not connect to Redis: {e}. Price snapshots will be kept in memory only.")
+        return None
+
+def publish_flight_status(flight_id: str, status: Dict):
+    for task_id in single_flight.update(flight_id, status):
+        progress_bus.publish(task_id, status)
+
+def update_task_from_job_event(flight_id: str, kind: str, data):
+    """JobQueue 리스너 스레드에서 호출되어 워커가 보낸 이벤트를 flight 상태에 반영하고, 붙어 있는 모든 작업에 발행합니다."""
+    if kind == "metrics":
+        REGISTRY.merge(data)  # 워커 프로세스에 쌓인 지표 증가분
+        return
+    if kind == "profile":
+        task_profiles.set(data["task_id"], data)
+        return
+    if warmup.is_warmup_job(flight_id):
+        warmup.on_event(flight_id, kind, data)
+        return
+    status = single_flight.status(flight_id)
+    if status is None: return  # 이미 끝났거나 취소된 계산
+    if kind == "queued":
+        status.update({"status": "queued", "queue_position": data["position"], "message": f"대기열 {data['position']}번째에서 기다리는 중입니다..."})
+    elif kind == "started":
+        status.update({"status": "processing", "queue_position": 0, "message": "작업을 시작합니다..."})
+    elif kind == "progress":
+        status.update(data)
+    elif kind == "done":
+        TASKS_FINISHED.inc(status="completed")
+        status = {"status": "completed", "progress": 100, "message": "최적화 완료!", "result": data}
+    elif kind == "failed":
+        TASKS_FINISHED.inc(status="failed")
+        logger.error(f"Flight {flight_id}: An error occurred during optimization: {data}")
+        status = {"status": "failed", "progress": 100, "message": f"오류 발생: {data}", "result": None}
+    publish_flight_status(flight_id, status)
+
+def _collect_queue_metrics():
+    queue_metrics = job_queue.metrics()
+    QUEUE_DEPTH.set(queue_metrics["queue_depth"])
+    QUEUE_WORKERS.set(queue_metrics["busy_workers"], state="busy")
+    QUEUE_WORKERS.set(queue_metrics["ready_workers"] - queue_metrics["busy_workers"], state="idle")
 
 @app.on_event("startup")
 def startup_event():
-    global api_client, final_optimizer
+    global api_client, job_queue, price_service, warmup
     api_key = os.getenv("LOSTARK_API_KEY")
     if not api_key: raise RuntimeError("LOSTARK_API_KEY environment variable not set.")
     api_client = LostArkAPI(api_key=api_key)
-    final_optimizer = FinalOptimizer(models_dir='./models/')
+    # 시세는 백그라운드에서 미리 갱신하고, 요청에는 보관 중인 스냅샷을 바로 돌려줍니다.
+    price_service = PriceSnapshotService(
+        api_client.get_gem_prices, _connect_redis(),
+        ttl=float(os.getenv("PRICE_SNAPSHOT_TTL_SECONDS", "60")),
+        max_stale=float(os.getenv("PRICE_SNAPSHOT_MAX_STALE_SECONDS", "3600")),
+    )
+    price_service.start()
+    # CPU를 많이 쓰는 최적화는 API 프로세스가 아닌 전용 워커 프로세스에서 실행합니다.
+    job_queue = JobQueue(
+        run_optimization_job,
+        worker_count=int(os.getenv("JOB_WORKERS", "2")),
+        max_queue_size=int(os.getenv("JOB_QUEUE_SIZE", "32")),
+        initializer=init_optimization_worker,
+        initargs=('./models/', os.getenv("SIMULATION_MODE", "batch"), os.getenv("MODEL_BACKEND", "numpy")),
+        on_event=update_task_from_job_event,
+    )
+    REGISTRY.add_collector(_collect_queue_metrics)
+    # 모델 로드와 캐시 예열은 백그라운드에서 진행하고, 끝나면 /health/ready가 200을 돌려줍니다.
+    warmup = WarmupCoordinator(
+        job_queue, price_service.get_snapshot,
+        crystal_price=int(os.getenv("WARMUP_CRYSTAL_PRICE", "8000")),
+        simulations=int(os.getenv("WARMUP_SIMULATIONS", str(OptimizeRequest.__fields__["simulations_per_gem"].default))),
+        enabled=os.getenv("WARMUP_ENABLED", "1") == "1",
+    )
+    warmup.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    warmup.stop()
+    price_service.stop()
+    job_queue.close()
+    await progress_bus.close()
 
 @app.post("/optimize")
-async def optimize_gems_async(request: OptimizeRequest, background_tasks: BackgroundTasks):
+async def optimize_gems_async(request: OptimizeRequest, profile: bool = False):
+    """profile=true이면 (ENABLE_TASK_PROFILING=1일 때) 이 작업의 샘플링 프로파일을 /tasks/{task_id}/profile 로 받을 수 있습니다."""
+    if profile and not TASK_PROFILING_ENABLED:
+        raise HTTPException(status_code=400, detail="작업 프로파일링이 비활성화되어 있습니다 (ENABLE_TASK_PROFILING=1).")
     task_id = str(uuid.uuid4())
-    task_manager[task_id] = {"status": "pending", "progress": 0, "message": "작업을 준비 중입니다...", "result": None}
-    background_tasks.add_task(run_optimization_task, task_id, request)
-    logger.info(f"Task {task_id} has been created and is running in the background.")
-    return {"task_id": task_id}
+    started = time.perf_counter()
+    try:
+        price_snapshot = await asyncio.to_thread(price_service.get_snapshot)
+    except Exception as e:
+        logger.error(f"Failed to fetch gem prices from Lost Ark API: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="로스트아크 API 서버로부터 시세 정보를 가져오는 데 실패했습니다.")
+    price_snapshot_seconds = time.perf_counter() - started
+    record_stage("price_snapshot", price_snapshot_seconds)
+    request_data = request.dict()
+    key = request_fingerprint(request_data, price_snapshot["version"])
+    initial_status = {"status": "pending", "progress": 0, "message": "작업을 준비 중입니다...", "result": None}
+    role, flight_id, status = single_flight.attach(key, task_id, initial_status)
+    progress_bus.publish(task_id, status)
+    TASKS_SUBMITTED.inc(role=role)
+    if role != "leader":
+        logger.info(f"Task {task_id} {role} an identical request (flight: {flight_id or 'completed'}).")
+        return {"task_id": task_id, "queue_position": status.get("queue_position", 0), "coalesced": True}
+    try:
+        payload = {
+            "request": request_data, "gem_prices": price_snapshot["prices"],
+            "timings": {"price_snapshot": price_snapshot_seconds}, "submitted_at": time.time(),
+        }
+        if profile: payload["profile_task_id"] = task_id
+        queue_position = job_queue.submit(flight_id, payload)
+    except QueueFullError as e:
+        single_flight.abandon(flight_id)
+        progress_bus.discard(task_id)
+        logger.warning(f"Rejected optimize request: job queue is full ({e.queue_depth} waiting).")
+        raise HTTPException(
+            status_code=429,
+            detail={"message": "요청이 많아 잠시 후 다시 시도해 주세요.", "queue_depth": e.queue_depth, "queue_position": e.queue_depth + 1},
+            headers={"Retry-After": "10"},
+        )
+    except JobQueueUnavailableError as e:
+        single_flight.abandon(flight_id)
+        progress_bus.discard(task_id)
+        logger.error(f"Rejected optimize request: {e}")
+        raise HTTPException(status_code=503, detail="최적화 작업 워커를 사용할 수 없습니다. 잠시 후 다시 시도해 주세요.")
+    logger.info(f"Task {task_id} has been queued as flight {flight_id} (position: {queue_position}).")
+    return {"task_id": task_id, "queue_position": queue_position, "coalesced": False}
     
 # <<< 1. 새로운 젬 시세 API 엔드포인트 추가
 @app.get("/markets/gems")
-async def get_gem_market_prices():
+async def get_gem_market_prices(response: Response):
     """
-    현재 18종 젬의 실시간 시세를 조회하여 반환합니다.
+    18종 젬의 시세 스냅샷을 반환합니다. 스냅샷 버전과 조회 시각은 응답 헤더로 알려줍니다.
     """
     try:
         logger.info("Request received for /markets/gems")
-        gem_prices = api_client.get_gem_prices()
-        return gem_prices
+        price_snapshot = await asyncio.to_thread(price_service.get_snapshot)
+        response.headers["X-Price-Version"] = price_snapshot["version"]
+        response.headers["X-Price-Fetched-At"] = str(price_snapshot["fetched_at"])
+        return price_snapshot["prices"]
     except Exception as e:
         logger.error(f"Failed to fetch gem prices from Lost Ark API: {e}", exc_info=True)
         raise HTTPException(status_code=503, detail="로스트아크 API 서버로부터 시세 정보를 가져오는 데 실패했습니다.")
 
 
+@app.get("/markets/gems/snapshot")
+async def get_gem_price_snapshot():
+    """
+    시세 스냅샷 전체(prices, version, fetched_at)와 스냅샷 서비스 통계를 반환합니다.
+    """
+    price_snapshot = await asyncio.to_thread(price_service.get_snapshot)
+    return {**price_snapshot, "stats": price_service.stats()}
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """
+    작업 워커별 최적화 결과 캐시와 시뮬레이션 통계 캐시의 적중/실패 카운터를 반환합니다.
+    (각 워커가 마지막 작업을 마쳤을 때 보낸 값)
+    """
+    return {"workers": job_queue.worker_stats()}
+
+
+@app.get("/queue/stats")
+async def get_queue_stats():
+    """
+    작업 대기열 길이, 바쁜 워커 수, 제출/완료/실패/취소/거절 누적 횟수와 요청 합치기 통계를 반환합니다.
+    """
+    return {**job_queue.metrics(), "coalescing": single_flight.stats()}
+
+
+@app.get("/health/live")
+async def get_health_live():
+    """
+    API 프로세스가 요청을 받을 수 있으면 항상 200을 반환합니다.
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def get_health_ready():
+    """
+    모든 작업 워커가 모델을 읽고 워커마다 캐시 예열이 끝났으면 200, 아니면 503을 반환합니다.
+    본문의 status는 loading_models / warming / warmup_failed / ready 중 하나이며,
+    워커 수, 예열된 워커 번호, 예열 상태(pending/running/completed/failed/disabled)와 마지막 오류가 함께 들어 있습니다.
+    """
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus 텍스트 형식의 지표 (단계별 시간, 시뮬레이션/추론 횟수, 캐시 적중, 대기열 길이).
+    워커 프로세스의 지표는 각 작업이 끝날 때 합쳐집니다.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/tasks/{task_id}/profile")
+async def get_task_profile(task_id: str):
+    """
+    /optimize?profile=true 로 요청한 작업의 샘플링 프로파일 (collapsed stack 형식, flamegraph 도구에서 열 수 있음).
+    """
+    task_profile = task_profiles.get(task_id)
+    if task_profile is None:
+        raise HTTPException(status_code=404, detail="프로파일을 찾을 수 없습니다.")
+    return PlainTextResponse(task_profile["collapsed"], headers={"X-Profile-Samples": str(task_profile["samples"]), "X-Profile-Interval": str(task_profile["interval"])})
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect": return
+
+
 @app.websocket("/ws/progress/{task_id}")
 async def websocket_progress(websocket: WebSocket, task_id: str):
+    """진행 상황이 발행될 때마다 바로 전달합니다. 클라이언트가 먼저 연결을 끊으면 작업을 취소합니다."""
     await websocket.accept()
     logger.info(f"WebSocket connection established for task {task_id}")
+
+    async def forward_progress() -> bool:
+        async for task_status in progress_bus.subscribe(task_id):
+            await websocket.send_json(task_status)
+            if task_status["status"] in ["completed", "failed"]:
+                logger.info(f"Task {task_id} finished. Closing WebSocket.")
+                return True
+        return False
+
     try:
-        while True:
-            task_status = task_manager.get(task_id)
-            if task_status:
-                await websocket.send_json(task_status)
-                if task_status["status"] in ["completed", "failed"]:
-                    logger.info(f"Task {task_id} finished. Closing WebSocket.")
-                    del task_manager[task_id]
-                    break
-            else:
-                await websocket.send_json({"status": "not_found", "message": "작업을 찾을 수 없습니다."})
-                break
-            await asyncio.sleep(1)
+        if await progress_bus.snapshot(task_id) is None:
+            await websocket.send_json({"status": "not_found", "message": "작업을 찾을 수 없습니다."})
+            return
+        forward_task = asyncio.create_task(forward_progress())
+        disconnect_task = asyncio.create_task(_wait_for_disconnect(websocket))
+        done, pending = await asyncio.wait({forward_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending: task.cancel()
+        finished = forward_task in done and forward_task.exception() is None and forward_task.result()
+        if finished:
+            progress_bus.discard(task_id)
+            await websocket.close()
+        else:
+            # 결과 전송 전에 연결이 끊겼으면 (수신 대기 중이든 전송 중이든) 작업을 취소합니다.
+            logger.warning(f"WebSocket connection closed for task {task_id}")
+            progress_bus.discard(task_id)
+            # 같은 계산을 기다리는 다른 작업이 남아 있으면 계산은 계속합니다.
+            abandoned_flight_id = single_flight.detach(task_id)
+            if abandoned_flight_id is not None and await asyncio.to_thread(job_queue.cancel, abandoned_flight_id):
+                logger.info(f"Task {task_id} cancelled because its client disconnected (flight: {abandoned_flight_id}).")
     except WebSocketDisconnect:
         logger.warning(f"WebSocket connection closed for task {task_id}")
     except Exception as e:
         logger.error(f"An error occurred in WebSocket for task {task_id}: {e}")
-    finally:
-        if task_id in task_manager:
-
-            del task_manager[task_id]
@@ -0,0 +1,283 @@
+# metrics.py
+import contextvars
+import math
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# ===================================================================
+# 최적화 경로 계측 (Prometheus 텍스트 형식 지표 + 작업별 시간 분석 + 샘플링 프로파일러)
+#
+# - 지표는 프로세스마다 REGISTRY에 쌓입니다. 작업 워커 프로세스는 작업이 끝날 때마다
+#   REGISTRY.drain()으로 증가분을 꺼내 API 프로세스로 보내고, API 프로세스는 merge()로 합친 뒤
+#   /metrics에서 render()로 내보냅니다. (외부 라이브러리 없이 텍스트 형식 0.0.4를 직접 씁니다)
+# - stage_timer(stage)는 단계별 시간 히스토그램에 기록하고, task_breakdown() 안에서 실행 중이면
+#   그 작업의 단계별 누적 시간(dict)에도 더합니다. 단계는 중첩될 수 있으므로 합계가 전체 시간과 같지는 않습니다.
+# - SamplingProfiler는 지정한 스레드의 호출 스택을 주기적으로 채집해 collapsed stack 형식
+#   ("함수1;함수2;함수3 횟수")으로 돌려줍니다. flamegraph.pl, speedscope 등에서 바로 열 수 있습니다.
+# ===================================================================
+
+METRIC_PREFIX = "gemggark"
+DEFAULT_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BATCH_SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+PROFILER_INTERVAL_SECONDS = 0.005
+PROFILER_MAX_DEPTH = 64
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names: Sequence[str], label_values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(label_names, label_values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, label_names: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """현재 값. 프로세스 사이에서 합치지 않습니다 (drain 대상 아님)."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self._values[key] = value
+
+    def _render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float] = DEFAULT_TIME_BUCKETS):
+        super().__init__(registry, name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # [버킷별 개수(비누적), 합, 개수]
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render(self) -> List[str]:
+        lines = []
+        for key, (bucket_counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', _format_value(upper)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, f"{METRIC_PREFIX}_{name}", help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, f"{METRIC_PREFIX}_{name}", help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_TIME_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, f"{METRIC_PREFIX}_{name}", help_text, label_names, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """render() 직전에 호출되어 게이지 값을 채우는 함수를 등록합니다 (예: 작업 대기열 길이)."""
+        self._collectors.append(collector)
+
+    def drain(self) -> Dict[str, List]:
+        """카운터와 히스토그램의 지금까지 증가분을 꺼내고 0으로 되돌립니다. (워커 -> API 프로세스 전달용)"""
+        snapshot = {}
+        with self.lock:
+            for name, metric in self._metrics.items():
+                if isinstance(metric, Gauge) or not metric._values:
+                    continue
+                snapshot[name] = list(metric._values.items())
+                metric._values = {}
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, List]):
+        """다른 프로세스에서 drain()한 증가분을 더합니다. 모르는 지표는 무시합니다."""
+        with self.lock:
+            for name, items in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in items:
+                    key = tuple(key)
+                    if isinstance(metric, Counter):
+                        metric._values[key] = metric._values.get(key, 0) + value
+                    elif isinstance(metric, Histogram) and len(value[0]) == len(metric.buckets):
+                        state = metric._values.setdefault(key, [[0] * len(metric.buckets), 0.0, 0])
+                        state[0] = [a + b for a, b in zip(state[0], value[0])]
+                        state[1] += value[1]
+                        state[2] += value[2]
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        with self.lock:
+            for metric in self._metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric._render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# --- 지표 정의 (API 프로세스와 워커 프로세스가 같은 이름을 쓰도록 여기서만 정의) ---
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Time spent per optimize pipeline stage.", ["stage"])
+LIFECYCLES_SIMULATED = REGISTRY.counter("lifecycles_simulated_total", "Gem lifecycles simulated (or solved exactly) for lifecycle statistics.", ["mode"])
+MODEL_INFERENCE_CALLS = REGISTRY.counter("model_inference_calls_total", "Policy model inference calls.", ["backend"])
+MODEL_BATCH_SIZE = REGISTRY.histogram("model_inference_batch_size", "States evaluated per policy model inference call.", ["backend"], buckets=BATCH_SIZE_BUCKETS)
+CACHE_EVENTS = REGISTRY.counter("cache_events_total", "Two-tier cache lookups by outcome.", ["cache", "event"])
+TASKS_FINISHED = REGISTRY.counter("tasks_finished_total", "Optimize computations finished, by outcome.", ["status"])
+TASKS_SUBMITTED = REGISTRY.counter("tasks_submitted_total", "Optimize requests accepted, by coalescing role.", ["role"])
+QUEUE_DEPTH = REGISTRY.gauge("job_queue_depth", "Optimize jobs waiting for a worker.")
+QUEUE_WORKERS = REGISTRY.gauge("job_queue_workers", "Optimize worker processes by state.", ["state"])
+
+
+# --- 작업별 단계 시간 ---
+
+_active_breakdown: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("active_breakdown", default=None)
+
+
+@contextmanager
+def task_breakdown(initial: Optional[Dict[str, float]] = None) -> Iterator[Dict[str, float]]:
+    """이 블록 안의 stage_timer 시간을 단계별로 누적한 dict를 돌려줍니다."""
+    breakdown = dict(initial or {})
+    token = _active_breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _active_breakdown.reset(token)
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    breakdown = _active_breakdown.get()
+    if breakdown is not None:
+        breakdown[stage] = breakdown.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+# --- 샘플링 프로파일러 ---
+
+class SamplingProfiler:
+    """target_thread_id 스레드의 호출 스택을 interval초마다 채집합니다. with 문으로 사용합니다."""
+
+    def __init__(self, target_thread_id: Optional[int] = None, interval: float = PROFILER_INTERVAL_SECONDS):
+        self.target_thread_id = target_thread_id if target_thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks: _StackCounter = _StackCounter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.target_thread_id)
+        names = []
+        while frame is not None and len(names) < PROFILER_MAX_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if names:
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def collapsed(self) -> str:
+        """collapsed stack 형식의 결과 (많이 잡힌 스택부터)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
@@ -0,0 +1,89 @@
+# numpy_mlp.py
+import json
+from typing import List, Tuple
+
+import h5py
+import numpy as np
+
+# ===================================================================
+# 순수 NumPy 추론 엔진
+#
+# dqn_model.create_dqn_model이 만드는 Dense(64, relu) - Dense(64, relu) - Dense(2, linear)
+# 구조의 .h5 파일에서 가중치만 읽어, TensorFlow 없이 float32 배치 순전파를 수행합니다.
+# ===================================================================
+
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0.0, out=x),
+    "linear": lambda x: x,
+}
+
+
+class NumpyMLP:
+    def __init__(self, layers: List[Tuple[np.ndarray, np.ndarray, str]]):
+        for _, _, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {activation}")
+        self.layers = [(kernel.astype(np.float32), bias.astype(np.float32), activation) for kernel, bias, activation in layers]
+
+    @classmethod
+    def from_h5(cls, model_path: str) -> "NumpyMLP":
+        """Keras가 저장한 Sequential Dense 모델(.h5)의 가중치와 활성화 함수를 읽어옵니다."""
+        with h5py.File(model_path, "r") as f:
+            model_config = json.loads(f.attrs["model_config"])
+            activations = {
+                layer["config"]["name"]: layer["config"].get("activation", "linear")
+                for layer in model_config["config"]["layers"] if layer["class_name"] == "Dense"
+            }
+            weights_group = f["model_weights"]
+            layers = []
+            for layer_name in weights_group.attrs["layer_names"]:
+                layer_name = layer_name.decode() if isinstance(layer_name, bytes) else layer_name
+                if layer_name not in activations: continue
+                layer_group = weights_group[layer_name]
+                weight_names = [name.decode() if isinstance(name, bytes) else name for name in layer_group.attrs["weight_names"]]
+                kernel = next(layer_group[name][()] for name in weight_names if name.endswith("kernel:0"))
+                bias = next(layer_group[name][()] for name in weight_names if name.endswith("bias:0"))
+                layers.append((kernel, bias, activations[layer_name]))
+        if not layers:
+            raise ValueError(f"No Dense layers found in '{model_path}'.")
+        return cls(layers)
+
+    def predict(self, state_batch: np.ndarray) -> np.ndarray:
+        """(N, input_dim) 상태 배열에 대한 Q-값 (N, num_actions)을 반환합니다."""
+        x = np.asarray(state_batch, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = ACTIVATIONS[activation](x @ kernel + bias)
+        return x
+
+    def predict_actions(self, state_batch: np.ndarray) -> np.ndarray:
+        return np.argmax(self.predict(state_batch), axis=1)
+
+
+# ===================================================================
+# Keras 출력과의 동등성 확인용 테스트 코드
+# ===================================================================
+if __name__ == '__main__':
+    import argparse
+    import tensorflow as tf
+
+    parser = argparse.ArgumentParser(description="Check NumpyMLP outputs against Keras for a specialist model.")
+    parser.add_argument('--model', type=str, default='./models/gem_model_c5_e3.h5', help="Path to a gem_model_c*_e*.h5 file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    states = np.concatenate([
+        rng.integers(low=[1, 1, 1, 1, 0, 0], high=[6, 6, 6, 6, 10, 23], size=(4096, 6)),
+        rng.uniform(low=0, high=20, size=(1024, 6)),
+    ]).astype(np.float32)
+
+    numpy_model = NumpyMLP.from_h5(args.model)
+    keras_model = tf.keras.models.load_model(args.model, compile=False)
+    numpy_q = numpy_model.predict(states)
+    keras_q = keras_model(tf.convert_to_tensor(states), training=False).numpy()
+
+    max_abs_diff = np.abs(numpy_q - keras_q).max()
+    action_agreement = (numpy_q.argmax(axis=1) == keras_q.argmax(axis=1)).mean()
+    print(f"Max |Q_numpy - Q_keras|: {max_abs_diff:.2e}")
+    print(f"Action agreement: {action_agreement:.4%}")
+    assert np.allclose(numpy_q, keras_q, rtol=1e-5, atol=1e-4), "NumPy forward pass does not match Keras outputs."
+    print("\n테스트 완료.")
@@ -0,0 +1,140 @@
+# optimization_job.py
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from validator import check_feasibility_anytime
+from final_optimizer import FinalOptimizer
+from metrics import REGISTRY, SamplingProfiler, record_stage, stage_timer, task_breakdown
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# /optimize 작업 본체 (JobQueue 워커 프로세스에서 실행)
+#
+# 워커 프로세스마다 FinalOptimizer를 한 번만 만들어 두고, 진행 상황은 report("progress", {...})로
+# API 프로세스에 전달합니다. 젬 시세는 요청을 합칠 때 쓴 스냅샷을 API 프로세스에서 함께 받습니다.
+# 워커 프로세스 자체가 병렬 단위이므로 FinalOptimizer의 후보 평가 풀은 사용하지 않습니다.
+# 결과에는 단계별 소요 시간(timings)을 붙이고, 작업이 끝나면 이 프로세스에 쌓인 지표 증가분을
+# report("metrics", ...)로 보냅니다. payload에 profile_task_id가 있으면 샘플링 프로파일을 report("profile", ...)로 보냅니다.
+# payload의 kind가 "warmup"이면 최적화 대신 FinalOptimizer.warm_up으로 이 워커의 캐시를 채웁니다. (warmup.py)
+# ===================================================================
+
+VALIDATOR_TIME_BUDGET_SECONDS = float(os.getenv("VALIDATOR_TIME_BUDGET_SECONDS", "2.0"))
+# 후보/의지력 단위의 세부 진행 이벤트는 이 간격보다 자주 보내지 않습니다.
+PROGRESS_MIN_INTERVAL_SECONDS = 0.1
+
+_final_optimizer: Optional[FinalOptimizer] = None
+
+
+def init_optimization_worker(models_dir: str, simulation_mode: str, model_backend: str):
+    global _final_optimizer
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', handlers=[logging.FileHandler("gemggark_api.log"), logging.StreamHandler()])
+    _final_optimizer = FinalOptimizer(models_dir=models_dir, simulation_mode=simulation_mode, model_backend=model_backend, workers=0)
+
+
+class _OptimizerProgressReporter:
+    """FinalOptimizer의 진행 이벤트를 작업 상태(message, progress)로 바꿔 보냅니다."""
+
+    def __init__(self, core_type: str, group_start: float, group_span: float, report: Callable[[str, Any], None]):
+        self.core_type = core_type
+        self.group_start = group_start
+        self.group_span = group_span
+        self.report = report
+        self.core_index, self.core_count = 0, 1
+        self.last_sent_at = 0.0
+
+    def __call__(self, event: Dict):
+        stage = event["stage"]
+        if stage == "core":
+            self.core_index, self.core_count = event["core_index"], event["core_count"]
+            message = f"{self.core_type} 코어 최적화 전략을 AI가 시뮬레이션 중입니다... ({event['core']}, {self.core_index + 1}/{self.core_count})"
+            fraction = self.core_index / self.core_count
+        else:
+            now = time.monotonic()
+            if now - self.last_sent_at < PROGRESS_MIN_INTERVAL_SECONDS: return
+            if stage == "candidate":
+                message = f"{self.core_type} 코어 시뮬레이션 중... (목표 {event['spec']}, {event['material_grade']} 재료, {event['done']}/{event['total']})"
+                fraction = (self.core_index + event["done"] / event["total"]) / self.core_count
+            else:
+                message = f"{self.core_type} 코어 의지력 {event['willpower_cost']} 최소 비용 계산 완료"
+                fraction = self.core_index / self.core_count
+        self.last_sent_at = time.monotonic()
+        self.report("progress", {"message": message, "progress": int(self.group_start + self.group_span * fraction)})
+
+
+def run_optimization_job(task_id: str, payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Dict:
+    """
+    {"request": OptimizeRequest.dict(), "gem_prices": 시세 스냅샷}을 받아 최적화 결과(final_result)를 반환합니다.
+    payload의 선택 항목: "timings"(API 프로세스에서 잰 단계별 시간), "submitted_at"(제출 시각, time.time()),
+    "profile_task_id"(샘플링 프로파일을 채집할 작업 id).
+    {"kind": "warmup", "gem_prices", "crystal_price", "simulations"}이면 캐시 예열 요약을 반환합니다.
+    실패하면 예외를 던지고, JobQueue가 이를 "failed" 이벤트로 전달합니다.
+    """
+    profile_task_id = payload.get("profile_task_id")
+    profiler = SamplingProfiler() if profile_task_id else None
+    if profiler is not None: profiler.start()
+    try:
+        with task_breakdown(payload.get("timings")) as timings:
+            if "submitted_at" in payload:
+                record_stage("queue_wait", max(0.0, time.time() - payload["submitted_at"]))
+            if payload.get("kind") == "warmup":
+                with stage_timer("warmup"):
+                    return _final_optimizer.warm_up(payload["gem_prices"], payload["crystal_price"], payload["simulations"])
+            with stage_timer("job_total"):
+                final_result = _run_optimization(task_id, payload, report)
+            final_result["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+            return final_result
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            report("profile", {"task_id": profile_task_id, "samples": profiler.samples, "interval": profiler.interval, "collapsed": profiler.collapsed()})
+        report("stats", _final_optimizer.cache_stats())
+        report("metrics", REGISTRY.drain())
+
+
+def _run_optimization(task_id: str, payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Dict:
+    def update_status(message: str, progress: Optional[int] = None):
+        status = {"message": message}
+        if progress is not None: status["progress"] = progress
+        report("progress", status)
+
+    logger.info(f"Task {task_id}: Starting optimization.")
+    request, current_gem_prices = payload["request"], payload["gem_prices"]
+    crystal_gold_price = request["blue_crystal_price"]
+    core_groups = {"질서": request["cores"].get("질서", []), "혼돈": request["cores"].get("혼돈", [])}
+    held_gem_groups = {"질서": [], "혼돈": []}
+    for gem in request["held_gems"]:
+        if "질서" in gem["name"]: held_gem_groups["질서"].append(gem)
+        elif "혼돈" in gem["name"]: held_gem_groups["혼돈"].append(gem)
+    final_result = {"total_cost": 0, "strategy_details": {}, "feasibility": {}}
+    total_cores = len([c for c_list in core_groups.values() for c in c_list if c])
+    processed_cores = 0
+    for core_type in ["질서", "혼돈"]:
+        if not core_groups[core_type]: continue
+        group_start = processed_cores / total_cores * 100
+        group_span = len(core_groups[core_type]) / total_cores * 100
+        update_status(f"{core_type} 그룹 보유 젬 구성을 검증하는 중입니다...")
+        def report_search_progress(info: Dict, core_type: str = core_type):
+            update_status(f"{core_type} 그룹 보유 젬 구성을 검증하는 중입니다... (탐색 {info['nodes']:,}개, {info['elapsed']:.1f}초)")
+        with stage_timer("feasibility"):
+            is_feasible, remaining_info, search_info = check_feasibility_anytime(
+                {core_type: core_groups[core_type]}, held_gem_groups[core_type],
+                time_budget=VALIDATOR_TIME_BUDGET_SECONDS, progress_callback=report_search_progress,
+            )
+        if not is_feasible: raise ValueError(f"{core_type} 그룹 보유 젬 구성 실현 불가: {remaining_info.get('reason')}")
+        final_result["feasibility"][core_type] = {"optimal": search_info["optimal"], "nodes": search_info["nodes"], "elapsed": round(search_info["elapsed"], 3)}
+        if not search_info["optimal"]:
+            logger.warning(f"Task {task_id}: {core_type} feasibility search hit its budget; using best-effort placement ({search_info['nodes']} nodes).")
+        if any(core['remaining_slots'] > 0 for core in remaining_info):
+            update_status(f"{core_type} 코어 최적화 전략을 AI가 시뮬레이션 중입니다...")
+            progress_reporter = _OptimizerProgressReporter(core_type, group_start, group_span, report)
+            with stage_timer("strategy_search"):
+                best_strategy = _final_optimizer.find_best_strategy(remaining_info, current_gem_prices, crystal_gold_price, request["simulations_per_gem"], progress_reporter, request.get("target_precision"))
+            final_result["strategy_details"][core_type] = best_strategy
+            final_result["total_cost"] += best_strategy.get("total_cost", 0)
+        processed_cores += len(core_groups[core_type])
+        report("progress", {"progress": int((processed_cores / total_cores) * 100) if total_cores > 0 else 100})
+    logger.info(f"Task {task_id}: Optimization completed successfully.")
+    return final_result
@@ -0,0 +1,118 @@
+# policy_table.py
+import json
+import logging
+import os
+import re
+from typing import Dict
+
+import numpy as np
+
+from gem_simulator import GEM_GRADES
+from exact_solver import policy_grid_states
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# 증류(distill)된 정책 행동표
+#
+# 최적화기가 모델에 넣는 상태는 [효율, 코어, 1, 1, 남은 가공, 남은 리롤]로 이산적이므로,
+# 전문가 모델을 전체 격자에서 한 번 평가한 argmax 결과를 표로 저장해 두면
+# 서빙 시에는 배열 인덱싱만으로 행동을 고를 수 있습니다. (TensorFlow 불필요)
+#
+# 표는 가장 넓은 격자(영웅 등급)로 만들며, 하위 등급은 그 일부를 잘라 사용합니다.
+# 각 파일은 임시 파일로 쓴 뒤 os.replace로 교체하고 manifest.json은 마지막에 교체하므로,
+# 증류가 중간에 끊기거나 서버가 쓰는 도중 읽어도 잘린 표나 없는 파일을 가리키는 manifest를 보지 않습니다.
+# ===================================================================
+
+POLICY_GRADE = "heroic"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+STATE_LAYOUT = ["efficiency", "core", "effect1=1", "effect2=1", "remaining_crafts", "remaining_rerolls"]
+
+
+def policy_table_filename(core_point: int, efficiency: int) -> str:
+    return f"policy_c{core_point}_e{efficiency}.npy"
+
+
+class PolicyTable:
+    """(효율, 코어, 남은 가공, 남은 리롤) -> 행동 을 배열 인덱싱으로 반환하는 정책."""
+
+    def __init__(self, table: np.ndarray):
+        self.table = np.asarray(table, dtype=np.int8)
+        self.max_crafts = self.table.shape[2] - 1
+        self.max_rerolls = self.table.shape[3] - 1
+
+    def predict_actions(self, state_batch: np.ndarray) -> np.ndarray:
+        states = np.asarray(state_batch).astype(np.int64)
+        return self.table[
+            states[:, 0] - 1, states[:, 1] - 1,
+            np.clip(states[:, 4], 0, self.max_crafts), np.clip(states[:, 5], 0, self.max_rerolls),
+        ].astype(np.int64)
+
+
+def distill_predictor(predict_actions) -> np.ndarray:
+    """predict_actions((N, 6) 상태) -> (N,) 행동 함수를 전체 격자에서 평가해 행동표를 만듭니다."""
+    grid_states, shape = policy_grid_states(POLICY_GRADE)
+    return np.asarray(predict_actions(grid_states), dtype=np.int8).reshape(shape)
+
+
+def _save_npy_atomic(path: str, array: np.ndarray):
+    tmp_path = os.path.join(os.path.dirname(path), f".tmp_{os.path.basename(path)}")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _write_json_atomic(path: str, payload: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_policy_tables(tables: Dict[tuple, np.ndarray], output_dir: str, sources: Dict[tuple, str]):
+    """타겟별 .npy 파일을 모두 교체한 뒤 마지막으로 manifest.json을 교체합니다."""
+    os.makedirs(output_dir, exist_ok=True)
+    entries = {}
+    for (core_point, efficiency), table in sorted(tables.items()):
+        filename = policy_table_filename(core_point, efficiency)
+        _save_npy_atomic(os.path.join(output_dir, filename), table)
+        entries[f"c{core_point}_e{efficiency}"] = {
+            "core_point": core_point, "efficiency": efficiency, "file": filename,
+            "source": sources.get((core_point, efficiency)), "shape": list(table.shape),
+        }
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "grid_grade": POLICY_GRADE,
+        "max_crafts": GEM_GRADES[POLICY_GRADE]['craft_count'],
+        "state_layout": STATE_LAYOUT,
+        "tables": entries,
+    }
+    _write_json_atomic(os.path.join(output_dir, MANIFEST_FILE), manifest)
+
+
+def load_policy_tables(policies_dir: str) -> Dict[tuple, PolicyTable]:
+    """manifest.json에 등록된 행동표를 읽어 {(core_point, efficiency): PolicyTable}로 반환합니다."""
+    manifest_path = os.path.join(policies_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise RuntimeError(f"Policy manifest not found at '{manifest_path}'. Please run distill_policy.py first.")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise RuntimeError(f"Unsupported policy manifest version: {manifest.get('version')}")
+    tables = {}
+    for entry in manifest["tables"].values():
+        table = np.load(os.path.join(policies_dir, entry["file"]))
+        tables[(entry["core_point"], entry["efficiency"])] = PolicyTable(table)
+    return tables
+
+
+def find_specialist_model_files(models_dir: str) -> Dict[tuple, str]:
+    """models_dir에서 gem_model_c{cp}_e{eff}.h5 파일을 찾아 {(cp, eff): 경로}로 반환합니다."""
+    pattern = re.compile(r"gem_model_c(\d+)_e(\d+)\.h5")
+    model_files = {}
+    for filename in sorted(os.listdir(models_dir)):
+        match = pattern.match(filename)
+        if match:
+            model_files[(int(match.group(1)), int(match.group(2)))] = os.path.join(models_dir, filename)
+    return model_files
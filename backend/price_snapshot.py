@@ -0,0 +1,194 @@
+# price_snapshot.py
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import redis
+
+from metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# 젬 시세 스냅샷 서비스 (TTL + stale-while-revalidate)
+#
+# 로스트아크 API 페이지 조회는 수 초가 걸리므로, 마지막 시세 스냅샷을 메모리와 Redis에 보관하고
+# 호출자에게는 항상 보관 중인 스냅샷을 즉시 돌려줍니다.
+#  - 신선한 스냅샷(ttl 이내): 그대로 반환
+#  - 오래된 스냅샷(max_stale 이내): 그대로 반환하고 백그라운드에서 갱신
+#  - 스냅샷이 없거나 너무 오래됨: Redis(다른 프로세스가 갱신한 값)를 확인하고, 없으면 직접 조회
+# 스냅샷에는 시세 내용의 해시(version)와 조회 시각(fetched_at)이 들어 있어 하위 캐시의 키로 쓸 수 있습니다.
+# ===================================================================
+
+PRICE_SNAPSHOT_KEY = "gem_prices:snapshot:v1"
+PRICE_SNAPSHOT_TTL_SECONDS = 60
+PRICE_SNAPSHOT_MAX_STALE_SECONDS = 3600
+
+
+def make_price_snapshot(prices: Dict[str, Optional[int]], fetched_at: Optional[float] = None) -> Dict:
+    """{"prices", "version", "fetched_at"} 형태의 스냅샷. version은 시세 내용이 같으면 같습니다."""
+    version = hashlib.sha1(json.dumps(prices, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+    return {"prices": prices, "version": version, "fetched_at": time.time() if fetched_at is None else fetched_at}
+
+
+class PriceSnapshotService:
+    def __init__(
+        self, fetch_prices: Callable[[], Dict[str, Optional[int]]], redis_client: Optional[redis.Redis] = None,
+        ttl: float = PRICE_SNAPSHOT_TTL_SECONDS, max_stale: float = PRICE_SNAPSHOT_MAX_STALE_SECONDS,
+    ):
+        """
+        Args:
+            fetch_prices: 최신 시세를 조회하는 함수 (예: LostArkAPI.get_gem_prices).
+            redis_client: 여러 프로세스가 스냅샷을 공유할 Redis 클라이언트. None이면 메모리에만 보관.
+            ttl (float): 이 시간(초)이 지나면 백그라운드 갱신을 시작합니다.
+            max_stale (float): 이 시간(초)이 지난 스냅샷은 쓰지 않고 새로 조회합니다.
+        """
+        self.fetch_prices = fetch_prices
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._snapshot: Optional[Dict] = None
+        self._fetch_lock = threading.Lock()
+        self._refreshing = threading.Event()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        self.counters = {"fresh_hits": 0, "stale_hits": 0, "redis_hits": 0, "fetches": 0, "fetch_errors": 0}
+
+    @staticmethod
+    def _age(snapshot: Optional[Dict]) -> float:
+        return float("inf") if snapshot is None else time.time() - snapshot["fetched_at"]
+
+    def _load_from_redis(self) -> Optional[Dict]:
+        if self.redis_client is None:
+            return None
+        try:
+            raw = self.redis_client.get(PRICE_SNAPSHOT_KEY)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Could not read price snapshot from Redis: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def _store(self, snapshot: Dict):
+        if self._snapshot is None or snapshot["fetched_at"] >= self._snapshot["fetched_at"]:
+            self._snapshot = snapshot
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.set(PRICE_SNAPSHOT_KEY, json.dumps(snapshot, ensure_ascii=False), ex=int(self.max_stale))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Could not store price snapshot in Redis: {e}")
+
+    def refresh(self) -> Dict:
+        """시세를 새로 조회해 저장합니다. 동시에 여러 번 호출되면 한 번만 조회합니다."""
+        started_at = time.time()
+        with self._fetch_lock:
+            if self._snapshot is not None and self._snapshot["fetched_at"] >= started_at:
+                return self._snapshot  # 기다리는 동안 다른 스레드가 갱신함
+            try:
+                with stage_timer("price_fetch"):
+                    prices = self.fetch_prices()
+                if not any(price is not None for price in prices.values()):
+                    raise RuntimeError("Price fetch returned no prices.")
+            except Exception:
+                self.counters["fetch_errors"] += 1
+                raise
+            self.counters["fetches"] += 1
+            snapshot = make_price_snapshot(prices)
+            self._store(snapshot)
+            logger.info(f"Refreshed gem price snapshot (version: {snapshot['version']}).")
+            return snapshot
+
+    def _refresh_in_background(self):
+        if self._refreshing.is_set():
+            return
+        self._refreshing.set()
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Background price refresh failed: {e}")
+            finally:
+                self._refreshing.clear()
+
+        threading.Thread(target=run, name="price-snapshot-refresh", daemon=True).start()
+
+    def get_snapshot(self) -> Dict:
+        """보관 중인 스냅샷을 즉시 반환합니다. 쓸 수 있는 스냅샷이 전혀 없을 때만 조회를 기다립니다."""
+        snapshot = self._snapshot
+        if self._age(snapshot) > self.ttl:
+            redis_snapshot = self._load_from_redis()
+            if redis_snapshot is not None and self._age(redis_snapshot) < self._age(snapshot):
+                self._snapshot = snapshot = redis_snapshot
+                self.counters["redis_hits"] += 1
+        age = self._age(snapshot)
+        if age <= self.ttl:
+            self.counters["fresh_hits"] += 1
+            return snapshot
+        if age <= self.max_stale:
+            self.counters["stale_hits"] += 1
+            self._refresh_in_background()
+            return snapshot
+        return self.refresh()
+
+    def start(self, interval: Optional[float] = None):
+        """interval(기본값 ttl)마다 스냅샷을 미리 갱신하는 백그라운드 스레드를 시작합니다."""
+        interval = self.ttl if interval is None else interval
+
+        def loop():
+            while not self._stop.is_set():
+                if self._age(self._snapshot) >= interval:
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        logger.warning(f"Scheduled price refresh failed: {e}")
+                self._stop.wait(max(1.0, interval - self._age(self._snapshot)) if self._snapshot else interval)
+
+        self._refresher = threading.Thread(target=loop, name="price-snapshot-refresher", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=5)
+
+    def stats(self) -> Dict:
+        stats = dict(self.counters)
+        stats["version"] = self._snapshot["version"] if self._snapshot else None
+        stats["age_seconds"] = self._age(self._snapshot) if self._snapshot else None
+        return stats
+
+
+# ===================================================================
+# 로컬 가짜 시장 서버를 이용한 테스트 코드
+# ===================================================================
+if __name__ == '__main__':
+    from fake_market_server import start_fake_market_server
+    from lostark_api import LostArkAPI
+
+    logging.basicConfig(level=logging.INFO)
+    server = start_fake_market_server(port=0, page_size=5)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    api = LostArkAPI(api_key="test-key", base_url=base_url, page_delay_seconds=0)
+    service = PriceSnapshotService(api.get_gem_prices, ttl=0.5, max_stale=5)
+
+    first = service.get_snapshot()
+    assert first["prices"] and all(price is not None for price in first["prices"].values()), "모든 젬 시세를 받아야 합니다."
+    assert service.get_snapshot() is first, "TTL 이내에는 같은 스냅샷을 반환해야 합니다."
+
+    server.shift_prices(100)
+    time.sleep(0.6)
+    started = time.perf_counter()
+    stale = service.get_snapshot()
+    assert stale is first and time.perf_counter() - started < 0.05, "오래된 스냅샷은 즉시 반환해야 합니다."
+    for _ in range(50):
+        if service.get_snapshot()["version"] != first["version"]: break
+        time.sleep(0.05)
+    refreshed = service.get_snapshot()
+    assert refreshed["version"] != first["version"], "백그라운드 갱신 후에는 새 버전이어야 합니다."
+    print(f"versions: {first['version']} -> {refreshed['version']} | stats: {service.stats()}")
+    server.shutdown()
+    print("\n테스트 완료.")
@@ -0,0 +1,128 @@
+# progress_bus.py
+import asyncio
+import json
+import logging
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from result_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# 작업 진행 상황 발행/구독(pub/sub) 채널
+#
+# 작업 상태가 바뀔 때마다 전체 상태 dict를 발행하고, 웹소켓 핸들러는 폴링 대신 이벤트를 기다립니다.
+# 구독을 시작하면 마지막 상태를 먼저 받으므로, 늦게 연결한 클라이언트도 현재 상태부터 볼 수 있습니다.
+#  - InProcessProgressBus: 한 API 프로세스 안에서 asyncio 큐로 전달
+#  - RedisProgressBus: Redis PUBLISH/SUBSCRIBE로 전달 (여러 API 프로세스가 같은 작업을 구독 가능)
+# publish()는 JobQueue 리스너 스레드에서 호출되므로 스레드 안전해야 합니다.
+# ===================================================================
+
+PROGRESS_CHANNEL_PREFIX = "gem_progress"
+PROGRESS_SNAPSHOT_TTL_SECONDS = 3600
+PROGRESS_SNAPSHOT_MAX_SIZE = 4096
+
+
+class InProcessProgressBus:
+    def __init__(self, snapshot_ttl: int = PROGRESS_SNAPSHOT_TTL_SECONDS, max_snapshots: int = PROGRESS_SNAPSHOT_MAX_SIZE):
+        self._snapshots = LRUCache(max_size=max_snapshots, ttl=snapshot_ttl)
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, task_id: str, status: Dict):
+        self._snapshots.set(task_id, status)
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, status)
+
+    async def snapshot(self, task_id: str) -> Optional[Dict]:
+        return self._snapshots.get(task_id)
+
+    def discard(self, task_id: str):
+        self._snapshots.delete(task_id)
+
+    async def subscribe(self, task_id: str) -> AsyncIterator[Dict]:
+        queue: asyncio.Queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(task_id, []).append(subscriber)
+        try:
+            status = await self.snapshot(task_id)
+            if status is not None:
+                yield status
+            while True:
+                yield await queue.get()
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(task_id, [])
+                if subscriber in subscribers: subscribers.remove(subscriber)
+                if not subscribers: self._subscribers.pop(task_id, None)
+
+    async def close(self):
+        pass
+
+
+class RedisProgressBus:
+    def __init__(self, host: str = 'redis', port: int = 6379, snapshot_ttl: int = PROGRESS_SNAPSHOT_TTL_SECONDS):
+        self.snapshot_ttl = snapshot_ttl
+        self.redis_client = redis.Redis(host=host, port=port, db=0, decode_responses=True, socket_timeout=2, socket_connect_timeout=2)
+        self.async_redis_client = aioredis.Redis(host=host, port=port, db=0, decode_responses=True, socket_connect_timeout=2)
+
+    @staticmethod
+    def _channel(task_id: str) -> str:
+        return f"{PROGRESS_CHANNEL_PREFIX}:{task_id}"
+
+    @staticmethod
+    def _snapshot_key(task_id: str) -> str:
+        return f"{PROGRESS_CHANNEL_PREFIX}:latest:{task_id}"
+
+    def publish(self, task_id: str, status: Dict):
+        message = json.dumps(status, ensure_ascii=False)
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            pipeline.set(self._snapshot_key(task_id), message, ex=self.snapshot_ttl)
+            pipeline.publish(self._channel(task_id), message)
+            pipeline.execute()
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Failed to publish progress for task {task_id}: {e}")
+
+    async def snapshot(self, task_id: str) -> Optional[Dict]:
+        raw = await self.async_redis_client.get(self._snapshot_key(task_id))
+        return json.loads(raw) if raw is not None else None
+
+    def discard(self, task_id: str):
+        try:
+            self.redis_client.delete(self._snapshot_key(task_id))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Failed to discard progress snapshot for task {task_id}: {e}")
+
+    async def subscribe(self, task_id: str) -> AsyncIterator[Dict]:
+        pubsub = self.async_redis_client.pubsub()
+        await pubsub.subscribe(self._channel(task_id))
+        try:
+            status = await self.snapshot(task_id)
+            if status is not None:
+                yield status
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield json.loads(message["data"])
+        finally:
+            await pubsub.unsubscribe(self._channel(task_id))
+            await pubsub.aclose()
+
+    async def close(self):
+        await self.async_redis_client.aclose()
+
+
+def create_progress_bus(backend: str = "memory", redis_host: str = 'redis'):
+    """backend: "memory"(프로세스 내부) 또는 "redis"."""
+    if backend == "memory":
+        return InProcessProgressBus()
+    if backend == "redis":
+        return RedisProgressBus(host=redis_host)
+    raise ValueError(f"Invalid progress bus backend: {backend}")
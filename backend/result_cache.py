@@ -0,0 +1,152 @@
+# result_cache.py
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+import redis
+
+from metrics import CACHE_EVENTS, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# 2단 캐시 (프로세스 내부 LRU + Redis)
+#
+# 1차: 크기 제한과 TTL이 있는 프로세스 내부 LRU
+# 2차: Redis (여러 키를 MGET 한 번으로 조회하고, 저장은 파이프라인으로 한 번에 전송)
+# Redis에 연결할 수 없으면 잠시 동안 Redis를 건너뛰고 로컬 캐시만 사용합니다.
+# ===================================================================
+
+REDIS_RETRY_INTERVAL_SECONDS = 30
+
+
+def price_snapshot_hash(gem_prices: Dict[str, Optional[int]], crystal_price: int) -> str:
+    """젬 시세와 블루 크리스탈 가격을 정규화해 만든 해시. 시세가 바뀌면 캐시 키도 바뀝니다."""
+    snapshot = json.dumps({"gem_prices": gem_prices, "crystal_price": crystal_price}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(snapshot.encode("utf-8")).hexdigest()[:16]
+
+
+class LRUCache:
+    """스레드 안전한 LRU 캐시. 항목마다 만료 시각을 두고, 조회 시점에 만료된 항목을 제거합니다."""
+
+    def __init__(self, max_size: int, ttl: Optional[float]):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class TwoTierCache:
+    def __init__(self, redis_client: Optional[redis.Redis], max_size: int = 1024, ttl: Optional[int] = 21600, name: str = "cache"):
+        """name은 /metrics의 cache 라벨로 쓰입니다."""
+        self.redis_client = redis_client
+        self.name = name
+        self.ttl = ttl
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self._redis_retry_at = 0.0
+        self._counter_lock = threading.Lock()
+        self.counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        if amount:
+            with self._counter_lock:
+                self.counters[name] += amount
+            CACHE_EVENTS.inc(amount, cache=self.name, event=name)
+
+    def _redis_available(self) -> bool:
+        return self.redis_client is not None and time.monotonic() >= self._redis_retry_at
+
+    def _on_redis_error(self, e: Exception):
+        self._count("redis_errors")
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL_SECONDS
+        logger.warning(f"Redis unavailable ({e}). Using local cache only for {REDIS_RETRY_INTERVAL_SECONDS}s.")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """찾은 키만 담은 dict를 반환합니다. 로컬에 없는 키들은 Redis MGET 한 번으로 조회합니다."""
+        found, remote_keys = {}, []
+        for key in dict.fromkeys(keys):
+            value = self.local.get(key)
+            if value is None: remote_keys.append(key)
+            else: found[key] = value
+        self._count("local_hits", len(found))
+        remote_hits = 0
+        if remote_keys and self._redis_available():
+            try:
+                with stage_timer("redis"):
+                    remote_values = self.redis_client.mget(remote_keys)
+            except redis.exceptions.RedisError as e:
+                self._on_redis_error(e)
+                remote_values = [None] * len(remote_keys)
+            for key, raw in zip(remote_keys, remote_values):
+                if raw is None: continue
+                value = json.loads(raw)
+                found[key] = value
+                self.local.set(key, value)
+                remote_hits += 1
+        self._count("redis_hits", remote_hits)
+        self._count("misses", len(remote_keys) - remote_hits)
+        return found
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: Dict[str, Any]):
+        """로컬에 저장하고, Redis에는 파이프라인으로 한 번에 SET 합니다."""
+        if not items:
+            return
+        for key, value in items.items():
+            self.local.set(key, value)
+        if not self._redis_available():
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.set(key, json.dumps(value, ensure_ascii=False), ex=self.ttl)
+            with stage_timer("redis"):
+                pipeline.execute()
+        except redis.exceptions.RedisError as e:
+            self._on_redis_error(e)
+
+    def set(self, key: str, value: Any):
+        self.set_many({key: value})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            counters = dict(self.counters)
+        lookups = counters["local_hits"] + counters["redis_hits"] + counters["misses"]
+        counters["hit_rate"] = (counters["local_hits"] + counters["redis_hits"]) / lookups if lookups else 0.0
+        counters["local_size"] = len(self.local)
+        counters["redis_connected"] = self._redis_available()
+        return counters
@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 # Branch Point A: 현재 젬의 소모 의지력 범위를 3~9로 가정.
 MIN_COST = 3
@@ -51,6 +51,45 @@ def generate_scenarios(total_willpower: int, num_slots: int) -> List[List[int]]:
     return _generate_recursive(total_willpower, num_slots, MIN_COST)
     # ===================================================================
 
+def find_min_cost_combination(total_willpower: int, num_slots: int, cost_table: Dict[int, float]) -> Optional[Tuple[float, List[int]]]:
+    """
+    num_slots개의 젬으로 total_willpower를 '정확하게' 채우는 최소 비용 조합을 동적 계획법으로 찾습니다.
+    generate_scenarios로 모든 조합을 나열하는 대신, cost_table(의지력 소모량 -> 비용)만으로
+    O(슬롯 수 x 의지력 x 소모량 종류) 시간에 계산하며, 소모량 범위는 cost_table의 키로 정해집니다.
+
+    비용이 같은 조합이 여러 개면 generate_scenarios 순서(사전순)로 가장 앞선 조합을 반환합니다.
+    가능한 조합이 없으면 None을 반환합니다.
+    """
+    costs = {w: c for w, c in cost_table.items() if w > 0 and c is not None and c != float('inf')}
+    if num_slots == 0:
+        return (0, []) if total_willpower == 0 else None
+    if total_willpower <= 0 or not costs:
+        return None
+    values = sorted(costs)
+    inf = float('inf')
+    # min_cost[k][w]: k개의 젬으로 의지력 w를 정확히 채우는 최소 비용
+    min_cost = [[inf] * (total_willpower + 1) for _ in range(num_slots + 1)]
+    min_cost[0][0] = 0
+    for k in range(1, num_slots + 1):
+        for w in range(total_willpower + 1):
+            best = inf
+            for value in values:
+                if value > w: break
+                candidate = costs[value] + min_cost[k - 1][w - value]
+                if candidate < best: best = candidate
+            min_cost[k][w] = best
+    if min_cost[num_slots][total_willpower] == inf:
+        return None
+    # 역추적: 매 단계 최적을 유지하는 가장 작은 소모량을 고르면 오름차순 & 사전순 최소 조합이 됩니다.
+    combination, remaining = [], total_willpower
+    for k in range(num_slots, 0, -1):
+        for value in values:
+            if value <= remaining and costs[value] + min_cost[k - 1][remaining - value] == min_cost[k][remaining]:
+                combination.append(value)
+                remaining -= value
+                break
+    return min_cost[num_slots][total_willpower], combination
+
 # 개발 및 테스트용 코드
 if __name__ == "__main__":
     print("--- 시나리오 생성기 테스트 (의지력 최대 활용 버전) ---")
@@ -74,3 +113,17 @@ if __name__ == "__main__":
 
     print(f"  - 결과 (전체): {scenarios_2}")
 
+    # 테스트 3: DP 결과가 전체 나열 결과와 같은지 확인
+    import random
+    rng = random.Random(0)
+    for _ in range(200):
+        cost_table = {w: rng.choice([None, rng.randint(1, 20) * 1000]) for w in range(MIN_COST, MAX_COST + 1)}
+        willpower, slots = rng.randint(0, 40), rng.randint(0, 4)
+        expected = None
+        for scenario in generate_scenarios(willpower, slots):
+            if any(cost_table[w] is None for w in scenario): continue
+            cost = sum(cost_table[w] for w in scenario)
+            if expected is None or cost < expected[0]: expected = (cost, scenario)
+        assert find_min_cost_combination(willpower, slots, cost_table) == expected, (willpower, slots, cost_table)
+    print("\nDP 최소 비용 조합 == 전체 나열 최소 비용 조합 (200개 무작위 사례)")
+
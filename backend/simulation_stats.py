@@ -0,0 +1,52 @@
+# simulation_stats.py
+import hashlib
+from typing import Dict, Iterable, Optional
+
+import redis
+
+from result_cache import TwoTierCache
+
+# ===================================================================
+# 가격과 무관한 시뮬레이션 통계 저장소
+#
+# 성공률, 평균 가공 비용, 평균 초기화 횟수는 (목표 스펙, 재료 등급, 초기화 여부)에만 의존하고
+# 젬/블루 크리스탈 시세와는 무관합니다. 이 통계를 한 번만 계산해 프로세스 내부와 Redis에
+# 저장해 두면, 시세가 바뀌어도 골드 환산은 단순 산술로 다시 계산할 수 있습니다.
+# ===================================================================
+
+STATS_KEY_PREFIX = "gem_stats:v1"
+STATS_TTL_SECONDS = 7 * 24 * 3600
+STATS_LOCAL_MAX_SIZE = 4096
+
+
+def fingerprint_files(paths: Iterable[str]) -> str:
+    """모델 파일 내용의 해시. 모델이 다시 학습되면 통계 키도 바뀌도록 키에 포함합니다."""
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def make_stats_key(models_version: str, mode: str, simulations: int, target_key: tuple, material_grade_en: str, initialize_allowed: bool) -> str:
+    core_point, efficiency = target_key
+    return f"{STATS_KEY_PREFIX}:{models_version}:{mode}:sims:{simulations}:c{core_point}_e{efficiency}:{material_grade_en}:init:{int(initialize_allowed)}"
+
+
+class SimulationStatsStore:
+    """프로세스 내부 LRU를 1차로, Redis를 영구 저장소로 사용하는 통계 저장소."""
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, ttl: int = STATS_TTL_SECONDS, max_size: int = STATS_LOCAL_MAX_SIZE):
+        self.cache = TwoTierCache(redis_client, max_size=max_size, ttl=ttl, name="lifecycle_stats")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        return self.cache.get_many(keys)
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.cache.get(key)
+
+    def set_many(self, items: Dict[str, Dict]):
+        self.cache.set_many(items)
+
+    def set(self, key: str, stats: Dict):
+        self.cache.set(key, stats)
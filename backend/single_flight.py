@@ -0,0 +1,119 @@
+# single_flight.py
+import hashlib
+import json
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from result_cache import LRUCache
+
+# ===================================================================
+# 동일한 /optimize 요청 합치기 (single-flight)
+#
+# (요청 내용 + 시세 스냅샷)이 같은 요청은 계산 하나(flight)를 공유합니다.
+#  - leader: 처음 들어온 요청. 새 flight를 만들고 작업 대기열에 등록합니다.
+#  - joined: 같은 계산이 진행 중이면 그 flight에 붙어 같은 진행 상황과 결과를 받습니다.
+#  - reused: 같은 계산이 최근에 끝났으면 저장된 완료 상태를 바로 돌려받습니다.
+# flight에 붙은 작업(task_id)이 모두 떠나면 호출자가 계산을 취소할 수 있도록 flight_id를 알려줍니다.
+# ===================================================================
+
+RESULT_REUSE_TTL_SECONDS = 120
+RESULT_REUSE_MAX_SIZE = 256
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def request_fingerprint(request: Dict[str, Any], snapshot_hash: str) -> str:
+    """
+    요청 dict와 시세 스냅샷 해시로 만든 정규화 키.
+    보유 젬 목록은 순서가 결과에 영향을 주지 않으므로 정렬하고, 코어 목록은 순서를 그대로 둡니다.
+    """
+    canonical = dict(request)
+    canonical["held_gems"] = sorted(request.get("held_gems", []), key=lambda gem: json.dumps(gem, sort_keys=True, ensure_ascii=False))
+    payload = json.dumps({"request": canonical, "prices": snapshot_hash}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, result_ttl: int = RESULT_REUSE_TTL_SECONDS, max_results: int = RESULT_REUSE_MAX_SIZE):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Dict[str, Any]] = {}  # flight_id -> {"key", "task_ids", "status"}
+        self._flight_by_key: Dict[str, str] = {}
+        self._flight_by_task: Dict[str, str] = {}
+        self._results = LRUCache(max_size=max_results, ttl=result_ttl)
+        self.counters = {"leaders": 0, "joined": 0, "reused": 0}
+
+    def attach(self, key: str, task_id: str, initial_status: Dict) -> Tuple[str, str, Dict]:
+        """
+        task_id를 key의 계산에 연결하고 (역할, flight_id, 현재 상태)를 반환합니다.
+        역할이 "leader"이면 호출자가 flight_id로 작업을 등록해야 합니다.
+        """
+        with self._lock:
+            completed_status = self._results.get(key)
+            if completed_status is not None:
+                self.counters["reused"] += 1
+                return "reused", "", dict(completed_status)
+            flight_id = self._flight_by_key.get(key)
+            if flight_id is not None:
+                flight = self._flights[flight_id]
+                flight["task_ids"].add(task_id)
+                self._flight_by_task[task_id] = flight_id
+                self.counters["joined"] += 1
+                return "joined", flight_id, dict(flight["status"])
+            flight_id = str(uuid.uuid4())
+            self._flights[flight_id] = {"key": key, "task_ids": {task_id}, "status": dict(initial_status)}
+            self._flight_by_key[key] = flight_id
+            self._flight_by_task[task_id] = flight_id
+            self.counters["leaders"] += 1
+            return "leader", flight_id, dict(initial_status)
+
+    def status(self, flight_id: str) -> Optional[Dict]:
+        with self._lock:
+            flight = self._flights.get(flight_id)
+            return dict(flight["status"]) if flight is not None else None
+
+    def update(self, flight_id: str, status: Dict) -> List[str]:
+        """flight의 상태를 바꾸고 이 상태를 받아야 할 task_id 목록을 반환합니다. 끝난 flight는 정리합니다."""
+        with self._lock:
+            flight = self._flights.get(flight_id)
+            if flight is None:
+                return []
+            flight["status"] = dict(status)
+            task_ids = list(flight["task_ids"])
+            if status["status"] in TERMINAL_STATUSES:
+                self._remove_locked(flight_id)
+                if status["status"] == "completed":
+                    self._results.set(flight["key"], dict(status))
+            return task_ids
+
+    def detach(self, task_id: str) -> Optional[str]:
+        """task_id를 떼어냅니다. 그 결과 진행 중인 flight에 남은 작업이 없으면 flight를 정리하고 flight_id를 반환합니다."""
+        with self._lock:
+            flight_id = self._flight_by_task.pop(task_id, None)
+            flight = self._flights.get(flight_id) if flight_id is not None else None
+            if flight is None:
+                return None
+            flight["task_ids"].discard(task_id)
+            if flight["task_ids"]:
+                return None
+            self._remove_locked(flight_id)
+            return flight_id
+
+    def abandon(self, flight_id: str):
+        """작업 등록에 실패한 flight를 정리합니다."""
+        with self._lock:
+            if flight_id in self._flights:
+                self._remove_locked(flight_id)
+
+    def _remove_locked(self, flight_id: str):
+        flight = self._flights.pop(flight_id)
+        if self._flight_by_key.get(flight["key"]) == flight_id:
+            del self._flight_by_key[flight["key"]]
+        for task_id in flight["task_ids"]:
+            self._flight_by_task.pop(task_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["in_flight"] = len(self._flights)
+            stats["reusable_results"] = len(self._results)
+        return stats
@@ -0,0 +1,47 @@
+# tests/test_numpy_mlp.py
+import glob
+import os
+import sys
+
+import pytest
+
+# 테스트는 backend/ 의 평면 모듈들을 그대로 임포트합니다.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("h5py")
+tf = pytest.importorskip("tensorflow")
+
+from numpy_mlp import NumpyMLP
+
+# ===================================================================
+# NumpyMLP 순전파와 Keras 출력의 동등성 테스트
+#
+# 저장소에 포함된 models/gem_model_c*_e*.h5 각각에 대해, 격자 상태와 범위 밖 실수 상태에서
+# Q-값이 Keras와 같은지 확인합니다. TensorFlow가 없으면 건너뜁니다.
+# ===================================================================
+
+MODEL_PATHS = sorted(glob.glob(os.path.join(BACKEND_DIR, "models", "gem_model_c*_e*.h5")))
+
+
+def _sample_states() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return np.concatenate([
+        rng.integers(low=[1, 1, 1, 1, 0, 0], high=[6, 6, 6, 6, 10, 23], size=(4096, 6)),
+        rng.uniform(low=0, high=20, size=(1024, 6)),
+    ]).astype(np.float32)
+
+
+@pytest.mark.parametrize("model_path", MODEL_PATHS, ids=[os.path.basename(path) for path in MODEL_PATHS])
+def test_numpy_forward_pass_matches_keras(model_path):
+    states = _sample_states()
+    numpy_q = NumpyMLP.from_h5(model_path).predict(states)
+    keras_q = tf.keras.models.load_model(model_path, compile=False)(tf.convert_to_tensor(states), training=False).numpy()
+
+    np.testing.assert_allclose(numpy_q, keras_q, rtol=1e-5, atol=1e-4)
+
+
+def test_bundled_models_present():
+    assert MODEL_PATHS, "No bundled specialist models found under models/."
@@ -0,0 +1,55 @@
+# train_goal.py
+import argparse
+import os
+
+from goal_policy import GOAL_MODEL_FILE, GOAL_TARGETS, save_goal_targets
+from train_specialist import (
+    DEFAULT_NUM_ENVS, DEFAULT_TRAIN_EVERY, DEFAULT_GRADIENT_STEPS, DEFAULT_CHECKPOINT_EVERY,
+    train_goal_conditioned,
+)
+
+# ===================================================================
+# 목표 조건부 DQN 학습 명령
+#
+# 사용 예: python train_goal.py --episodes 100000 --models_dir ./models/
+# 에피소드마다 (core_point, efficiency) 목표를 균등하게 뽑아 네트워크 하나를 모든 목표에 대해 학습합니다.
+# 생성된 gem_model_goal.h5와 학습한 목표 목록(gem_model_goal.json)은 FinalOptimizer(model_backend="goal")에서 사용됩니다.
+# ===================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train one goal-conditioned DQN across all gem targets.")
+    parser.add_argument('--core_points', type=int, nargs='+', default=sorted({cp for cp, _ in GOAL_TARGETS}), help="Target core point levels (1-5)")
+    parser.add_argument('--efficiencies', type=int, nargs='+', default=sorted({eff for _, eff in GOAL_TARGETS}), help="Target efficiency levels (1-5)")
+    parser.add_argument('--episodes', type=int, default=100000, help="Total number of episodes across all targets")
+    parser.add_argument('--num_envs', type=int, default=DEFAULT_NUM_ENVS, help="Number of gems stepped together in the vectorized environment")
+    parser.add_argument('--train_every', type=int, default=DEFAULT_TRAIN_EVERY, help="Run gradient updates every k environment transitions")
+    parser.add_argument('--gradient_steps', type=int, default=DEFAULT_GRADIENT_STEPS, help="Gradient updates per training round")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for the environment, exploration and weight init")
+    parser.add_argument('--models_dir', type=str, default='./models/', help=f"Directory to write {GOAL_MODEL_FILE}")
+    parser.add_argument('--checkpoint_every', type=int, default=DEFAULT_CHECKPOINT_EVERY, help="Checkpoint every N episodes (resumes automatically)")
+    args = parser.parse_args()
+
+    goal_targets = [(cp, eff) for cp in args.core_points for eff in args.efficiencies]
+    print(f"Starting goal-conditioned training over {len(goal_targets)} targets")
+    os.makedirs(args.models_dir, exist_ok=True)
+    checkpoint_dir = os.path.join(args.models_dir, "checkpoints")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint_prefix = os.path.join(checkpoint_dir, "goal")
+
+    agent, summary = train_goal_conditioned(
+        goal_targets, args.episodes, num_envs=args.num_envs, train_every=args.train_every,
+        gradient_steps=args.gradient_steps, seed=args.seed,
+        checkpoint_prefix=checkpoint_prefix, checkpoint_every=args.checkpoint_every,
+    )
+
+    model_path = os.path.join(args.models_dir, GOAL_MODEL_FILE)
+    # 임시 파일 이름은 서버가 읽는 gem_model_goal.h5와 겹치지 않도록 "."으로 시작합니다.
+    tmp_path = os.path.join(args.models_dir, f".tmp_{GOAL_MODEL_FILE}")
+    agent.main_network.save(tmp_path)
+    os.replace(tmp_path, model_path)
+    # 서버는 이 목록에 있는 목표만 이 모델로 서빙합니다.
+    save_goal_targets(args.models_dir, goal_targets)
+    for suffix in (".weights.h5", ".json"):
+        if os.path.exists(checkpoint_prefix + suffix):
+            os.remove(checkpoint_prefix + suffix)
+    print(f"\nTraining complete in {summary['elapsed_seconds']:.1f}s ({summary['episodes_per_sec']:.1f} episodes/sec)! Model saved to '{model_path}'")
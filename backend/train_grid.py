@@ -0,0 +1,184 @@
+# train_grid.py
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from tqdm import tqdm
+
+from train_specialist import (
+    DEFAULT_NUM_ENVS, DEFAULT_TRAIN_EVERY, DEFAULT_GRADIENT_STEPS, DEFAULT_CHECKPOINT_EVERY,
+    specialist_model_filename,
+)
+
+# ===================================================================
+# 전문가 모델 격자 병렬 학습
+#
+# 요청한 (core_point, efficiency) 목표들을 프로세스 풀에서 동시에 학습합니다.
+# 사용 예: python train_grid.py --core_points 1 2 3 4 5 --efficiencies 1 2 3 4 5 --workers 8
+#  - 목표별 시드: --seed와 (cp, eff)로 정해지므로 목표 목록/순서가 바뀌어도 같은 목표는 같은 시드를 받습니다.
+#  - 진행률: 워커가 100 에피소드마다 공유 큐로 보내고, 메인 프로세스가 전체 진행 막대에 모읍니다.
+#  - 체크포인트: {checkpoint_dir}/c{cp}_e{eff}.* 에 주기적으로 저장하며, --resume이면
+#    manifest에 이미 완료된 목표는 건너뛰고 나머지는 체크포인트부터 이어서 학습합니다.
+#  - 결과: 모델 파일과 manifest.json을 models_dir에 임시 파일로 쓴 뒤 os.replace로 교체하므로,
+#    서버가 읽는 도중 반쯤 쓰인 파일을 보지 않습니다.
+# ===================================================================
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def target_seed(base_seed: int, core_point: int, efficiency: int) -> int:
+    return int(np.random.SeedSequence([base_seed, core_point, efficiency]).generate_state(1)[0])
+
+
+def _write_json_atomic(path: str, payload: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_models_manifest(models_dir: str) -> dict:
+    manifest_path = os.path.join(models_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {"version": MANIFEST_VERSION, "models": {}}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise RuntimeError(f"Unsupported models manifest version: {manifest.get('version')}")
+    return manifest
+
+
+def _checkpoint_prefix(checkpoint_dir: str, core_point: int, efficiency: int) -> str:
+    return os.path.join(checkpoint_dir, f"c{core_point}_e{efficiency}")
+
+
+def _remove_checkpoint(checkpoint_prefix: str):
+    for suffix in (".weights.h5", ".json"):
+        if os.path.exists(checkpoint_prefix + suffix):
+            os.remove(checkpoint_prefix + suffix)
+
+
+def _init_grid_worker(threads_per_worker: int):
+    # 워커들이 코어를 나눠 쓰도록 TensorFlow 연산 스레드 수를 제한합니다.
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(threads_per_worker)
+
+
+def _train_target(core_point: int, efficiency: int, seed: int, config: dict, progress_queue) -> dict:
+    from train_specialist import train_specialist
+
+    target = (core_point, efficiency)
+    checkpoint_prefix = _checkpoint_prefix(config["checkpoint_dir"], core_point, efficiency)
+    agent, summary = train_specialist(
+        core_point, efficiency, config["episodes"], num_envs=config["num_envs"],
+        train_every=config["train_every"], gradient_steps=config["gradient_steps"], seed=seed,
+        checkpoint_prefix=checkpoint_prefix, checkpoint_every=config["checkpoint_every"],
+        progress_callback=lambda episode, avg_reward, epsilon: progress_queue.put((target, episode, avg_reward, epsilon)),
+    )
+
+    filename = specialist_model_filename(core_point, efficiency)
+    # 임시 파일 이름은 gem_model_c*_e*.h5 패턴에 걸리지 않도록 "."으로 시작합니다.
+    tmp_path = os.path.join(config["models_dir"], f".tmp_{filename}")
+    agent.main_network.save(tmp_path)
+    os.replace(tmp_path, os.path.join(config["models_dir"], filename))
+    _remove_checkpoint(checkpoint_prefix)
+    return {
+        "core_point": core_point, "efficiency": efficiency, "file": filename, "seed": seed,
+        "episodes": summary["episodes"], "num_envs": config["num_envs"],
+        "train_every": config["train_every"], "gradient_steps": config["gradient_steps"],
+        "last_100_avg_reward": summary["last_100_avg_reward"],
+        "episodes_per_sec": summary["episodes_per_sec"], "trained_at": time.time(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the specialist DQN grid concurrently across a process pool.")
+    parser.add_argument('--core_points', type=int, nargs='+', default=[1, 2, 3, 4, 5], help="Target core point levels (1-5)")
+    parser.add_argument('--efficiencies', type=int, nargs='+', default=[1, 2, 3, 4, 5], help="Target efficiency levels (1-5)")
+    parser.add_argument('--episodes', type=int, default=10000, help="Episodes per target")
+    parser.add_argument('--num_envs', type=int, default=DEFAULT_NUM_ENVS, help="Vectorized environments per target")
+    parser.add_argument('--train_every', type=int, default=DEFAULT_TRAIN_EVERY, help="Run gradient updates every k environment transitions")
+    parser.add_argument('--gradient_steps', type=int, default=DEFAULT_GRADIENT_STEPS, help="Gradient updates per training round")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of targets trained at the same time")
+    parser.add_argument('--threads_per_worker', type=int, default=1, help="TensorFlow op threads per worker process")
+    parser.add_argument('--seed', type=int, default=0, help="Base seed; each target derives its own seed from it")
+    parser.add_argument('--models_dir', type=str, default='./models/', help="Directory to write gem_model_c*_e*.h5 files and manifest")
+    parser.add_argument('--checkpoint_dir', type=str, default=None, help="Checkpoint directory (default: <models_dir>/checkpoints)")
+    parser.add_argument('--checkpoint_every', type=int, default=DEFAULT_CHECKPOINT_EVERY, help="Checkpoint every N episodes per target")
+    parser.add_argument('--resume', action='store_true', help="Skip targets completed in the manifest and continue the rest from checkpoints")
+    args = parser.parse_args()
+
+    checkpoint_dir = args.checkpoint_dir or os.path.join(args.models_dir, "checkpoints")
+    os.makedirs(args.models_dir, exist_ok=True)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    manifest = load_models_manifest(args.models_dir)
+
+    targets = [(cp, eff) for cp in args.core_points for eff in args.efficiencies]
+    pending = []
+    for cp, eff in targets:
+        entry = manifest["models"].get(f"c{cp}_e{eff}")
+        done = (entry is not None and entry["episodes"] >= args.episodes
+                and os.path.exists(os.path.join(args.models_dir, entry["file"])))
+        if args.resume and done:
+            print(f"Skipping target (core: {cp}, efficiency: {eff}): already trained for {entry['episodes']} episodes")
+            continue
+        if not args.resume:
+            _remove_checkpoint(_checkpoint_prefix(checkpoint_dir, cp, eff))
+        pending.append((cp, eff))
+    if not pending:
+        raise SystemExit("All requested targets are already trained.")
+
+    config = {
+        "episodes": args.episodes, "num_envs": args.num_envs, "train_every": args.train_every,
+        "gradient_steps": args.gradient_steps, "models_dir": args.models_dir,
+        "checkpoint_dir": checkpoint_dir, "checkpoint_every": args.checkpoint_every,
+    }
+    workers = max(1, min(args.workers, len(pending)))
+    print(f"Training {len(pending)} targets on {workers} worker processes")
+
+    mp_context = multiprocessing.get_context("spawn")
+    start_time = time.perf_counter()
+    with mp_context.Manager() as manager, ProcessPoolExecutor(
+        max_workers=workers, mp_context=mp_context,
+        initializer=_init_grid_worker, initargs=(args.threads_per_worker,),
+    ) as executor:
+        progress_queue = manager.Queue()
+        futures = {
+            executor.submit(_train_target, cp, eff, target_seed(args.seed, cp, eff), config, progress_queue): (cp, eff)
+            for cp, eff in pending
+        }
+        episodes_seen = {target: 0 for target in pending}
+        with tqdm(total=args.episodes * len(pending), desc="Training grid") as progress:
+            not_done = set(futures)
+            while not_done:
+                finished, not_done = wait(not_done, timeout=1.0, return_when=FIRST_COMPLETED)
+                while True:
+                    try:
+                        target, episode, avg_reward, epsilon = progress_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    # 재개한 목표는 첫 보고에서 체크포인트까지의 에피소드가 한꺼번에 더해집니다.
+                    progress.update(episode - episodes_seen[target])
+                    episodes_seen[target] = episode
+                    progress.set_postfix_str(f"C{target[0]}/E{target[1]} ep {episode} avg {avg_reward:.2f} eps {epsilon:.3f}")
+                for future in finished:
+                    cp, eff = futures[future]
+                    entry = future.result()
+                    progress.update(entry["episodes"] - episodes_seen[(cp, eff)])
+                    episodes_seen[(cp, eff)] = entry["episodes"]
+                    manifest["models"][f"c{cp}_e{eff}"] = entry
+                    _write_json_atomic(os.path.join(args.models_dir, MANIFEST_FILE), manifest)
+                    avg_reward = entry['last_100_avg_reward']
+                    tqdm.write(f"Finished target (core: {cp}, efficiency: {eff}) -> {entry['file']} | "
+                               f"Last 100 Avg Reward: {'-' if avg_reward is None else f'{avg_reward:.2f}'} | "
+                               f"Episodes/sec: {entry['episodes_per_sec']:.1f}")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\nGrid training complete in {elapsed:.1f}s: {len(pending)} models written to '{args.models_dir}'")
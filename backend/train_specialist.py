@@ -1,10 +1,13 @@
 import tensorflow as tf
 import numpy as np
-import collections
 from tqdm import tqdm
 import argparse
+import collections
+import json
+import os
+import time
 
-from gem_env import GemCraftingEnv
+from gem_env import GemCraftingVectorEnv
 from dqn_model import create_dqn_model
 
 # ===================================================================
@@ -18,6 +21,11 @@ DEFAULT_LEARNING_RATE = 0.001
 DEFAULT_BUFFER_LIMIT = 50000
 DEFAULT_BATCH_SIZE = 64
 
+# 업데이트 주기: 환경 전이(transition) k개가 쌓일 때마다 그래디언트 업데이트를 g번 합니다.
+# 기본값 1/1은 기존 단일 환경 학습과 같이 전이 하나마다 한 번입니다. (벡터 스텝 하나는 num_envs개의 전이)
+DEFAULT_TRAIN_EVERY = 1
+DEFAULT_GRADIENT_STEPS = 1
+
 # 엡실론-그리디 정책 설정
 DEFAULT_EPSILON_START = 1.0
 DEFAULT_EPSILON_END = 0.01
@@ -25,19 +33,74 @@ DEFAULT_EPSILON_DECAY = 0.999
 
 # 학습 제어
 DEFAULT_TARGET_UPDATE_FREQ = 10
+# 동시에 진행하는 환경 수 (GemCraftingVectorEnv). 스텝마다 N개의 행동을 한 번의 순전파로 고릅니다.
+DEFAULT_NUM_ENVS = 8
+# ===================================================================
+
+# ===================================================================
+# 경험 리플레이 버퍼 (링 버퍼)
+#
+# 미리 할당한 연속 NumPy 배열 5개에 전이를 순환하며 덮어씁니다.
+# 샘플링은 인덱스 배열 한 번으로 모으므로 버퍼 크기와 무관하게 O(batch_size)이고,
+# 반환하는 배열은 이미 _train_step_graph가 받는 dtype(float32/int32)이라 텐서 변환 시 추가 변환이 없습니다.
+# 중복 허용(with replacement) 균등 샘플링입니다.
 # ===================================================================
 
+class ReplayBuffer:
+    def __init__(self, capacity, state_shape, rng=None):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, *state_shape), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, *state_shape), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        count = len(actions)
+        if count > self.capacity:
+            states, actions, rewards, next_states, dones = (
+                x[-self.capacity:] for x in (states, actions, rewards, next_states, dones))
+            count = self.capacity
+        rows = (self._next + np.arange(count)) % self.capacity
+        self.states[rows] = states
+        self.actions[rows] = actions
+        self.rewards[rows] = rewards
+        self.next_states[rows] = next_states
+        self.dones[rows] = dones
+        self._next = (self._next + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+
+    def add(self, state, action, reward, next_state, done):
+        self.add_batch(np.asarray(state)[np.newaxis], np.asarray([action]), np.asarray([reward]),
+                       np.asarray(next_state)[np.newaxis], np.asarray([done]))
+
+    def sample(self, batch_size):
+        indices = self.rng.integers(0, self._size, size=batch_size)
+        return (self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices])
+
+
 class DQNAgent:
     # ===================================================================
     # *** __init__에서 하이퍼파라미터를 인자로 받음 ***
     # ===================================================================
-    def __init__(self, state_shape, num_actions, buffer_limit, batch_size, gamma, learning_rate):
+    def __init__(self, state_shape, num_actions, buffer_limit, batch_size, gamma, learning_rate,
+                 train_every=DEFAULT_TRAIN_EVERY, gradient_steps=DEFAULT_GRADIENT_STEPS, seed=None):
         self.state_shape = state_shape
         self.num_actions = num_actions
         self.batch_size = batch_size
         self.gamma = gamma
+        self.train_every = train_every
+        self.gradient_steps = gradient_steps
+        self._transitions_since_update = 0
 
-        self.replay_buffer = collections.deque(maxlen=buffer_limit)
+        self.replay_buffer = ReplayBuffer(buffer_limit, state_shape, rng=np.random.default_rng(seed))
         
         self.main_network = create_dqn_model(state_shape, num_actions)
         self.target_network = create_dqn_model(state_shape, num_actions)
@@ -57,15 +120,30 @@ class DQNAgent:
             q_values = self.main_network(tf.expand_dims(state_tensor, axis=0))
             return tf.argmax(q_values[0]).numpy()
 
+    @tf.function
+    def _greedy_actions_graph(self, states):
+        return tf.argmax(self.main_network(states, training=False), axis=1, output_type=tf.int32)
+
+    def get_actions(self, states, epsilon):
+        """(N, 6) 상태 전체의 행동을 한 번의 순전파로 고릅니다. 엡실론-그리디 탐색은 환경마다 따로 정합니다."""
+        explore = np.random.rand(len(states)) < epsilon
+        actions = np.random.randint(self.num_actions, size=len(states))
+        if not explore.all():
+            greedy = self._greedy_actions_graph(tf.convert_to_tensor(states, dtype=tf.float32)).numpy()
+            actions = np.where(explore, actions, greedy)
+        return actions
+
     def store_experience(self, state, action, reward, next_state, done):
-        self.replay_buffer.append((state, action, reward, next_state, done))
+        self.replay_buffer.add(state, action, reward, next_state, done)
+
+    def store_experiences(self, states, actions, rewards, next_states, dones):
+        self.replay_buffer.add_batch(states, actions, rewards, next_states, dones)
 
     @tf.function
     def _train_step_graph(self, states, actions, rewards, next_states, dones):
         next_q_values = self.target_network(next_states, training=False)
         max_next_q = tf.reduce_max(next_q_values, axis=1)
-        dones_float = tf.cast(dones, tf.float32)
-        target_q_values = rewards + (1.0 - dones_float) * self.gamma * max_next_q
+        target_q_values = rewards + (1.0 - dones) * self.gamma * max_next_q
 
         with tf.GradientTape() as tape:
             current_q_values = self.main_network(states, training=True)
@@ -79,71 +157,180 @@ class DQNAgent:
     def train_step(self):
         if len(self.replay_buffer) < self.batch_size:
             return
-        minibatch_indices = np.random.choice(len(self.replay_buffer), self.batch_size, replace=False)
-        minibatch = [self.replay_buffer[i] for i in minibatch_indices]
-        states, actions, rewards, next_states, dones = map(lambda x: tf.convert_to_tensor(np.array(x), dtype=tf.float32), zip(*minibatch))
-        actions = tf.cast(actions, tf.int32)
-        self._train_step_graph(states, actions, rewards, next_states, dones)
+        # 버퍼 배열이 이미 float32/int32이므로 dtype 변환 없이 그대로 그래프에 넘깁니다.
+        self._train_step_graph(*(tf.convert_to_tensor(x) for x in self.replay_buffer.sample(self.batch_size)))
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Train a specialist DQN agent for a specific gem target.")
-    parser.add_argument('--core_point', type=int, required=True, help="Target core point level (1-5)")
-    parser.add_argument('--efficiency', type=int, required=True, help="Target efficiency level (1-5)")
-    parser.add_argument('--episodes', type=int, default=10000, help="Total number of episodes to train")
-    args = parser.parse_args()
+    def maybe_train(self, num_transitions=1):
+        """전이 num_transitions개를 저장한 뒤 호출합니다. 전이 train_every개마다 gradient_steps번 업데이트합니다."""
+        self._transitions_since_update += num_transitions
+        rounds, self._transitions_since_update = divmod(self._transitions_since_update, self.train_every)
+        for _ in range(rounds * self.gradient_steps):
+            self.train_step()
 
-    print(f"Starting training for target (core: {args.core_point}, efficiency: {args.efficiency})")
-    
-    GEM_GRADE = 'heroic'
-    TARGETS = {'core': args.core_point, 'efficiency': args.efficiency}
-    MODEL_SAVE_PATH = f'gem_model_c{args.core_point}_e{args.efficiency}.h5'
+# ===================================================================
+# 학습 루프
+#
+# train_specialist.py CLI와 train_grid.py의 워커 프로세스(목표 하나),
+# train_goal.py(목표 조건부 모델 하나로 전체 목표)가 함께 사용합니다.
+# checkpoint_prefix가 주어지면 checkpoint_every 에피소드마다 가중치({prefix}.weights.h5)와
+# 진행 상태({prefix}.json: 끝난 에피소드 수, 엡실론)를 임시 파일에 쓴 뒤 os.replace로 교체하고,
+# 다음 실행에서 같은 prefix가 있으면 그 지점부터 이어서 학습합니다.
+# 리플레이 버퍼와 난수 상태는 저장하지 않으므로, 재개 후에는 버퍼를 다시 채우며 시작합니다.
+# ===================================================================
+
+GEM_GRADE = 'heroic'
+DEFAULT_CHECKPOINT_EVERY = 1000
+
+
+def specialist_model_filename(core_point, efficiency):
+    return f'gem_model_c{core_point}_e{efficiency}.h5'
+
+
+def _save_checkpoint(agent, checkpoint_prefix, episodes_done, epsilon, seed):
+    tmp_weights = f"{checkpoint_prefix}.tmp.weights.h5"
+    agent.main_network.save_weights(tmp_weights)
+    os.replace(tmp_weights, f"{checkpoint_prefix}.weights.h5")
+    tmp_state = f"{checkpoint_prefix}.tmp.json"
+    with open(tmp_state, "w", encoding="utf-8") as f:
+        json.dump({"episodes_done": episodes_done, "epsilon": epsilon, "seed": seed}, f)
+    os.replace(tmp_state, f"{checkpoint_prefix}.json")
+
+
+def _load_checkpoint(agent, checkpoint_prefix):
+    """체크포인트가 있으면 가중치를 복원하고 (끝난 에피소드 수, 엡실론)을 반환합니다."""
+    state_path = f"{checkpoint_prefix}.json"
+    weights_path = f"{checkpoint_prefix}.weights.h5"
+    if not (os.path.exists(state_path) and os.path.exists(weights_path)):
+        return 0, DEFAULT_EPSILON_START
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    agent.main_network.load_weights(weights_path)
+    agent.update_target_network()
+    return state["episodes_done"], state["epsilon"]
+
+
+def train_specialist(core_point, efficiency, episodes, num_envs=DEFAULT_NUM_ENVS, **kwargs):
+    """(core_point, efficiency) 목표의 전문가 DQN을 학습해 에이전트와 학습 요약을 반환합니다."""
+    env = GemCraftingVectorEnv(num_envs=num_envs, gem_grade=GEM_GRADE, targets={'core': core_point, 'efficiency': efficiency})
+    return train_agent(env, episodes, f"C{core_point}/E{efficiency}", **kwargs)
+
+
+def train_goal_conditioned(goal_targets, episodes, num_envs=DEFAULT_NUM_ENVS, **kwargs):
+    """goal_targets [(core_point, efficiency), ...] 전체를 목표 조건부 DQN 하나로 학습합니다."""
+    targets = [{'core': core_point, 'efficiency': efficiency} for core_point, efficiency in goal_targets]
+    env = GemCraftingVectorEnv(num_envs=num_envs, gem_grade=GEM_GRADE, targets=targets, goal_conditioned=True)
+    return train_agent(env, episodes, "goal-conditioned", **kwargs)
+
+
+def train_agent(env, episodes, label, train_every=DEFAULT_TRAIN_EVERY, gradient_steps=DEFAULT_GRADIENT_STEPS, seed=None,
+                checkpoint_prefix=None, checkpoint_every=DEFAULT_CHECKPOINT_EVERY, progress_callback=None):
+    """
+    벡터화 환경 env에서 DQN을 episodes 에피소드만큼 학습합니다.
+
+    progress_callback이 주어지면 tqdm/print 대신 100 에피소드마다
+    progress_callback(끝난 에피소드 수, 최근 100개 평균 보상, 엡실론)을 호출합니다.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+        tf.random.set_seed(seed)
+    num_envs = env.num_envs
 
-    env = GemCraftingEnv(gem_grade=GEM_GRADE, targets=TARGETS)
-    
     # ===================================================================
     # ***  에이전트 생성 시 하이퍼파라미터 전달 ***
     # ===================================================================
     agent = DQNAgent(
-        state_shape=env.observation_space.shape,
-        num_actions=env.action_space.n,
+        state_shape=env.single_observation_space.shape,
+        num_actions=env.single_action_space.n,
         buffer_limit=DEFAULT_BUFFER_LIMIT,
         batch_size=DEFAULT_BATCH_SIZE,
         gamma=DEFAULT_GAMMA,
-        learning_rate=DEFAULT_LEARNING_RATE
+        learning_rate=DEFAULT_LEARNING_RATE,
+        train_every=train_every,
+        gradient_steps=gradient_steps,
+        seed=seed
     )
     # ===================================================================
-    
-    epsilon = DEFAULT_EPSILON_START
-    all_rewards = []
-
-    for episode in tqdm(range(args.episodes), desc=f"Training C{args.core_point}/E{args.efficiency}"):
-        state, _ = env.reset()
-        episode_reward = 0
-        done = False
-        
-        while not done:
-            action = agent.get_action(state, epsilon)
-            next_state, reward, terminated, truncated, _ = env.step(action)
-            done = terminated or truncated
-            agent.store_experience(state, action, reward, next_state, done)
-            agent.train_step()
-            state = next_state
-            episode_reward += reward
-        
-        all_rewards.append(episode_reward)
-        epsilon = max(DEFAULT_EPSILON_END, epsilon * DEFAULT_EPSILON_DECAY)
-        
-        if (episode + 1) % DEFAULT_TARGET_UPDATE_FREQ == 0:
-            agent.update_target_network()
 
-        if (episode + 1) % 100 == 0:
-            last_100_avg_reward = np.mean(all_rewards[-100:])
-            print(f"\nEpisode {episode + 1}/{args.episodes} | "
-                  f"Last 100 Avg Reward: {last_100_avg_reward:.2f} | "
-                  f"Epsilon: {epsilon:.4f}")
+    episode, epsilon = (0, DEFAULT_EPSILON_START)
+    if checkpoint_prefix is not None:
+        episode, epsilon = _load_checkpoint(agent, checkpoint_prefix)
+        if episode > 0 and progress_callback is None:
+            print(f"Resuming {label} training from episode {episode}")
+    resumed_from = episode
+    recent_rewards = collections.deque(maxlen=100)
+    episode_rewards = np.zeros(num_envs)
+    states, _ = env.reset(seed=seed)
+    start_time = time.perf_counter()
 
-    agent.main_network.save(MODEL_SAVE_PATH)
-    print(f"\nTraining complete! Model saved to '{MODEL_SAVE_PATH}'")
-    
+    # 에피소드 단위 스케줄(엡실론 감소, 타깃 네트워크 갱신, 로그)은 끝난 에피소드 수를 기준으로 그대로 유지합니다.
+    # 그래디언트 업데이트는 전이 train_every개마다 gradient_steps번이므로, 기본값에서는 벡터 스텝마다 num_envs번입니다.
+    with tqdm(total=episodes, initial=episode, desc=f"Training {label}", disable=progress_callback is not None) as progress:
+        while episode < episodes:
+            actions = agent.get_actions(states, epsilon)
+            next_states, rewards, terminations, truncations, infos = env.step(actions)
+            dones = terminations | truncations
+            # 끝난 환경은 이미 새 젬으로 리셋되었으므로, 전이의 다음 상태는 final_obs를 씁니다.
+            transition_next_states = np.where(dones[:, np.newaxis], infos["final_obs"], next_states) if dones.any() else next_states
+            agent.store_experiences(states, actions, rewards, transition_next_states, dones)
+            agent.maybe_train(num_envs)
+            states = next_states
+            episode_rewards += rewards
+
+            for i in np.flatnonzero(dones):
+                recent_rewards.append(episode_rewards[i])
+                episode_rewards[i] = 0
+                episode += 1
+                progress.update(1)
+                epsilon = max(DEFAULT_EPSILON_END, epsilon * DEFAULT_EPSILON_DECAY)
+
+                if episode % DEFAULT_TARGET_UPDATE_FREQ == 0:
+                    agent.update_target_network()
+
+                if episode % 100 == 0:
+                    last_100_avg_reward = np.mean(recent_rewards)
+                    if progress_callback is not None:
+                        progress_callback(episode, float(last_100_avg_reward), epsilon)
+                    else:
+                        print(f"\nEpisode {episode}/{episodes} | "
+                              f"Last 100 Avg Reward: {last_100_avg_reward:.2f} | "
+                              f"Epsilon: {epsilon:.4f} | "
+                              f"Episodes/sec: {(episode - resumed_from) / (time.perf_counter() - start_time):.1f}")
+                if checkpoint_prefix is not None and episode % checkpoint_every == 0:
+                    _save_checkpoint(agent, checkpoint_prefix, episode, epsilon, seed)
+                if episode >= episodes:
+                    break
 
     env.close()
+    elapsed = time.perf_counter() - start_time
+    summary = {
+        "episodes": episode,
+        "resumed_from": resumed_from,
+        "elapsed_seconds": elapsed,
+        "episodes_per_sec": (episode - resumed_from) / elapsed if elapsed > 0 else 0.0,
+        "last_100_avg_reward": float(np.mean(recent_rewards)) if recent_rewards else None,
+        "epsilon": epsilon,
+    }
+    return agent, summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train a specialist DQN agent for a specific gem target.")
+    parser.add_argument('--core_point', type=int, required=True, help="Target core point level (1-5)")
+    parser.add_argument('--efficiency', type=int, required=True, help="Target efficiency level (1-5)")
+    parser.add_argument('--episodes', type=int, default=10000, help="Total number of episodes to train")
+    parser.add_argument('--num_envs', type=int, default=DEFAULT_NUM_ENVS, help="Number of gems stepped together in the vectorized environment")
+    parser.add_argument('--train_every', type=int, default=DEFAULT_TRAIN_EVERY, help="Run gradient updates every k environment transitions")
+    parser.add_argument('--gradient_steps', type=int, default=DEFAULT_GRADIENT_STEPS, help="Gradient updates per training round")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for the environment, exploration and weight init")
+    args = parser.parse_args()
+
+    print(f"Starting training for target (core: {args.core_point}, efficiency: {args.efficiency})")
+    MODEL_SAVE_PATH = specialist_model_filename(args.core_point, args.efficiency)
+
+    agent, summary = train_specialist(
+        args.core_point, args.efficiency, args.episodes, num_envs=args.num_envs,
+        train_every=args.train_every, gradient_steps=args.gradient_steps, seed=args.seed,
+    )
+
+    agent.main_network.save(MODEL_SAVE_PATH)
+    print(f"\nTraining complete in {summary['elapsed_seconds']:.1f}s ({summary['episodes_per_sec']:.1f} episodes/sec)! Model saved to '{MODEL_SAVE_PATH}'")
@@ -1,11 +1,17 @@
 # validator.py 
-from typing import List, Dict, Tuple, Any
-import copy
+from typing import List, Dict, Tuple, Any, Optional, Callable
+import math
+import time
 import numpy as np
 
 CORE_INFO = {"유물": 15, "고대": 17}
 GEM_INFO = { "안정": 8, "견고": 9, "불변": 10, "침식": 8, "왜곡": 9, "붕괴": 10 }
 MIN_GEM_WILLPOWER_COST = 3
+INFEASIBLE_REASON = "보유한 젬들을 모든 코어에 활성화 가능하도록 배치하는 조합을 찾을 수 없습니다."
+BUDGET_EXHAUSTED_REASON = "제한 시간 안에 보유한 젬들을 활성화 가능하도록 배치하는 조합을 찾지 못했습니다."
+BUDGET_CHECK_INTERVAL = 256
+PROGRESS_REPORT_INTERVAL = 4096
+
 def _calculate_gem_cost(gem: Dict) -> int:
     for gem_type in GEM_INFO:
         if gem_type in gem['name']:
@@ -13,17 +19,85 @@ def _calculate_gem_cost(gem: Dict) -> int:
             return base_cost - gem['efficiency']
     return float('inf')
 
+def _min_sum_of_squares(upper_bounds: List[int], total: float) -> float:
+    """
+    각 값이 upper_bounds 이하이고 합이 total일 때 가능한 제곱합의 최솟값 (연속 완화, 물 채우기).
+    작은 상한부터 상한값으로 고정하고, 나머지는 같은 수위로 채웁니다.
+    """
+    bounds = sorted(upper_bounds)
+    fixed, remaining = 0.0, float(total)
+    for k, upper in enumerate(bounds):
+        level = remaining / (len(bounds) - k)
+        if level <= upper:
+            return fixed + (len(bounds) - k) * level * level
+        fixed += upper * upper
+        remaining -= upper
+    return fixed
+
+class _SearchBudgetExceeded(Exception):
+    pass
+
 # ===================================================================
-# *** 핵심 로직: 고도화된 백트래킹 알고리즘 ***
+# *** 핵심 로직: 분기 한정(Branch-and-Bound) 탐색 ***
+#
+# 모든 젬을 배치하면 남는 의지력 총합은 배치 방법과 무관하게 일정하므로,
+# 실질적인 목표는 "활성화 가능한 배치 중 코어별 남은 의지력의 분산 최소화"이고,
+# 코어 수와 총합이 고정이므로 분산 비교는 정수 제곱합 비교와 같습니다.
+#  0단계: 남은 의지력 여유가 가장 큰 코어에 젬을 놓는 탐욕 배치로 첫 해(incumbent)를 만듭니다.
+#  1단계: (젬 인덱스, 정렬된 코어 상태 튜플)로 메모이제이션하며 최소 제곱합을 구합니다.
+#         타입별 남은 의지력 상한이 활성화 최소 요구량(3 x 슬롯)에 못 미치거나,
+#         제곱합 하한(물 채우기)이 현재 최적 이상이면 가지를 잘라냅니다.
+#  2단계: 기존과 같은 순서로 최소 제곱합을 가진 배치만 다시 훑어, 기존 구현과 똑같이
+#         np.var 값이 가장 작은 첫 배치를 고릅니다 (동률일 때의 선택까지 동일).
+# 해는 깊은 복사 대신 젬별 코어 인덱스 튜플로만 저장합니다.
+#
+# 시간/노드 예산이 주어지면 예산이 끝나는 순간까지 찾은 최선의 해를 반환하고,
+# 최적성이 증명되었는지 여부(optimal)를 함께 알려줍니다 (anytime 탐색).
 # ===================================================================
 
-def check_feasibility(cores_input: Dict[str, List[str]], held_gems: List[Dict]) -> Tuple[bool, Any]:
+def check_feasibility_anytime(
+    cores_input: Dict[str, List[str]], held_gems: List[Dict],
+    time_budget: Optional[float] = None, node_budget: Optional[int] = None,
+    progress_callback: Optional[Callable[[Dict], None]] = None,
+) -> Tuple[bool, Any, Dict]:
+    """
+    예산 제한이 있는 배치 탐색.
+
+    Args:
+        time_budget (float | None): 탐색에 쓸 최대 시간(초). None이면 제한 없음.
+        node_budget (int | None): 탐색할 최대 노드 수. None이면 제한 없음.
+        progress_callback (Callable | None): 탐색 도중 주기적으로 search_info와 같은 형태의 dict로 호출됩니다.
+
+    Returns:
+        Tuple[bool, Any, Dict]: (실현 가능 여부, remaining_info 또는 실패 사유, search_info)
+            search_info = {"optimal": 최적성 증명 여부, "nodes": 탐색 노드 수, "elapsed": 경과 시간(초),
+                           "phase": 마지막 탐색 단계, "found": 해 발견 여부}
+    """
+    started_at = time.monotonic()
+    search = {"nodes": 0, "phase": "greedy", "found": False}
+
+    def search_info(optimal: bool) -> Dict:
+        return {"optimal": optimal, "nodes": search["nodes"], "elapsed": time.monotonic() - started_at,
+                "phase": search["phase"], "found": search["found"]}
+
+    def tick():
+        # 노드 예산은 매 노드 확인하고, 시계 조회와 진행 보고만 BUDGET_CHECK_INTERVAL 노드마다 합니다.
+        if node_budget is not None and search["nodes"] >= node_budget:
+            raise _SearchBudgetExceeded()
+        search["nodes"] += 1
+        if search["nodes"] % BUDGET_CHECK_INTERVAL:
+            return
+        if progress_callback is not None and search["nodes"] % PROGRESS_REPORT_INTERVAL == 0:
+            progress_callback(search_info(False))
+        if time_budget is not None and time.monotonic() - started_at >= time_budget:
+            raise _SearchBudgetExceeded()
+
     core_list = []
     for core_type, grades in cores_input.items():
         for grade in grades:
             core_list.append({
                 "grade": grade, "type": core_type,
-                "willpower": CORE_INFO[grade], "slots": 4, "held_gems": []
+                "willpower": CORE_INFO[grade], "slots": 4
             })
     
     gems_with_cost = sorted(
@@ -31,66 +105,87 @@ def check_feasibility(cores_input: Dict[str, List[str]], held_gems: List[Dict])
         key=lambda g: g['cost'], reverse=True
     )
 
-    best_solution = {"state": None, "remaining_willpower": -1, "willpower_variance": float('inf')}
-
-    def backtrack(gem_index: int, current_cores: List[Dict]):
-        if gem_index == len(gems_with_cost):
-            total_remaining_willpower = sum(c['willpower'] for c in current_cores)
-            
-            willpower_values = [c['willpower'] for c in current_cores]
-            current_variance = np.var(willpower_values)
-
-            is_better_solution = False
-            if total_remaining_willpower > best_solution["remaining_willpower"]:
-                is_better_solution = True
-            elif total_remaining_willpower == best_solution["remaining_willpower"] and current_variance < best_solution["willpower_variance"]:
-                is_better_solution = True
-
-            if is_better_solution:
-                is_viable = True
-                for core in current_cores:
-                    if core['willpower'] < core['slots'] * MIN_GEM_WILLPOWER_COST:
-                        is_viable = False
-                        break
-                
-                if is_viable:
-                    best_solution["state"] = copy.deepcopy(current_cores)
-                    best_solution["remaining_willpower"] = total_remaining_willpower
-                    best_solution["willpower_variance"] = current_variance
-            return
+    num_cores, num_gems = len(core_list), len(gems_with_cost)
+    core_types = list(dict.fromkeys(core['type'] for core in core_list))
+    gem_core_types = [[t for t in core_types if t in gem['name']] for gem in gems_with_cost]
+    if any(not matching or math.isinf(gem['cost']) for gem, matching in zip(gems_with_cost, gem_core_types)):
+        return False, {"reason": INFEASIBLE_REASON}, search_info(True)
 
+    # 한정 계산용 그룹: 젬마다 들어갈 수 있는 코어 타입이 하나뿐이면 타입별로, 아니면 전체를 한 그룹으로 봅니다.
+    if all(len(matching) == 1 for matching in gem_core_types):
+        core_group = [core_types.index(core['type']) for core in core_list]
+        gem_group = [core_types.index(matching[0]) for matching in gem_core_types]
+        num_groups = len(core_types)
+    else:
+        core_group, gem_group, num_groups = [0] * num_cores, [0] * num_gems, 1
+    group_cores = [[i for i in range(num_cores) if core_group[i] == g] for g in range(num_groups)]
+
+    # suffix_*[g][i]: i번째 이후 젬들 중 그룹 g에 속한 젬의 비용 합 / 개수 / 최소 비용
+    suffix_cost = [[0] * (num_gems + 1) for _ in range(num_groups)]
+    suffix_count = [[0] * (num_gems + 1) for _ in range(num_groups)]
+    suffix_min_cost = [[math.inf] * (num_gems + 1) for _ in range(num_groups)]
+    for i in range(num_gems - 1, -1, -1):
+        cost = gems_with_cost[i]['cost']
+        for g in range(num_groups):
+            own = gem_group[i] == g
+            suffix_cost[g][i] = suffix_cost[g][i + 1] + (cost if own else 0)
+            suffix_count[g][i] = suffix_count[g][i + 1] + own
+            suffix_min_cost[g][i] = min(suffix_min_cost[g][i + 1], cost) if own else suffix_min_cost[g][i + 1]
+
+    willpowers = [core['willpower'] for core in core_list]
+    slots = [core['slots'] for core in core_list]
+    assignment = [0] * num_gems
+
+    def sum_of_squares_lower_bound(gem_index: int) -> Optional[float]:
+        """남은 젬을 모두 배치했을 때 제곱합의 하한. 활성화 가능한 배치가 불가능하면 None."""
+        lower_bound = 0.0
+        for g, members in enumerate(group_cores):
+            group_willpower = sum(willpowers[i] for i in members)
+            group_slots = sum(slots[i] for i in members)
+            if suffix_count[g][gem_index] > group_slots:
+                return None
+            # 남은 의지력 상한 vs 활성화에 필요한 최소 의지력 (젬마다 의지력 cost, 필요량 3씩 감소)
+            final_willpower = group_willpower - suffix_cost[g][gem_index]
+            final_slots = group_slots - suffix_count[g][gem_index]
+            if final_willpower < MIN_GEM_WILLPOWER_COST * final_slots:
+                return None
+            if suffix_min_cost[g][gem_index] >= MIN_GEM_WILLPOWER_COST and any(willpowers[i] < MIN_GEM_WILLPOWER_COST * slots[i] for i in members):
+                return None
+            lower_bound += _min_sum_of_squares([willpowers[i] for i in members], final_willpower)
+        return lower_bound
+
+    def placeable_cores(gem_index: int) -> List[int]:
+        """기존 백트래킹과 같은 순서와 중복 제거 규칙으로 젬을 놓을 수 있는 코어 인덱스를 반환합니다."""
         gem_to_place = gems_with_cost[gem_index]
-        
         last_tried_core_signature = None
-
-        for i in range(len(current_cores)):
-            core = current_cores[i]
-            
-            core_signature = (core['grade'], core['type'], core['willpower'], core['slots'])
+        candidates = []
+        for i in range(num_cores):
+            core = core_list[i]
+            core_signature = (core['grade'], core['type'], willpowers[i], slots[i])
             if core_signature == last_tried_core_signature:
                 continue
-
             #  젬 이름에 코어 타입이 포함되어 있는지 직접 확인
-            if core['type'] in gem_to_place['name'] and core['slots'] > 0 and core['willpower'] >= gem_to_place['cost']:
+            if core['type'] in gem_to_place['name'] and slots[i] > 0 and willpowers[i] >= gem_to_place['cost']:
                 last_tried_core_signature = core_signature
-                
-                core['slots'] -= 1
-                core['willpower'] -= gem_to_place['cost']
-                core['held_gems'].append(gem_to_place)
-                
-                backtrack(gem_index + 1, current_cores)
-                
-                core['held_gems'].pop()
-                core['willpower'] += gem_to_place['cost']
-                core['slots'] += 1
-
-    backtrack(0, core_list)
-
-    if best_solution["state"] is None:
-        return False, {"reason": "보유한 젬들을 모든 코어에 활성화 가능하도록 배치하는 조합을 찾을 수 없습니다."}
-    else:
-        sorted_state = sorted(best_solution["state"], key=lambda c: (c['grade'], c['type']), reverse=True)
-        remaining_info = [
+                candidates.append(i)
+        return candidates
+
+    def place(gem_index: int, i: int, direction: int):
+        willpowers[i] -= direction * gems_with_cost[gem_index]['cost']
+        slots[i] -= direction
+        if direction > 0:
+            assignment[gem_index] = i
+
+    def is_viable() -> bool:
+        return all(willpowers[i] >= slots[i] * MIN_GEM_WILLPOWER_COST for i in range(num_cores))
+
+    def build_remaining_info(best_assignment: Tuple[int, ...]) -> List[Dict]:
+        best_state = [dict(core) for core in core_list]
+        for gem, core_index in zip(gems_with_cost, best_assignment):
+            best_state[core_index]['willpower'] -= gem['cost']
+            best_state[core_index]['slots'] -= 1
+        sorted_state = sorted(best_state, key=lambda c: (c['grade'], c['type']), reverse=True)
+        return [
             {
                 "core": f"{core['grade']} {core['type']}",
                 "remaining_willpower": core['willpower'],
@@ -99,4 +194,100 @@ def check_feasibility(cores_input: Dict[str, List[str]], held_gems: List[Dict])
             for core in sorted_state
         ]
 
-        return True, remaining_info
+    best = {"assignment": None, "sum_of_squares": math.inf}
+
+    # --- 0단계: 탐욕 배치로 첫 해 만들기 ---
+    placed = []
+    for gem_index in range(num_gems):
+        candidates = placeable_cores(gem_index)
+        if not candidates: break
+        i = max(candidates, key=lambda i: willpowers[i] - MIN_GEM_WILLPOWER_COST * slots[i])
+        place(gem_index, i, 1)
+        placed.append((gem_index, i))
+    if len(placed) == num_gems and is_viable():
+        best["assignment"] = tuple(assignment)
+        best["sum_of_squares"] = sum(w * w for w in willpowers)
+        search["found"] = True
+    for gem_index, i in reversed(placed):
+        place(gem_index, i, -1)
+
+    # --- 1단계: 최소 제곱합 탐색 ---
+    visited = set()
+
+    def branch_and_bound(gem_index: int):
+        tick()
+        if gem_index == num_gems:
+            sum_of_squares = sum(w * w for w in willpowers)
+            if sum_of_squares < best["sum_of_squares"] and is_viable():
+                best["assignment"] = tuple(assignment)
+                best["sum_of_squares"] = sum_of_squares
+                search["found"] = True
+            return
+
+        state_key = (gem_index, tuple(sorted(
+            (core_list[i]['grade'], core_list[i]['type'], willpowers[i], slots[i]) for i in range(num_cores)
+        )))
+        if state_key in visited:
+            return
+        visited.add(state_key)
+        lower_bound = sum_of_squares_lower_bound(gem_index)
+        if lower_bound is None or math.ceil(lower_bound - 1e-9) >= best["sum_of_squares"]:
+            return
+
+        for i in placeable_cores(gem_index):
+            place(gem_index, i, 1)
+            branch_and_bound(gem_index + 1)
+            place(gem_index, i, -1)
+
+    search["phase"] = "branch_and_bound"
+    try:
+        branch_and_bound(0)
+    except _SearchBudgetExceeded:
+        if best["assignment"] is None:
+            return False, {"reason": BUDGET_EXHAUSTED_REASON}, search_info(False)
+        return True, build_remaining_info(best["assignment"]), search_info(False)
+    if best["assignment"] is None:
+        return False, {"reason": INFEASIBLE_REASON}, search_info(True)
+
+    # --- 2단계: 최소 제곱합을 갖는 배치 중 기존 구현이 고르는 배치 선택 ---
+    optimal_sum_of_squares = best["sum_of_squares"]
+    chosen = {"assignment": None, "willpower_variance": float('inf')}
+    visited_ordered = set()
+
+    def select_optimal(gem_index: int):
+        tick()
+        if gem_index == num_gems:
+            if sum(w * w for w in willpowers) == optimal_sum_of_squares and is_viable():
+                current_variance = np.var(willpowers)
+                if chosen["assignment"] is None or current_variance < chosen["willpower_variance"]:
+                    chosen["assignment"] = tuple(assignment)
+                    chosen["willpower_variance"] = current_variance
+            return
+
+        # 코어 순서까지 같은 상태는 같은 리프를 같은 순서로 만들므로 한 번만 탐색합니다.
+        state_key = (gem_index, tuple(willpowers), tuple(slots))
+        if state_key in visited_ordered:
+            return
+        visited_ordered.add(state_key)
+        lower_bound = sum_of_squares_lower_bound(gem_index)
+        if lower_bound is None or math.ceil(lower_bound - 1e-9) > optimal_sum_of_squares:
+            return
+
+        for i in placeable_cores(gem_index):
+            place(gem_index, i, 1)
+            select_optimal(gem_index + 1)
+            place(gem_index, i, -1)
+
+    # 1단계가 끝났으면 최소 제곱합은 증명된 상태이므로, 2단계가 예산을 넘겨도 1단계의 해는 최적입니다.
+    search["phase"] = "tie_break"
+    try:
+        select_optimal(0)
+    except _SearchBudgetExceeded:
+        pass
+    return True, build_remaining_info(chosen["assignment"] if chosen["assignment"] is not None else best["assignment"]), search_info(True)
+
+
+def check_feasibility(cores_input: Dict[str, List[str]], held_gems: List[Dict],
+                      time_budget: Optional[float] = None, node_budget: Optional[int] = None) -> Tuple[bool, Any]:
+    is_feasible, remaining_info, _ = check_feasibility_anytime(cores_input, held_gems, time_budget, node_budget)
+    return is_feasible, remaining_info
@@ -0,0 +1,196 @@
+# warmup.py
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# 서버 시작 후 캐시 예열(warm-up)과 준비 상태(readiness)
+#
+# 작업 워커들이 모델을 모두 읽어 ready가 되면, 현재 시세 스냅샷으로 아직 예열되지 않은 워커 수만큼 예열 작업을 보냅니다.
+# 예열 작업은 질서/혼돈 코어의 의지력별 최소 비용표를 기본 시뮬레이션 횟수로 계산해
+# 각 워커의 결과/통계 캐시(Redis가 있으면 공유 계층 포함)를 채웁니다.
+# JobQueue는 작업을 놀고 있는 아무 워커에게 주므로, "started" 이벤트의 worker/generation 번호로 실제로 예열된 워커를 기록하고
+# (사용자 작업이 먼저 들어와 한 워커가 예열 작업을 두 번 받는 등) 빠진 워커가 있으면 한 번 더 보냅니다.
+# 예열이 끝난 뒤에도 워커 목록을 지켜보다가, 취소/비정상 종료로 교체된 워커(같은 번호, 새 세대)가 생기면
+# 다시 "warming"으로 돌아가 그 워커를 예열합니다.
+# /health/ready는 모델 로드와 모든 워커의 예열이 끝난 뒤에만 200을 돌려주어 롤링 배포 시 예열된 인스턴스로만 트래픽이 가게 합니다.
+# 예열이 실패하면(예: 시세 조회 실패) "warmup_failed" 상태로 503을 돌려주고, WARMUP_RETRY_SECONDS 뒤에 다시 시도합니다.
+# ===================================================================
+
+WARMUP_JOB_PREFIX = "warmup-"
+WARMUP_POLL_SECONDS = 0.5
+WARMUP_RETRY_SECONDS = 30.0
+
+
+class WarmupCoordinator:
+    def __init__(
+        self, job_queue, get_snapshot: Callable[[], Dict], crystal_price: int, simulations: int, enabled: bool = True,
+    ):
+        """
+        Args:
+            job_queue: 예열 작업을 보낼 JobQueue.
+            get_snapshot: 시세 스냅샷을 돌려주는 함수 (예: PriceSnapshotService.get_snapshot).
+            crystal_price (int): 예열에 쓸 블루 크리스탈 시세.
+            simulations (int): 예열에 쓸 젬당 시뮬레이션 횟수 (/optimize 기본값과 같게).
+            enabled (bool): False이면 예열 없이 모델 로드만 기다립니다.
+        """
+        self.job_queue = job_queue
+        self.get_snapshot = get_snapshot
+        self.crystal_price = crystal_price
+        self.simulations = simulations
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._round_done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._models_loaded = False
+        self._state = "pending" if enabled else "disabled"
+        self._round = 0
+        self._pending_jobs: Set[str] = set()
+        self._job_workers: Dict[str, Tuple[int, int]] = {}
+        self._warmed_workers: Dict[int, int] = {}  # 워커 번호 -> 예열된 세대
+        self._round_errors: Dict[str, str] = {}
+        self._last_error: Optional[str] = None
+        self._price_version: Optional[str] = None
+        self._started_at = time.time()
+        self._finished_at: Optional[float] = None
+
+    def is_warmup_job(self, job_id: str) -> bool:
+        return job_id.startswith(WARMUP_JOB_PREFIX)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="cache-warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._round_done.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _all_workers_ready(self) -> bool:
+        metrics = self.job_queue.metrics()
+        return metrics["workers"] > 0 and metrics["ready_workers"] >= metrics["workers"]
+
+    def _missing_workers(self) -> Set[int]:
+        """현재 세대가 아직 예열되지 않은 워커 번호들 (모델을 읽는 중인 교체 워커 포함)."""
+        generations = self.job_queue.worker_generations()
+        with self._lock:
+            return {index for index, (generation, _) in generations.items() if self._warmed_workers.get(index) != generation}
+
+    def _run(self):
+        while not self._all_workers_ready():
+            if self._stop.wait(WARMUP_POLL_SECONDS): return
+        with self._lock:
+            self._models_loaded = True
+        logger.info("All job workers have loaded their models.")
+        if not self.enabled: return
+
+        while not self._stop.is_set():
+            missing = self._missing_workers()
+            if not missing:
+                self._set_state("completed")
+                if self._stop.wait(WARMUP_POLL_SECONDS): return
+                continue
+            if self._state == "completed":
+                logger.info(f"Job workers {sorted(missing)} were restarted; re-warming their caches.")
+                self._set_state("running")
+            if not self._all_workers_ready():  # 교체된 워커가 아직 모델을 읽는 중
+                if self._stop.wait(WARMUP_POLL_SECONDS): return
+                continue
+            error = self._warm_round(len(missing))
+            if error is None: continue  # 빠진 워커가 남았는지 다시 확인
+            self._set_state("failed", error)
+            logger.error(f"Cache warm-up failed: {error}; retrying in {WARMUP_RETRY_SECONDS:.0f}s.")
+            if self._stop.wait(WARMUP_RETRY_SECONDS): return
+
+    def _warm_round(self, job_count: int) -> Optional[str]:
+        """예열 작업 job_count개를 보내고 모두 끝날 때까지 기다립니다. 실패하면 오류 메시지를 반환합니다."""
+        try:
+            snapshot = self.get_snapshot()
+        except Exception as e:
+            return f"price snapshot unavailable: {e}"
+        payload = {"kind": "warmup", "gem_prices": snapshot["prices"], "crystal_price": self.crystal_price, "simulations": self.simulations}
+        with self._lock:
+            self._round += 1
+            job_ids = [f"{WARMUP_JOB_PREFIX}{self._round}-{index}" for index in range(job_count)]
+            self._pending_jobs = set(job_ids)
+            self._round_errors = {}
+            self._price_version = snapshot["version"]
+            if self._state != "failed": self._state = "running"
+            self._round_done.clear()
+        logger.info(f"Warming caches with {job_count} jobs (prices: {snapshot['version']}, simulations: {self.simulations}).")
+        for job_id in job_ids:
+            try:
+                self.job_queue.submit(job_id, payload)
+            except Exception as e:
+                self.on_event(job_id, "failed", str(e))
+        self._round_done.wait()
+        with self._lock:
+            errors = dict(self._round_errors)
+        return "; ".join(f"{job_id}: {error}" for job_id, error in errors.items()) if errors else None
+
+    def on_event(self, job_id: str, kind: str, data: Any):
+        """JobQueue 이벤트 중 예열 작업의 것만 받아 상태에 반영합니다."""
+        with self._lock:
+            if job_id not in self._pending_jobs: return
+            if kind == "started":
+                self._job_workers[job_id] = (data["worker"], data["generation"])
+                return
+            if kind not in ("done", "failed"): return
+            self._pending_jobs.discard(job_id)
+            worker = self._job_workers.pop(job_id, None)
+            if kind == "done" and worker is not None:
+                index, generation = worker
+                self._warmed_workers[index] = generation
+            elif kind == "failed":
+                self._round_errors[job_id] = str(data)
+            if not self._pending_jobs:
+                self._round_done.set()
+
+    def _set_state(self, state: str, error: Optional[str] = None):
+        with self._lock:
+            previous, self._state = self._state, state
+            self._last_error = error
+            if state == "completed" and previous != "completed":
+                self._finished_at = time.time()
+                logger.info(f"Cache warm-up completed {self._finished_at - self._started_at:.1f}s after startup.")
+            elif state != "completed":
+                self._finished_at = None
+
+    def _readiness_locked(self) -> str:
+        if not self._models_loaded: return "loading_models"
+        if self._state in ("completed", "disabled"): return "ready"
+        if self._state == "failed": return "warmup_failed"
+        return "warming"
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return self._readiness_locked() == "ready"
+
+    def status(self) -> Dict[str, Any]:
+        queue_metrics = self.job_queue.metrics()
+        generations = self.job_queue.worker_generations()
+        with self._lock:
+            readiness = self._readiness_locked()
+            return {
+                "ready": readiness == "ready",
+                "status": readiness,
+                "models_loaded": self._models_loaded,
+                "workers": queue_metrics["workers"],
+                "ready_workers": queue_metrics["ready_workers"],
+                "warmup": {
+                    "state": self._state,
+                    "price_version": self._price_version,
+                    "rounds": self._round,
+                    "pending_jobs": len(self._pending_jobs),
+                    "warmed_workers": sorted(
+                        index for index, (generation, _) in generations.items() if self._warmed_workers.get(index) == generation
+                    ),
+                    "error": self._last_error,
+                    "elapsed": round((self._finished_at or time.time()) - self._started_at, 3),
+                },
+            }